@@ -180,7 +180,9 @@ deploy_statemachine() {
         ParameterKey=DataLambdaArn,ParameterValue=$(aws cloudformation describe-stacks --stack-name ja-stt --query "Stacks[0].Outputs[?OutputKey=='DataLambdaArn'].OutputValue" --output text) \
         ParameterKey=TranscribeLambdaArn,ParameterValue=$(aws cloudformation describe-stacks --stack-name ja-stt --query "Stacks[0].Outputs[?OutputKey=='TranscribeLambdaArn'].OutputValue" --output text) \
         ParameterKey=EnhanceLambdaArn,ParameterValue=$(aws cloudformation describe-stacks --stack-name ja-stt --query "Stacks[0].Outputs[?OutputKey=='EnhanceLambdaArn'].OutputValue" --output text) \
-        ParameterKey=StoreLambdaArn,ParameterValue=$(aws cloudformation describe-stacks --stack-name ja-stt --query "Stacks[0].Outputs[?OutputKey=='StoreLambdaArn'].OutputValue" --output text)
+        ParameterKey=StoreLambdaArn,ParameterValue=$(aws cloudformation describe-stacks --stack-name ja-stt --query "Stacks[0].Outputs[?OutputKey=='StoreLambdaArn'].OutputValue" --output text) \
+        ParameterKey=StartLambdaArn,ParameterValue=$(aws cloudformation describe-stacks --stack-name ja-stt --query "Stacks[0].Outputs[?OutputKey=='StartLambdaArn'].OutputValue" --output text) \
+        ParameterKey=ManifestBucket,ParameterValue=$(aws cloudformation describe-stacks --stack-name ja-stt --query "Stacks[0].Outputs[?OutputKey=='TranscriptionOutputBucketName'].OutputValue" --output text)
     
     if [ $? -ne 0 ]; then
         echo "Error: SAM deploy failed"
@@ -56,6 +56,31 @@ export class ApiService {
       );
   }
 
+  checkTranscriptionStatuses(fileNames: string[]): Observable<any[]> {
+    const headers = new HttpHeaders({
+      'Content-Type': 'application/json',
+      'Accept': 'application/json'
+    });
+
+    return this.http
+      .post(this.apiUrl, { fileNames }, { headers })
+      .pipe(
+        map((response: any) => (typeof response === 'string' ? JSON.parse(response) : response).results)
+      );
+  }
+
+  getTranscriptSegments(fileName: string, fromSegment: number, limit: number = 50): Observable<any> {
+    const headers = new HttpHeaders({
+      'Accept': 'application/json'
+    });
+
+    return this.http
+      .get(`${this.apiUrl}?fileName=${encodeURIComponent(fileName)}&fromSegment=${fromSegment}&limit=${limit}`, { headers })
+      .pipe(
+        map((response: any) => (typeof response === 'string' ? JSON.parse(response) : response).result)
+      );
+  }
+
   getTranscript(fileName: string): Observable<any> {
     const transcriptUrl = `https://${this.s3Transcript}.s3.us-east-1.amazonaws.com/${fileName}`;
     return this.http.get(transcriptUrl);
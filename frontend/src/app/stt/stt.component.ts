@@ -54,6 +54,7 @@ export class SttComponent implements OnInit, OnDestroy {
   documentTitle: any;
   entities: any;
   segments: any;
+  partialSegments: any[] = [];
   uploadedFileName: string = '';
   transcriptionStatus: string = '';
   errorMessage: string = '';
@@ -204,6 +205,7 @@ export class SttComponent implements OnInit, OnDestroy {
     this.isLoading = true;
     this.errorMessage = '';
     fileName = fileName.split('.').slice(0, -1).join('.');  // Remove the extension
+    this.partialSegments = [];
   
     let attempts = 0;
     const maxAttempts = 60;  // 30 minutes maximum (30 seconds * 60)
@@ -221,45 +223,79 @@ export class SttComponent implements OnInit, OnDestroy {
       updateMessage();
     }, 5000);
   
-    // Polling function
+    const stopPolling = () => {
+      this.isLoading = false;
+      clearInterval(messageInterval); // Stop changing messages
+    };
+
+    const handleError = (error: any) => {
+      console.error('Error checking transcription status:', error);
+      this.errorMessage = 'Error checking transcription status';
+      this.buttonText = "Error";
+      stopPolling();
+    };
+
+    // Polling function: the batch route answers with the job's status only, and
+    // the transcript is fetched once, when the job has completed
     const checkStatus = () => {
-      this.apiService.checkTranscriptionStatus(fileName).subscribe(
-        (response) => {
+      this.apiService.checkTranscriptionStatuses([fileName]).subscribe(
+        (results) => {
+          const entry = results && results[0];
 
-          if (Object.keys(response).length > 0) {
-            this.uploadResponse = response;
-            this.updateDisplayedResponse();
-            this.buttonText = "Done!";
-            this.isLoading = false;
-            clearInterval(messageInterval); // Stop changing messages
+          if (entry && entry.status === 'COMPLETED') {
+            this.apiService.checkTranscriptionStatus(fileName).subscribe(
+              (response) => {
+                this.uploadResponse = response;
+                this.updateDisplayedResponse();
+                this.buttonText = "Done!";
+                stopPolling();
+              },
+              handleError
+            );
+            return;
+          } else if (entry && entry.status === 'FAILED') {
+            this.errorMessage = entry.error || 'Transcription failed';
+            this.buttonText = "Error";
+            stopPolling();
             return;
           } else if (attempts >= maxAttempts) {
             this.errorMessage = 'Transcription timed out';
             this.buttonText = "Timed Out";
-            this.isLoading = false;
-            clearInterval(messageInterval); // Stop changing messages
+            stopPolling();
             return;
           }
 
+          // Show the segments enhanced so far while the rest are still running
+          if (entry && entry.job && entry.job.readySegments > this.partialSegments.length) {
+            this.loadReadySegments(fileName);
+          }
+
           // Increment attempt count and schedule the next status check
           attempts++;
           if (this.isLoading) {
-            setTimeout(checkStatus, 20000); // Poll again in 15 seconds
+            setTimeout(checkStatus, 20000); // Poll again in 20 seconds
           }
         },
-        (error) => {
-          console.error('Error checking transcription status:', error);
-          this.errorMessage = 'Error checking transcription status';
-          this.buttonText = "Error";
-          this.isLoading = false;
-          clearInterval(messageInterval); // Stop changing messages
-        }
+        handleError
       );
     };
 
     checkStatus();
   }
 
+  loadReadySegments(fileName: string) {
+    this.apiService.getTranscriptSegments(fileName, this.partialSegments.length, 500).subscribe(
+      (page) => {
+        // Ignore a page that arrives after the full transcript or a newer page
+        if (this.documentTitle || !page || page.fromSegment !== this.partialSegments.length) {
+          return;
+        }
+        this.partialSegments = this.partialSegments.concat(page.segments);
+      },
+      (err) => console.error('Error loading transcript segments:', err)
+    );
+  }
+
   ngOnDestroy() {
     if (this.statusCheckSubscription) {
       this.statusCheckSubscription.unsubscribe();
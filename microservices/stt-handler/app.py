@@ -1,41 +1,124 @@
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+import base64
+import gzip
 import json
 import boto3
 import re
 import os
+import threading
 import time
 from botocore.exceptions import ClientError
 from pathlib import Path
 from urllib.parse import parse_qs
 from datetime import datetime
 from urllib.parse import urlparse
+from transcript_columnar import load_columnar_transcript
+from search_index import SEARCH_INDEX_PARTITIONS, find_matches, get_query_keys, get_query_shard_keys, load_shard
+from metrics import Metrics
 
 # Load the .env file from the parent directory
 root_dir = Path(__file__).resolve().parent.parent
 load_dotenv(dotenv_path=root_dir / ".env")
 
-s3 = boto3.client('s3')
+metrics = Metrics('stt-handler')
+s3 = metrics.instrument_s3(boto3.client('s3'))
 transcribe = boto3.client('transcribe')
 
+TRANSCRIPTION_OUTPUT_BUCKET = os.environ.get('TRANSCRIPTION_OUTPUT_BUCKET')
+JOB_STATE_PREFIX = os.environ.get('JOB_STATE_PREFIX', 'jobs/')
+PARTIAL_RESULTS_PREFIX = os.environ.get('PARTIAL_RESULTS_PREFIX', 'partial/')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+GZIP_MIN_BYTES = 1024  # Smaller bodies are not worth compressing
+MAX_LONG_POLL_SECONDS = 20  # Upper bound for the optional ?wait= long-poll
+LONG_POLL_INTERVAL = 1
+SEARCH_CONCURRENCY = 16  # Index shards read in parallel per search
+SEARCH_CACHE_SHARDS = int(os.environ.get('SEARCH_CACHE_SHARDS', '256'))  # Shards kept by a warm container
+MAX_SEARCH_TERMS = 16
+ENTITY_CATEGORY_PATTERN = re.compile(r'^[A-Z_]+$')
+MAX_BATCH_FILES = 100  # File names per batch status request
+BATCH_STATUS_CONCURRENCY = 16  # Files of a batch resolved in parallel
+STATUS_CACHE_MAX_ENTRIES = int(os.environ.get('STATUS_CACHE_MAX_ENTRIES', '4096'))
+STATUS_CACHE_TTL_SECONDS = float(os.environ.get('STATUS_CACHE_TTL_SECONDS', '300'))
+TERMINAL_STATUSES = ('COMPLETED', 'FAILED')
+
+# Marker returned when the job-state record still matches the client's ETag
+NOT_MODIFIED = object()
+
+# Search index shards by S3 key as (ETag, shard), least recently used first;
+# a warm container revalidates them with conditional GETs
+search_shard_cache = OrderedDict()
+search_shard_cache_lock = threading.Lock()
+
+# Status entries of finished jobs by file name as (expires at, entry), least
+# recently used first. An entry is only used while the job-state record still has
+# the ETag it was built from, so repeated polls need one conditional GET at most
+# and no Transcribe call, and a new run of the file is seen at once
+status_cache = OrderedDict()
+status_cache_lock = threading.Lock()
+
 def json_serial(obj):
     """JSON serializer for objects not serializable by default json code"""
     if isinstance(obj, datetime):
         return obj.isoformat()
     raise TypeError(f"Type {type(obj)} not serializable")
 
-def create_response(status_code, body):
-    return {
+def create_response(status_code, body, headers=None):
+    response = {
         'statusCode': status_code,
         'body': json.dumps(body if body else {}),  # Return an empty object if body is None
     }
+    if headers:
+        response['headers'] = headers
+    return response
+
+def create_raw_response(status_code, body_text, headers=None):
+    """
+    Builds a response around an already serialized JSON body.
+    """
+    response = {
+        'statusCode': status_code,
+        'body': body_text
+    }
+    if headers:
+        response['headers'] = headers
+    return response
+
+def encode_response(response, request_headers):
+    """
+    Gzips the response body when the client accepts it and the body is large enough.
+    """
+    body = response.get('body')
+    if not body or len(body) < GZIP_MIN_BYTES or 'gzip' not in request_headers.get('accept-encoding', ''):
+        metrics.count('ResponseBytes', len(body or ''), 'Bytes')
+        return response
 
+    with metrics.span('CompressTime'):
+        response['body'] = base64.b64encode(gzip.compress(body.encode('utf-8'), compresslevel=5)).decode('ascii')
+    metrics.count('ResponseBytes', len(response['body']), 'Bytes')
+    response['isBase64Encoded'] = True
+    response['headers'] = dict(response.get('headers') or {}, **{
+        'Content-Type': 'application/json',
+        'Content-Encoding': 'gzip',
+        'Vary': 'Accept-Encoding'
+    })
+    return response
+
+def parse_optional_float(value):
+    return float(value) if value not in (None, '') else None
+
+@metrics.instrument_handler
 def lambda_handler(event, context):
     try:
         # Log incoming event for debugging
-        print((json.dumps))
+        metrics.debug("Received event", event)
 
         # Check the HTTP method from the requestContext
         http_method = event['requestContext']['http']['method']
+        request_headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
         
         # Handle OPTIONS request for CORS
         if http_method == 'OPTIONS':
@@ -48,15 +131,82 @@ def lambda_handler(event, context):
         if http_method == 'GET':
             query_string_parameters = event.get('queryStringParameters', {})
 
-            if query_string_parameters and 'fileName' in query_string_parameters:
+            if query_string_parameters and 'search' in query_string_parameters:
+                category = (query_string_parameters.get('category') or '').upper() or None
+                try:
+                    limit = min(max(int(query_string_parameters.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+                except ValueError:
+                    limit = None
+                if limit is None or (category and not ENTITY_CATEGORY_PATTERN.match(category)):
+                    return create_response(400, {
+                        'status': 'ERROR',
+                        'result': None,
+                        'error': 'Invalid limit or category parameter'
+                    })
+
+                return encode_response(handle_search(
+                    query_string_parameters['search'], category, limit), request_headers)
+
+            elif query_string_parameters and 'fileNames' in query_string_parameters:
+                file_names = [name for name in query_string_parameters['fileNames'].split(',') if name]
+                return encode_response(handle_batch_status(file_names), request_headers)
+
+            elif query_string_parameters and 'fileName' in query_string_parameters and (
+                    'fromSegment' in query_string_parameters or 'fromTime' in query_string_parameters
+                    or 'toTime' in query_string_parameters):
+                try:
+                    from_segment = max(int(query_string_parameters.get('fromSegment', 0)), 0)
+                    limit = min(max(int(query_string_parameters.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+                    from_time = parse_optional_float(query_string_parameters.get('fromTime'))
+                    to_time = parse_optional_float(query_string_parameters.get('toTime'))
+                except ValueError:
+                    return create_response(400, {
+                        'status': 'ERROR',
+                        'result': None,
+                        'error': 'Invalid fromSegment, limit, fromTime or toTime parameter'
+                    })
+
+                return encode_response(handle_segments_page(
+                    query_string_parameters['fileName'], from_segment, limit, from_time, to_time), request_headers)
+
+            elif query_string_parameters and 'fileName' in query_string_parameters:
                 file_name = query_string_parameters['fileName']
-                return handle_transcription_status(file_name)
+
+                try:
+                    wait_seconds = min(max(int(query_string_parameters.get('wait', 0)), 0), MAX_LONG_POLL_SECONDS)
+                except ValueError:
+                    return create_response(400, {
+                        'status': 'ERROR',
+                        'result': None,
+                        'error': 'Invalid wait parameter'
+                    })
+
+                return encode_response(handle_transcription_status(
+                    file_name, request_headers.get('if-none-match'), wait_seconds), request_headers)
             else:
                 return create_response(400, {
                     'status': 'ERROR',
                     'result': None,
                     'error': 'Missing fileName parameter'
                 })
+
+        # Batch status lookups, for more file names than fit in a query string
+        elif http_method == 'POST':
+            try:
+                body = event.get('body') or '{}'
+                if event.get('isBase64Encoded'):
+                    body = base64.b64decode(body)
+                file_names = json.loads(body).get('fileNames')
+            except (ValueError, AttributeError):
+                file_names = None
+            if not isinstance(file_names, list) or not all(isinstance(name, str) and name for name in file_names):
+                return create_response(400, {
+                    'status': 'ERROR',
+                    'result': None,
+                    'error': 'The body must be {"fileNames": [...]}'
+                })
+
+            return encode_response(handle_batch_status(file_names), request_headers)
         else:
             return create_response(405, {
                 'status': 'ERROR',
@@ -73,95 +223,84 @@ def lambda_handler(event, context):
         })
     
 
-def get_transcript_content(transcript_uri, max_attempts=10, delay=30):
-    attempt = 0
+def get_transcript_content(transcript_uri):
+    """
+    Returns the enhanced transcript for a Transcribe output URI, or None if it is not stored yet.
+    """
+    return get_object_content(*get_enhanced_location(transcript_uri))
+
+
+def get_enhanced_location(transcript_uri):
+    """
+    Returns (bucket, key) of the enhanced transcript for a Transcribe output URI.
+    """
     # Parse the S3 URL
     parsed_uri = urlparse(transcript_uri)
     bucket = parsed_uri.path.split('/')[1]
     key = '/'.join(parsed_uri.path.split('/')[2:]).replace('.json', '_enhanced.json')
-    print(f"Attempt {attempt}/{max_attempts}: Accessing S3 bucket: {bucket}, key: {key}")
-    
-    while attempt < max_attempts:
-        attempt += 1
-        try:
-            # Get the transcript file from S3
-            s3_response = s3.get_object(Bucket=bucket, Key=key)
-            transcript_content = s3_response['Body'].read().decode('utf-8')
-            print(f"Transcript content retrieved successfully on attempt {attempt}/{max_attempts}")
-            return transcript_content
-        except Exception as e:
-            print(f"Attempt {attempt}/{max_attempts} failed: {str(e)}")
-            if attempt < max_attempts:
-                print(f"Waiting {delay} seconds before next attempt...")
-                time.sleep(delay)
-            else:
-                print("All attempts to retrieve transcript content have failed")
-                return None
+    return bucket, key
 
 
-def handle_transcription_status(job_name):
+def get_object_content(bucket, key):
+    metrics.debug(f"Accessing S3 bucket: {bucket}, key: {key}")
     try:
-        job_name = f'stt-{job_name}'
-        print(f"Checking transcription status for job: {job_name}")
-        max_attempts = 10
-        attempt = 0
+        s3_response = s3.get_object(Bucket=bucket, Key=key)
+        return s3_response['Body'].read().decode('utf-8')
+    except ClientError as e:
+        print(f"Failed to retrieve s3://{bucket}/{key}: {str(e)}")
+        return None
 
-        while attempt < max_attempts:
-            attempt += 1
-            try:
-                response = transcribe.get_transcription_job(TranscriptionJobName=job_name)
-                print(f"Transcribe API response: {json.dumps(response, default=json_serial)}")
-                status = response['TranscriptionJob']['TranscriptionJobStatus']
-                print(f"Job status: {status} (Attempt {attempt}/{max_attempts})")
-
-                if status == 'COMPLETED':
-                    transcript_uri = response['TranscriptionJob']['Transcript'].get('TranscriptFileUri')
-                    print(f'URI: {transcript_uri}')
-
-                    if not transcript_uri:
-                        raise ValueError("TranscriptFileUri not found in completed job")
-
-                    transcript_content = get_transcript_content(transcript_uri)
-                    if transcript_content is None:
-                        return create_response(500, {
-                            'status': 'FAILED',
-                            'result': None,
-                            'error': 'Failed to retrieve transcript content after multiple attempts'
-                        })
-                    
-                    return create_response(200, {
-                        'status': 'COMPLETED',
-                        'result': json.loads(transcript_content),
-                        'error': None
-                    })
-                elif status in ['IN_PROGRESS', 'QUEUED']:
-                    if attempt < max_attempts:
-                        print(f"Job still in progress. Waiting for 30 seconds before next attempt...")
-                        time.sleep(30)
-                    else:
-                        return create_response(200, {
-                            'status': 'IN_PROGRESS',
-                            'result': None,
-                            'error': None
-                        })
-                else:
-                    return create_response(200, {
-                        'status': 'FAILED',
-                        'result': None,
-                        'error': f'Transcription failed with status: {status}'
-                    })
-                
-            except (transcribe.exceptions.BadRequestException, transcribe.exceptions.NotFoundException):
-                if attempt < max_attempts:
-                    print(f"Transcription job '{job_name}' not found. Retrying in 30 seconds...")
-                    time.sleep(30)
-                else:
-                    print(f"Transcription job '{job_name}' not found after {max_attempts} attempts")
-                    return create_response(404, {
-                        'status': 'ERROR',
-                        'result': None,
-                        'error': f'Transcription job not found: {job_name}'
-                    })
+
+def read_job_state(file_name, if_none_match=None):
+    """
+    Reads the job-state record written by the pipeline stages.
+    Returns (record, etag), (NOT_MODIFIED, etag) when the record still matches
+    `if_none_match`, or (None, None) when the job has no record.
+    """
+    request = {'Bucket': TRANSCRIPTION_OUTPUT_BUCKET, 'Key': f"{JOB_STATE_PREFIX}{file_name}.json"}
+    if if_none_match:
+        request['IfNoneMatch'] = if_none_match
+
+    try:
+        response = s3.get_object(**request)
+    except ClientError as e:
+        error_code = e.response.get('Error', {}).get('Code')
+        if error_code in ('304', 'NotModified'):
+            return NOT_MODIFIED, if_none_match
+        if error_code in ('NoSuchKey', '404'):
+            return None, None
+        raise
+
+    return json.loads(response['Body'].read()), response['ETag']
+
+
+def handle_transcription_status(file_name, if_none_match=None, wait_seconds=0):
+    """
+    Answers a status request from the job-state record without blocking.
+    With `wait_seconds`, a client that already holds the current ETag is held
+    until the record changes or the wait runs out.
+    """
+    try:
+        job_state, etag = read_job_state(file_name, if_none_match)
+
+        # A client holding the current ETag of a finished job already has its final answer
+        cached = get_cached_status(file_name)
+        if job_state is NOT_MODIFIED and cached and cached['etag'] == if_none_match:
+            metrics.count('StatusCacheHits')
+            return {'statusCode': 304, 'headers': {'ETag': if_none_match}}
+
+        deadline = time.monotonic() + wait_seconds
+        while job_state is NOT_MODIFIED and time.monotonic() < deadline:
+            time.sleep(LONG_POLL_INTERVAL)
+            job_state, etag = read_job_state(file_name, if_none_match)
+
+        if job_state is NOT_MODIFIED:
+            return {'statusCode': 304, 'headers': {'ETag': etag}}
+
+        if job_state is None:
+            return handle_untracked_transcription_status(file_name)
+
+        return create_job_state_response(job_state, etag)
 
     except ClientError as e:
         print(f"AWS client error: {str(e)}")
@@ -176,4 +315,505 @@ def handle_transcription_status(job_name):
             'status': 'ERROR',
             'result': None,
             'error': f"Unexpected error: {str(e)}"
-        })
\ No newline at end of file
+        })
+
+
+def create_job_state_response(job_state, etag):
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    status = job_state['status']
+
+    if status == 'COMPLETED':
+        result = job_state['result']
+        transcript_content = get_object_content(result['bucket'], result['key'])
+        if transcript_content is None:
+            return create_response(500, {
+                'status': 'FAILED',
+                'result': None,
+                'error': 'Failed to retrieve transcript content',
+                'job': job_state
+            })
+
+        # Embed the stored bytes as they are rather than parsing and re-serializing them
+        return create_raw_response(200, (
+            '{"status": "COMPLETED", "result": ' + transcript_content
+            + ', "error": null, "job": ' + json.dumps(job_state) + '}'
+        ), headers)
+
+    return create_response(200, {
+        'status': status,
+        'result': None,
+        'error': job_state.get('error'),
+        'job': job_state
+    }, headers)
+
+
+def handle_untracked_transcription_status(file_name):
+    """
+    Answers for jobs started before job-state records existed with a single
+    Transcribe lookup instead of a polling loop.
+    """
+    job_name = f'stt-{file_name}'
+    metrics.debug(f"No job-state record for {file_name}, checking transcription job: {job_name}")
+
+    try:
+        response = transcribe.get_transcription_job(TranscriptionJobName=job_name)
+    except (transcribe.exceptions.BadRequestException, transcribe.exceptions.NotFoundException):
+        return create_response(404, {
+            'status': 'ERROR',
+            'result': None,
+            'error': f'Transcription job not found: {job_name}'
+        })
+
+    status = response['TranscriptionJob']['TranscriptionJobStatus']
+    metrics.count('TranscribeLookups')
+    metrics.debug("Transcription job", response['TranscriptionJob'])
+
+    if status == 'FAILED':
+        return create_response(200, {
+            'status': 'FAILED',
+            'result': None,
+            'error': f'Transcription failed with status: {status}'
+        })
+
+    if status == 'COMPLETED':
+        transcript_uri = response['TranscriptionJob']['Transcript'].get('TranscriptFileUri')
+        if not transcript_uri:
+            raise ValueError("TranscriptFileUri not found in completed job")
+
+        transcript_content = get_transcript_content(transcript_uri)
+        if transcript_content is not None:
+            return create_raw_response(200, (
+                '{"status": "COMPLETED", "result": ' + transcript_content + ', "error": null}'
+            ))
+
+    # Still transcribing, or transcribed but not yet enhanced and stored
+    return create_response(200, {
+        'status': 'IN_PROGRESS',
+        'result': None,
+        'error': None
+    })
+
+
+def handle_batch_status(file_names):
+    """
+    Answers the status of many files in one request. Finished jobs are answered
+    from the warm container's cache; the rest are resolved in parallel. Entries
+    carry the job-state record and, once completed, the transcript's ETag, but not
+    the transcript itself.
+    """
+    file_names = list(dict.fromkeys(file_names))
+    if not file_names or len(file_names) > MAX_BATCH_FILES:
+        return create_response(400, {
+            'status': 'ERROR',
+            'result': None,
+            'error': f"Between 1 and {MAX_BATCH_FILES} file names are allowed"
+        })
+
+    with metrics.span('BatchStatusTime'), ThreadPoolExecutor(
+            max_workers=min(BATCH_STATUS_CONCURRENCY, len(file_names))) as executor:
+        results = list(executor.map(resolve_job_status, file_names))
+    metrics.count('BatchStatusFiles', len(file_names))
+
+    return create_response(200, {
+        'status': 'OK',
+        'results': results,
+        'cacheHits': sum(result['cached'] for result in results),
+        'error': None
+    })
+
+
+def resolve_job_status(file_name):
+    """
+    Returns the batch status entry of one file, caching it once the job has finished.
+    """
+    try:
+        cached = get_cached_status(file_name)
+        job_state, etag = read_job_state(file_name, cached and cached['etag'])
+        # Still the record (or still no record) the cached entry was built from
+        if cached and (job_state is NOT_MODIFIED or (job_state is None and cached['etag'] is None)):
+            metrics.count('StatusCacheHits')
+            return dict(cached, cached=True)
+        metrics.count('StatusCacheMisses')
+
+        entry = (resolve_untracked_job_status(file_name) if job_state is None
+                 else create_status_entry(file_name, job_state['status'], job_state.get('error'), job_state, etag))
+
+        if entry['status'] == 'COMPLETED' and not entry['transcriptEtag']:
+            if job_state is None:
+                entry['status'] = 'IN_PROGRESS'  # Transcribed but not yet enhanced and stored
+            else:
+                result = job_state['result']
+                entry['transcriptEtag'] = read_object_etag(result['bucket'], result['key'])
+                if not entry['transcriptEtag']:
+                    return dict(entry, status='FAILED', error='Failed to retrieve transcript content', cached=False)
+
+    except ClientError as e:
+        print(f"AWS client error resolving {file_name}: {str(e)}")
+        return dict(create_status_entry(file_name, 'ERROR', f'AWS client error: {str(e)}'), cached=False)
+
+    if entry['status'] in TERMINAL_STATUSES:
+        cache_status(file_name, entry)
+    return dict(entry, cached=False)
+
+
+def resolve_untracked_job_status(file_name):
+    """
+    Resolves a job without a job-state record from its Transcribe job.
+    """
+    job_name = f'stt-{file_name}'
+    try:
+        response = transcribe.get_transcription_job(TranscriptionJobName=job_name)
+    except (transcribe.exceptions.BadRequestException, transcribe.exceptions.NotFoundException):
+        return create_status_entry(file_name, 'NOT_FOUND', f'Transcription job not found: {job_name}')
+    metrics.count('TranscribeLookups')
+
+    status = response['TranscriptionJob']['TranscriptionJobStatus']
+    if status == 'FAILED':
+        return create_status_entry(file_name, 'FAILED', f'Transcription failed with status: {status}')
+    if status != 'COMPLETED':
+        return create_status_entry(file_name, 'IN_PROGRESS')
+
+    transcript_uri = response['TranscriptionJob']['Transcript'].get('TranscriptFileUri')
+    transcript_etag = read_object_etag(*get_enhanced_location(transcript_uri)) if transcript_uri else None
+    return dict(create_status_entry(file_name, 'COMPLETED'), transcriptEtag=transcript_etag)
+
+
+def create_status_entry(file_name, status, error=None, job=None, etag=None):
+    return {
+        'fileName': file_name,
+        'status': status,
+        'error': error,
+        'job': job,
+        'etag': etag,
+        'transcriptEtag': None
+    }
+
+
+def read_object_etag(bucket, key):
+    """
+    Returns the object's ETag, or None if it does not exist.
+    """
+    try:
+        return s3.head_object(Bucket=bucket, Key=key)['ETag']
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404', 'NotFound'):
+            return None
+        raise
+
+
+def get_cached_status(file_name):
+    """
+    Returns the cached entry of a finished job, or None if there is none or it expired.
+    """
+    with status_cache_lock:
+        cached = status_cache.get(file_name)
+        if cached is None:
+            return None
+        expires_at, entry = cached
+        if expires_at <= time.monotonic():
+            del status_cache[file_name]
+            return None
+        status_cache.move_to_end(file_name)
+        return entry
+
+
+def cache_status(file_name, entry):
+    with status_cache_lock:
+        status_cache[file_name] = (time.monotonic() + STATUS_CACHE_TTL_SECONDS, entry)
+        status_cache.move_to_end(file_name)
+        while len(status_cache) > STATUS_CACHE_MAX_ENTRIES:
+            status_cache.popitem(last=False)
+
+
+def read_object_bytes(bucket, key):
+    """
+    Returns the object's bytes, or None if it does not exist.
+    """
+    try:
+        response = s3.get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return None
+        raise
+    return response['Body'].read()
+
+
+def read_json_object(bucket, key):
+    """
+    Returns the parsed JSON object, or None if it does not exist.
+    """
+    content = read_object_bytes(bucket, key)
+    if content is None:
+        return None
+    with metrics.span('ParseTime'):
+        return json.loads(content)
+
+
+def read_byte_range(bucket, key, start, end):
+    """
+    Reads bytes [start, end] of an object with an S3 Range GET.
+    """
+    response = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}")
+    return response['Body'].read().decode('utf-8')
+
+
+def is_in_time_range(segment, from_time, to_time):
+    if from_time is None and to_time is None:
+        return True
+    try:
+        timestamp = float(segment.get('timestamp'))
+    except (TypeError, ValueError):
+        return False
+    return (from_time is None or timestamp >= from_time) and (to_time is None or timestamp <= to_time)
+
+
+def select_segment_range(index, from_segment, limit, from_time=None, to_time=None):
+    """
+    Returns the [first, last) segments of a stored result that match the request,
+    using the time windows of its sidecar index to find the start of a time range.
+    """
+    segment_count = index['segmentCount']
+    timestamps = index['timestamps']
+    first = min(from_segment, segment_count)
+
+    if from_time is not None:
+        window = int(from_time // index['windowSeconds'])
+        first = max(first, index['windows'][window] if window < len(index['windows']) else segment_count)
+        while first < segment_count and timestamps[first] < from_time:
+            first += 1
+
+    last = min(first + limit, segment_count)
+    if to_time is not None:
+        last = bisect_right(timestamps, to_time, first, last)
+
+    return first, last
+
+
+def handle_segments_page(file_name, from_segment, limit, from_time=None, to_time=None):
+    """
+    Serves up to `limit` segments from `from_segment` on, optionally restricted to
+    segments starting within [from_time, to_time] seconds. Completed jobs are served
+    with S3 Range reads guided by the stored result's sidecar index; running jobs
+    from the chunks the enhance stage has persisted so far.
+    """
+    try:
+        job_state, _ = read_job_state(file_name)
+
+        if job_state and job_state['status'] == 'COMPLETED':
+            return handle_stored_segments_page(job_state['result'], from_segment, limit, from_time, to_time)
+
+        manifest = read_json_object(
+            TRANSCRIPTION_OUTPUT_BUCKET, f"{PARTIAL_RESULTS_PREFIX}{file_name}/manifest.json")
+
+        if manifest is None:
+            if job_state is None:
+                return create_response(404, {
+                    'status': 'ERROR',
+                    'result': None,
+                    'error': f'No transcript found for {file_name}'
+                })
+            return create_segments_page_response(job_state['status'], [], from_segment, from_segment, 0, False)
+
+        page = []
+        next_segment = from_segment
+        chunk_start = 0
+        for chunk in manifest['chunks']:
+            # Only the contiguous run of ready chunks from the start is served
+            if not chunk['ready'] or len(page) >= limit:
+                break
+            chunk_end = chunk_start + chunk['segmentCount']
+            if chunk_end > next_segment:
+                segments = read_json_object(TRANSCRIPTION_OUTPUT_BUCKET, chunk['key'])['segments']
+                for position in range(max(next_segment - chunk_start, 0), len(segments)):
+                    if len(page) >= limit:
+                        break
+                    if is_in_time_range(segments[position], from_time, to_time):
+                        page.append(segments[position])
+                    next_segment = chunk_start + position + 1
+            chunk_start = chunk_end
+
+        status = job_state['status'] if job_state else 'IN_PROGRESS'
+        return create_segments_page_response(status, page, from_segment, next_segment, manifest['readySegments'], False)
+
+    except ClientError as e:
+        print(f"AWS client error: {str(e)}")
+        return create_response(500, {
+            'status': 'ERROR',
+            'result': None,
+            'error': f'AWS client error: {str(e)}'
+        })
+    except Exception as e:
+        print(f"Unexpected error in handle_segments_page: {str(e)}")
+        return create_response(500, {
+            'status': 'ERROR',
+            'result': None,
+            'error': f"Unexpected error: {str(e)}"
+        })
+
+
+def handle_stored_segments_page(result, from_segment, limit, from_time, to_time):
+    """
+    Serves a page of a stored result. Time ranges are bisected on the start-time
+    column of the columnar copy; plain pages are Range reads guided by the sidecar index.
+    """
+    bucket = result['bucket']
+    key = result['key']
+
+    if result.get('columnarKey') and (from_time is not None or to_time is not None):
+        columnar = read_object_bytes(bucket, result['columnarKey'])
+        if columnar is not None:
+            return handle_columnar_segments_page(
+                load_columnar_transcript(columnar), from_segment, limit, from_time, to_time)
+
+    index = read_json_object(bucket, key.replace('_enhanced.json', '_enhanced.index.json'))
+    if index is None:
+        # Results stored before the sidecar index existed are read whole
+        stored = read_json_object(bucket, key)
+        if stored is None:
+            raise ValueError('Stored transcript not found')
+        segments = stored.get('segments', [])
+        page = []
+        next_segment = from_segment
+        for position in range(from_segment, len(segments)):
+            if len(page) >= limit:
+                break
+            if is_in_time_range(segments[position], from_time, to_time):
+                page.append(segments[position])
+            next_segment = position + 1
+        return create_segments_page_response('COMPLETED', page, from_segment, next_segment, len(segments), True)
+
+    first, last = select_segment_range(index, from_segment, limit, from_time, to_time)
+    raw_segments = ''
+    if first < last:
+        start = index['offsets'][first]
+        end = index['offsets'][last - 1] + index['lengths'][last - 1] - 1
+        raw_segments = read_byte_range(bucket, key, start, end)
+
+    # The segment bytes are returned exactly as stored, without parsing them
+    metadata = json.dumps({
+        'fromSegment': first,
+        'nextSegment': last,
+        'readySegments': index['segmentCount'],
+        'complete': True
+    })
+    return create_raw_response(200, (
+        '{"status": "COMPLETED", "result": {"segments": [' + raw_segments + '], '
+        + metadata[1:] + ', "error": null}'
+    ), {'Cache-Control': 'no-cache'})
+
+
+def handle_columnar_segments_page(transcript, from_segment, limit, from_time, to_time):
+    """
+    Serves a page from a columnar transcript; time ranges are found by bisecting
+    its start-time column.
+    """
+    segment_count = len(transcript)
+    first = min(from_segment, segment_count)
+    if from_time is not None:
+        first = max(first, transcript.find_segment(from_time))
+    last = min(first + limit, segment_count)
+    if to_time is not None:
+        last = max(first, min(last, bisect_right(transcript.starts, to_time)))
+    return create_segments_page_response(
+        'COMPLETED', transcript.get_segments(first, last), first, last, segment_count, True)
+
+
+def create_segments_page_response(status, segments, from_segment, next_segment, ready_segments, complete):
+    return create_response(200, {
+        'status': status,
+        'result': {
+            'segments': segments,
+            'fromSegment': from_segment,
+            'nextSegment': next_segment,
+            'readySegments': ready_segments,
+            'complete': complete
+        },
+        'error': None
+    }, {'Cache-Control': 'no-cache'})
+
+
+def read_search_shard(key):
+    """
+    Returns an index shard, or None if it does not exist. Cached shards are only
+    downloaded again once the store Lambda has changed them.
+    """
+    with search_shard_cache_lock:
+        cached = search_shard_cache.get(key)
+
+    request = {'Bucket': TRANSCRIPTION_OUTPUT_BUCKET, 'Key': key}
+    if cached:
+        request['IfNoneMatch'] = cached[0]
+
+    try:
+        response = s3.get_object(**request)
+    except ClientError as e:
+        error_code = e.response.get('Error', {}).get('Code')
+        if error_code in ('304', 'NotModified') and cached:
+            metrics.count('SearchShardCacheHits')
+            with search_shard_cache_lock:
+                if key in search_shard_cache:
+                    search_shard_cache.move_to_end(key)
+            return cached[1]
+        if error_code in ('NoSuchKey', '404'):
+            return None
+        raise
+
+    with metrics.span('ParseTime'):
+        shard = load_shard(response['Body'].read())
+    with search_shard_cache_lock:
+        search_shard_cache[key] = (response['ETag'], shard)
+        search_shard_cache.move_to_end(key)
+        while len(search_shard_cache) > SEARCH_CACHE_SHARDS:
+            search_shard_cache.popitem(last=False)
+    return shard
+
+
+def handle_search(query, category, limit):
+    """
+    Finds the transcripts that contain a phrase, or with `category` that list an
+    entity, from the search index alone. Files are ranked by their number of
+    matching segments.
+    """
+    try:
+        kind, keys = get_query_keys(query, category)
+        if not keys or len(keys) > MAX_SEARCH_TERMS:
+            return create_response(400, {
+                'status': 'ERROR',
+                'result': None,
+                'error': f"The search must have between 1 and {MAX_SEARCH_TERMS} words"
+            })
+
+        shard_keys = get_query_shard_keys(keys)
+        with metrics.span('SearchReadTime'), ThreadPoolExecutor(max_workers=SEARCH_CONCURRENCY) as executor:
+            shards = dict(zip(shard_keys, executor.map(read_search_shard, shard_keys)))
+        metrics.count('SearchShardsRead', len(shard_keys))
+
+        with metrics.span('SearchMatchTime'):
+            matches = {}
+            for partition in range(SEARCH_INDEX_PARTITIONS):
+                matches.update(find_matches(shards, partition, kind, keys))
+
+        ranked = sorted(matches.items(), key=lambda item: (-len(item[1]), item[0]))
+        return create_response(200, {
+            'status': 'OK',
+            'query': query,
+            'category': category,
+            'totalFiles': len(ranked),
+            'totalMatches': sum(len(file_matches) for _, file_matches in ranked),
+            'results': [
+                {
+                    'fileName': file_name,
+                    'matchCount': len(file_matches),
+                    'matches': [{'segment': segment, 'timestamp': timestamp} for segment, timestamp in file_matches]
+                }
+                for file_name, file_matches in ranked[:limit]
+            ]
+        })
+
+    except ClientError as e:
+        print(f"AWS client error: {str(e)}")
+        return create_response(500, {
+            'status': 'ERROR',
+            'result': None,
+            'error': f'AWS client error: {str(e)}'
+        })
@@ -0,0 +1,171 @@
+"""
+Structured metrics for the stt-handler Lambda.
+
+Each invocation collects timing spans and counters and prints them as one
+CloudWatch Embedded Metric Format (EMF) line when the handler returns, which
+CloudWatch turns into metrics without any API calls. METRICS_LEVEL selects the
+output: 'off' prints nothing, 'info' the metrics line, and 'debug' also the
+payload dumps. When disabled, spans and counters return before doing any work.
+
+Kept in sync with stt-process/layer/metrics.py; this service is deployed on its own.
+"""
+from functools import wraps
+import json
+import os
+import threading
+import time
+
+METRICS_LEVEL = os.environ.get('METRICS_LEVEL', 'info').lower()
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'STT/Pipeline')
+LEVELS = {'off': 0, 'info': 1, 'debug': 2}
+MAX_VALUES_PER_METRIC = 100  # EMF limit on the values of one metric in one line
+
+
+class NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class Span:
+    __slots__ = ('metrics', 'name', 'started')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.record(self.name, (time.perf_counter() - self.started) * 1000, 'Milliseconds')
+        return False
+
+
+class Metrics:
+    """
+    Metrics of one Lambda. Counters are summed over an invocation; spans and
+    recorded values keep every observation. Safe to use from worker threads.
+    """
+
+    def __init__(self, service, level=None):
+        self.service = service
+        level = LEVELS.get((level or METRICS_LEVEL).lower(), LEVELS['info'])
+        self.enabled = level >= LEVELS['info']
+        self.debug_enabled = level >= LEVELS['debug']
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.values = {}
+        self.units = {}
+        self.properties = {}
+
+    def span(self, name):
+        """
+        Times a block: `with metrics.span('ParseTime'): ...`
+        """
+        return Span(self, name) if self.enabled else NOOP_SPAN
+
+    def count(self, name, value=1, unit='Count'):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.units[name] = unit
+            self.values[name] = [self.values.get(name, [0])[0] + value]
+
+    def record(self, name, value, unit='None'):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.units[name] = unit
+            values = self.values.setdefault(name, [])
+            if len(values) < MAX_VALUES_PER_METRIC:
+                values.append(value)
+
+    def set_property(self, name, value):
+        """
+        Adds a searchable field to the metrics line without making it a dimension.
+        """
+        if self.enabled:
+            self.properties[name] = value
+
+    def debug(self, message, payload=None):
+        """
+        Prints a message, and the payload as JSON, only at the 'debug' level.
+        """
+        if self.debug_enabled:
+            print(message if payload is None else f"{message}: {json.dumps(payload, default=str)}")
+
+    def flush(self):
+        """
+        Prints the collected metrics as one EMF line and starts over.
+        """
+        with self.lock:
+            values, units, properties = self.values, self.units, self.properties
+            self.reset()
+        if not self.enabled or not values:
+            return
+
+        document = dict(properties, Service=self.service)
+        document['_aws'] = {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['Service']],
+                'Metrics': [{'Name': name, 'Unit': units[name]} for name in values]
+            }]
+        }
+        for name, observations in values.items():
+            document[name] = observations[0] if len(observations) == 1 else observations
+        print(json.dumps(document, default=str))
+
+    def instrument_handler(self, handler):
+        """
+        Decorates a Lambda handler to time it and flush its metrics when it returns or raises.
+        """
+        @wraps(handler)
+        def instrumented(event, context):
+            if not self.enabled:
+                return handler(event, context)
+
+            started = time.perf_counter()
+            try:
+                return handler(event, context)
+            except Exception:
+                self.count('Errors')
+                raise
+            finally:
+                self.record('HandlerTime', (time.perf_counter() - started) * 1000, 'Milliseconds')
+                self.set_property('requestId', getattr(context, 'aws_request_id', None))
+                self.flush()
+
+        return instrumented
+
+    def instrument_s3(self, client):
+        """
+        Counts the requests made and bytes moved by a boto3 S3 client through its
+        event hooks, so the call sites stay unchanged. Returns the client.
+        """
+        events = getattr(getattr(client, 'meta', None), 'events', None)
+        if self.enabled and events is not None:
+            events.register('provide-client-params.s3.PutObject', self.count_s3_write)
+            events.register('after-call.s3.GetObject', self.count_s3_read)
+        return client
+
+    def count_s3_write(self, params, **kwargs):
+        body = params.get('Body')
+        if isinstance(body, (bytes, bytearray, str)):
+            # Characters for str bodies, close enough for the mostly-ASCII JSON written here
+            self.count('S3BytesWritten', len(body), 'Bytes')
+        self.count('S3Puts')
+
+    def count_s3_read(self, parsed, **kwargs):
+        self.count('S3BytesRead', parsed.get('ContentLength') or 0, 'Bytes')
+        self.count('S3Gets')
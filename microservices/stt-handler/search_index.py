@@ -0,0 +1,101 @@
+"""
+Reader for the inverted index the store Lambda keeps over stored transcripts
+(s3://<bucket>/<SEARCH_INDEX_PREFIX>p<partition>/s<shard>.json.gz). See
+stt-process/store/search_index.py for the layout; the prefix, partition and
+shard counts must match the store Lambda's.
+"""
+import gzip
+import json
+import os
+import re
+import zlib
+
+SEARCH_INDEX_PREFIX = os.environ.get('SEARCH_INDEX_PREFIX', 'search-index/')
+SEARCH_INDEX_PARTITIONS = int(os.environ.get('SEARCH_INDEX_PARTITIONS', '8'))
+SEARCH_INDEX_SHARDS = int(os.environ.get('SEARCH_INDEX_SHARDS', '32'))
+
+TERM_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TERM_PATTERN.findall(text.casefold())
+
+
+def normalize_entity(value):
+    return " ".join(value.split()).casefold()
+
+
+def get_entity_key(category, value):
+    return f"{category}:{normalize_entity(value)}"
+
+
+def get_shard(key):
+    return zlib.crc32(key.encode('utf-8')) % SEARCH_INDEX_SHARDS
+
+
+def get_shard_key(partition, shard):
+    return f"{SEARCH_INDEX_PREFIX}p{partition:02d}/s{shard:03d}.json.gz"
+
+
+def load_shard(content):
+    return json.loads(gzip.decompress(content))
+
+
+def get_query_keys(query, category=None):
+    """
+    Returns ('entities', [entity key]) for an entity query, or ('terms', terms)
+    for a phrase query, whose terms must appear in order within one segment.
+    """
+    if category:
+        return 'entities', [get_entity_key(category, query)] if normalize_entity(query) else []
+    return 'terms', tokenize(query)
+
+
+def get_query_shard_keys(keys):
+    """
+    Returns the S3 keys of the shards holding the postings of `keys`, in every partition.
+    """
+    shards = sorted({get_shard(key) for key in keys})
+    return [get_shard_key(partition, shard) for partition in range(SEARCH_INDEX_PARTITIONS) for shard in shards]
+
+
+def match_phrase(term_postings):
+    """
+    Returns [segment, timestamp] for every segment in which the terms occur one
+    after the other, given the postings of each term in one file.
+    """
+    later_positions = [{posting[0]: set(posting[2:]) for posting in postings} for postings in term_postings[1:]]
+    matches = []
+    for posting in term_postings[0]:
+        segment = posting[0]
+        positions = [segment_positions.get(segment) for segment_positions in later_positions]
+        if not all(positions):
+            continue
+        if any(all(start + offset in positions[offset - 1] for offset in range(1, len(positions) + 1))
+               for start in posting[2:]):
+            matches.append([segment, posting[1]])
+    return matches
+
+
+def find_matches(shards, partition, kind, keys):
+    """
+    Returns {fileName: [[segment, timestamp], ...]} for the files of one partition
+    matching the query keys, given the shards read by S3 key (None for a shard
+    that does not exist). Files that list an entity without locating it in a
+    segment map to an empty list.
+    """
+    key_postings = []
+    for key in keys:
+        shard = shards.get(get_shard_key(partition, get_shard(key))) or {}
+        key_postings.append(shard.get(kind, {}).get(key) or {})
+
+    files = set(key_postings[0]).intersection(*key_postings[1:])
+    if kind == 'entities':
+        return {file_name: key_postings[0][file_name] for file_name in files}
+
+    matches = {}
+    for file_name in files:
+        file_matches = match_phrase([postings[file_name] for postings in key_postings])
+        if file_matches:
+            matches[file_name] = file_matches
+    return matches
@@ -0,0 +1,15 @@
+"""
+Shared fixtures for the stt-handler tests.
+"""
+import pytest
+
+from local_handler import RecordingS3, handler
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    s3 = RecordingS3()
+    monkeypatch.setattr(handler, 's3', s3)
+    handler.status_cache.clear()
+    handler.search_shard_cache.clear()
+    return s3
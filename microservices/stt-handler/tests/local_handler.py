@@ -0,0 +1,100 @@
+"""
+Loads the stt-handler against local stand-ins for its tests.
+
+The handler's S3 client is replaced by the in-memory stand-in from
+stt-process/benchmarks/local_s3.py; results are written with the pipeline's
+own encoders, loaded from stt-process under names that do not clash with the
+handler's modules.
+"""
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+import json
+import os
+import sys
+
+ROOT = Path(__file__).resolve().parent.parent
+STT_PROCESS = ROOT.parent.parent / 'stt-process'
+OUTPUT_BUCKET = 'test-transcription-output'
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ['TRANSCRIPTION_OUTPUT_BUCKET'] = OUTPUT_BUCKET
+os.environ['METRICS_LEVEL'] = 'off'
+
+sys.path.insert(0, str(STT_PROCESS / 'benchmarks'))
+
+from local_s3 import LocalS3
+
+
+def load_module(name, path):
+    spec = spec_from_file_location(name, path)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_handler():
+    """
+    Imports the handler's app.py. Its helper modules share names with the
+    pipeline's (metrics, search_index, transcript_columnar), so they are only
+    on the path while it is imported.
+    """
+    siblings = [path.stem for path in ROOT.glob('*.py')]
+    for name in siblings:
+        sys.modules.pop(name, None)
+    sys.path.insert(0, str(ROOT))
+    try:
+        return load_module('stt_handler_app', ROOT / 'app.py')
+    finally:
+        sys.path.remove(str(ROOT))
+        for name in siblings:
+            sys.modules.pop(name, None)
+
+
+handler = load_handler()
+
+
+enhanced_result = load_module('stt_enhanced_result', STT_PROCESS / 'layer' / 'enhanced_result.py')
+store_columnar = load_module('stt_store_columnar', STT_PROCESS / 'store' / 'transcript_columnar.py')
+
+
+class RecordingS3(LocalS3):
+    """
+    LocalS3 that records the keys read, so tests can tell which copy served a request.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.keys_read = []
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self.keys_read.append(Key)
+        return super().get_object(Bucket, Key, **kwargs)
+
+
+def write_job_state(s3, file_name, record):
+    return s3.put_object(Bucket=OUTPUT_BUCKET, Key=f"jobs/{file_name}.json", Body=json.dumps(record))
+
+
+def store_result(s3, file_name, result):
+    """
+    Writes an enhanced result, its sidecar index and columnar copy, and a
+    COMPLETED job-state record, as the enhance and store Lambdas do.
+    """
+    claim = enhanced_result.write_enhanced_result(s3, OUTPUT_BUCKET, f"stt-{file_name}.json", result)
+    columnar_key = claim['key'].replace('_enhanced.json', '_enhanced.columnar')
+    s3.put_object(Bucket=OUTPUT_BUCKET, Key=columnar_key, Body=store_columnar.encode_columnar_transcript(result))
+    write_job_state(s3, file_name, {
+        'fileName': file_name,
+        'stage': 'COMPLETED',
+        'status': 'COMPLETED',
+        'result': {'bucket': OUTPUT_BUCKET, 'key': claim['key'], 'columnarKey': columnar_key}
+    })
+
+
+def get_request(query, headers=None):
+    return {
+        'requestContext': {'http': {'method': 'GET'}},
+        'queryStringParameters': query,
+        'headers': headers or {}
+    }
+
@@ -0,0 +1,47 @@
+import json
+
+from local_handler import get_request, handler, store_result
+
+RESULT = {
+    'transcript': 'A transcript.',
+    'segments': [
+        {'timestamp': str(10.0 * position), 'speaker': f"Speaker {position % 3}", 'text': f"Segment {position}."}
+        for position in range(100)
+    ],
+    'entities': {}
+}
+
+
+def get_page(query):
+    response = handler.lambda_handler(get_request(dict(query, fileName='hearing')), None)
+    assert response['statusCode'] == 200
+    return json.loads(response['body'])['result']
+
+
+def test_time_range_is_served_from_the_columnar_copy(s3):
+    store_result(s3, 'hearing', RESULT)
+
+    page = get_page({'fromTime': '95', 'toTime': '300', 'limit': '10'})
+
+    assert [segment['text'] for segment in page['segments']] == [f"Segment {position}." for position in range(10, 20)]
+    assert (page['fromSegment'], page['nextSegment'], page['readySegments']) == (10, 20, 100)
+    assert 'stt-hearing_enhanced.columnar' in s3.keys_read
+    assert 'stt-hearing_enhanced.index.json' not in s3.keys_read
+
+
+def test_time_range_ends_within_the_page(s3):
+    store_result(s3, 'hearing', RESULT)
+
+    page = get_page({'fromTime': '0', 'toTime': '25'})
+
+    assert [segment['timestamp'] for segment in page['segments']] == ['0.0', '10.0', '20.0']
+
+
+def test_segment_page_is_read_with_the_sidecar_index(s3):
+    store_result(s3, 'hearing', RESULT)
+
+    page = get_page({'fromSegment': '95', 'limit': '10'})
+
+    assert [segment['text'] for segment in page['segments']] == [f"Segment {position}." for position in range(95, 100)]
+    assert 'stt-hearing_enhanced.index.json' in s3.keys_read
+    assert 'stt-hearing_enhanced.columnar' not in s3.keys_read
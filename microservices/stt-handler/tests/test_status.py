@@ -0,0 +1,124 @@
+from types import SimpleNamespace
+import json
+
+import pytest
+
+from local_handler import get_request, handler, store_result, write_job_state
+
+RUNNING = {'fileName': 'hearing', 'stage': 'TRANSCRIBING', 'status': 'IN_PROGRESS', 'percent': 10}
+
+
+class FakeClock:
+    """
+    Replaces the handler's time module, so a long-poll runs without sleeping.
+    `on_sleep` is called with the number of sleeps so far.
+    """
+
+    def __init__(self, on_sleep=None):
+        self.now = 0.0
+        self.sleeps = 0
+        self.on_sleep = on_sleep
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.sleeps += 1
+        if self.on_sleep:
+            self.on_sleep(self.sleeps)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(handler, 'time', SimpleNamespace(monotonic=clock.monotonic, sleep=clock.sleep))
+    return clock
+
+
+def get_status(query, headers=None):
+    return handler.lambda_handler(get_request(dict(query, fileName='hearing'), headers), None)
+
+
+def test_status_is_answered_from_the_job_state(s3):
+    etag = write_job_state(s3, 'hearing', RUNNING)['ETag']
+
+    response = get_status({})
+
+    assert response['statusCode'] == 200
+    assert response['headers']['ETag'] == etag
+    body = json.loads(response['body'])
+    assert (body['status'], body['job']['percent']) == ('IN_PROGRESS', 10)
+
+
+def test_unchanged_job_state_returns_304(s3, clock):
+    etag = write_job_state(s3, 'hearing', RUNNING)['ETag']
+
+    response = get_status({}, {'If-None-Match': etag})
+
+    assert response['statusCode'] == 304
+    assert response['headers']['ETag'] == etag
+    assert clock.sleeps == 0
+
+
+def test_long_poll_returns_when_the_job_state_changes(s3, clock):
+    etag = write_job_state(s3, 'hearing', RUNNING)['ETag']
+    clock.on_sleep = lambda sleeps: sleeps == 3 and write_job_state(s3, 'hearing', dict(RUNNING, percent=40))
+
+    response = get_status({'wait': '10'}, {'If-None-Match': etag})
+
+    assert response['statusCode'] == 200
+    assert response['headers']['ETag'] != etag
+    assert json.loads(response['body'])['job']['percent'] == 40
+    assert clock.sleeps == 3
+
+
+def test_long_poll_is_bounded(s3, clock):
+    etag = write_job_state(s3, 'hearing', RUNNING)['ETag']
+
+    response = get_status({'wait': '600'}, {'If-None-Match': etag})
+
+    assert response['statusCode'] == 304
+    assert clock.now == handler.MAX_LONG_POLL_SECONDS
+
+
+def test_completed_status_embeds_the_stored_result(s3):
+    store_result(s3, 'hearing', {'transcript': 'A transcript.', 'segments': [
+        {'timestamp': '0.0', 'speaker': 'Judge', 'text': 'A transcript.'}
+    ], 'entities': {}})
+
+    body = json.loads(get_status({})['body'])
+
+    assert body['status'] == 'COMPLETED'
+    assert body['result']['segments'][0]['speaker'] == 'Judge'
+
+
+def get_batch_status():
+    response = handler.lambda_handler(get_request({'fileNames': 'hearing'}), None)
+    return json.loads(response['body'])
+
+
+def test_finished_status_is_cached_until_the_job_state_changes(s3):
+    write_job_state(s3, 'hearing', dict(RUNNING, stage='FAILED', status='FAILED', error='Transcription failed'))
+    assert get_batch_status()['results'][0]['status'] == 'FAILED'
+    assert get_batch_status()['cacheHits'] == 1
+
+    write_job_state(s3, 'hearing', dict(RUNNING, stage='QUEUED', status='IN_PROGRESS', percent=0))
+    body = get_batch_status()
+
+    assert body['cacheHits'] == 0
+    assert (body['results'][0]['status'], body['results'][0]['error']) == ('IN_PROGRESS', None)
+
+
+def test_finished_job_etag_is_not_modified_until_a_new_run(s3, clock):
+    store_result(s3, 'hearing', {'transcript': 'A transcript.', 'segments': [], 'entities': {}})
+    etag = get_status({})['headers']['ETag']
+    get_batch_status()
+    assert get_status({'wait': '10'}, {'If-None-Match': etag})['statusCode'] == 304
+    assert clock.sleeps == 0
+
+    write_job_state(s3, 'hearing', dict(RUNNING, stage='QUEUED', percent=0))
+    response = get_status({'wait': '10'}, {'If-None-Match': etag})
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['status'] == 'IN_PROGRESS'
@@ -0,0 +1,57 @@
+import pytest
+
+from local_handler import handler, store_columnar
+
+RESULT = {
+    'transcript': 'Good morning. Bonjour, votre honneur.',
+    'segments': [
+        {'timestamp': '0.0', 'speaker': 'Judge', 'text': 'Good morning.'},
+        {'timestamp': '4.25', 'speaker': 'Counsel for the Defense', 'text': 'Bonjour, votre honneur.'},
+        {'timestamp': '9.5', 'speaker': 'Judge', 'text': ''}
+    ],
+    'entities': {'JUDGE': ['Judge'], 'CASE_NUMBER': []},
+    's3': {'transcriptionOutputBucket': 'outputs', 'transcriptionJobName': 'stt-hearing.json'}
+}
+
+
+def round_trip(result):
+    """
+    Encodes with the store Lambda's copy and decodes with the stt-handler's.
+    """
+    return handler.load_columnar_transcript(store_columnar.encode_columnar_transcript(result))
+
+
+def test_result_round_trips_between_the_copies():
+    transcript = round_trip(RESULT)
+
+    assert transcript.to_dict() == RESULT
+    assert len(transcript) == 3
+    assert transcript.get_segments(1, 2) == RESULT['segments'][1:2]
+    assert transcript.find_segment(4.0) == 1
+
+
+def test_timestamps_that_are_not_floats_round_trip():
+    segments = [
+        {'timestamp': '0.040', 'speaker': 'spk_0', 'text': 'One.'},
+        {'timestamp': 'unknown', 'speaker': 'spk_1', 'text': 'Two.'},
+        {'timestamp': '12', 'speaker': 'spk_0', 'text': 'Three.'}
+    ]
+
+    transcript = round_trip({'transcript': 'One. Two. Three.', 'segments': segments})
+
+    assert transcript.get_segments() == segments
+    assert list(transcript.starts) == [0.04, 0.04, 12.0]
+
+
+def test_empty_result_round_trips():
+    assert round_trip({'transcript': '', 'segments': [], 'entities': {}}).to_dict() == \
+        {'transcript': '', 'segments': [], 'entities': {}}
+
+
+def test_copies_agree_on_the_format():
+    handler_columnar = handler.load_columnar_transcript.__globals__
+
+    assert (handler_columnar['MAGIC'], handler_columnar['FORMAT_VERSION']) == \
+        (store_columnar.MAGIC, store_columnar.FORMAT_VERSION)
+    with pytest.raises(ValueError):
+        handler.load_columnar_transcript(b'JSON' + store_columnar.encode_columnar_transcript(RESULT)[4:])
@@ -0,0 +1,87 @@
+"""
+Zero-copy loader for the columnar transcripts written by the store Lambda
+(`<job>_enhanced.columnar`). See stt-process/store/transcript_columnar.py for
+the layout.
+"""
+from bisect import bisect_left
+import json
+import struct
+import zlib
+
+MAGIC = b'JVTC'
+FORMAT_VERSION = 1
+
+
+class ColumnarTranscript:
+    """
+    A decompressed columnar transcript. Columns are memoryviews over the single
+    decompressed buffer; segments are only materialized when asked for.
+    """
+
+    def __init__(self, data):
+        if bytes(data[:4]) != MAGIC:
+            raise ValueError('Not a columnar transcript')
+
+        self.buffer = zlib.decompress(memoryview(data)[4:])
+        view = memoryview(self.buffer)
+        header_length = struct.unpack_from('<I', view, 0)[0]
+        header = json.loads(bytes(view[4:4 + header_length]))
+        if header['version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported columnar transcript version: {header['version']}")
+
+        data_start = (4 + header_length + 7) // 8 * 8
+        sections = {
+            name: view[data_start + offset:data_start + offset + length]
+            for name, (offset, length) in header['sections'].items()
+        }
+
+        self.segment_count = header['segmentCount']
+        self.speakers = header['speakers']
+        self.fields = header['fields']
+        self.speaker_ids = sections['speakerIds'].cast('H')
+        self.starts = sections['starts'].cast('d')
+        self.ends = sections['ends'].cast('d')
+        self.text_offsets = sections['textOffsets'].cast('I')
+        self.text = sections['text']
+        self.transcript_bytes = sections['transcript']
+        self.timestamp_offsets = sections['timestampOffsets'].cast('I') if 'timestampOffsets' in sections else None
+        self.timestamp_text = sections.get('timestampText')
+
+    def __len__(self):
+        return self.segment_count
+
+    def get_timestamp(self, index):
+        if self.timestamp_offsets is None:
+            return repr(self.starts[index])
+        return str(self.timestamp_text[self.timestamp_offsets[index]:self.timestamp_offsets[index + 1]], 'utf-8')
+
+    def get_segment(self, index):
+        return {
+            'timestamp': self.get_timestamp(index),
+            'speaker': self.speakers[self.speaker_ids[index]],
+            'text': str(self.text[self.text_offsets[index]:self.text_offsets[index + 1]], 'utf-8')
+        }
+
+    def get_segments(self, first=0, last=None):
+        last = self.segment_count if last is None else min(last, self.segment_count)
+        return [self.get_segment(index) for index in range(first, last)]
+
+    def find_segment(self, time):
+        """
+        Returns the index of the first segment starting at or after `time`.
+        """
+        return bisect_left(self.starts, time)
+
+    def to_dict(self):
+        """
+        Rebuilds the enhanced result in the same shape as the `_enhanced.json` object.
+        """
+        return dict(
+            self.fields,
+            transcript=str(self.transcript_bytes, 'utf-8'),
+            segments=self.get_segments()
+        )
+
+
+def load_columnar_transcript(data):
+    return ColumnarTranscript(data)
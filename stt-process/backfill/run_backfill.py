@@ -0,0 +1,471 @@
+"""
+Reprocesses archived Transcribe output through the stt-process pipeline in-process.
+
+Takes a directory of Transcribe output JSON files, or a manifest listing them,
+and runs every file through the enhance and store Lambdas' own code instead of
+S3 triggers and one Step Functions execution per file. Parsing, word alignment
+and chunking run in a process pool; the enhancement and NER requests of all
+files share one bounded thread pool. Every finished file is appended to a
+checkpoint in the output directory, so an interrupted run resumes where it
+stopped:
+
+    python backfill/run_backfill.py archive/ --output backfill-output --processes 4 --io-workers 16
+    python backfill/run_backfill.py --manifest manifest.json --output backfill-output
+
+A manifest is a JSON list of Transcribe output paths, relative to the manifest,
+or of {"fileName", "parts": [{"offset", "path"}]} entries for recordings that
+were transcribed in overlapping parts; those are merged the way the transcribe
+Lambda merges them.
+
+S3 is the in-memory stand-in from benchmarks/local_s3.py and OpenAI the stub
+server from benchmarks/stub_openai.py, unless --openai-base-url points at
+another one. The enhanced result, segment index and columnar copy of every file
+are written to the output directory, next to the search index the store Lambda
+keeps. Needs the Lambdas' own requirements (boto3, openai) installed.
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+from types import SimpleNamespace
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+OUTPUT_BUCKET = 'backfill-output'
+CHECKPOINT_NAME = 'checkpoint.jsonl'
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+sys.path.insert(0, str(ROOT / 'layer'))
+
+from job_state import get_file_name, get_file_name_from_job
+from local_s3 import LocalS3
+from stub_openai import start_stub_server
+
+# The Lambdas read their configuration at import time. The checkpoint tracks
+# the files here, so no job-state records are written.
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'backfill')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'backfill')
+os.environ.setdefault('OPENAI_API_KEY', 'stub')
+os.environ.setdefault('METRICS_LEVEL', 'off')
+os.environ.pop('JOB_STATE_BUCKET', None)
+os.environ.pop('PARTIAL_RESULTS_BUCKET', None)
+
+# Modules loaded once in every process of the pool
+worker = {}
+
+
+def load_module(name, path):
+    spec = spec_from_file_location(name, path)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_lambda(name, directory):
+    """
+    Imports a Lambda's app.py under `name`. Every Lambda has an app.py and some
+    share helper module names, so its siblings are re-imported from its own directory.
+    """
+    for sibling in directory.glob('*.py'):
+        sys.modules.pop(sibling.stem, None)
+    sys.path.insert(0, str(directory))
+    try:
+        return load_module(name, directory / 'app.py')
+    finally:
+        sys.path.remove(str(directory))
+
+
+def init_worker():
+    worker['enhance'] = load_lambda('enhance_app', ROOT / 'enhance')
+    worker['merge'] = load_module('transcript_merge', ROOT / 'transcribe' / 'transcript_merge.py')
+
+
+def read_json(path):
+    with open(path, 'rb') as file:
+        return json.load(file)
+
+
+def prepare_file(entry):
+    """
+    Reads a file's transcript, merging its parts if it has any, and packs it into
+    enhancement chunks. Runs in the process pool.
+    """
+    if 'parts' in entry:
+        parts = sorted(
+            ({'offset': float(part['offset']), 'transcript': read_json(part['path'])} for part in entry['parts']),
+            key=lambda part: part['offset']
+        )
+        transcript = worker['merge'].merge_transcripts(parts, job_name=f"stt-{entry['fileName']}")
+    else:
+        transcript = read_json(entry['path'])
+
+    enhance = worker['enhance']
+    results = transcript['results']
+    return {
+        'chunks': enhance.split_transcript_into_batches(transcript, enhance.MAX_TOKENS),
+        'audioSeconds': max((float(item['end_time']) for item in results['items'] if 'end_time' in item), default=0.0)
+    }
+
+
+def get_file_name_for_path(path):
+    """
+    Returns the file name a Transcribe output file is tracked under, as the Lambdas do.
+    """
+    return get_file_name_from_job(get_file_name(Path(path).name))
+
+
+def read_entries(source=None, manifest=None, output=None):
+    """
+    Returns the files to process as [{'fileName', 'path'}] or [{'fileName', 'parts'}].
+    """
+    if manifest:
+        entries = []
+        for item in read_json(manifest):
+            item = {'path': item} if isinstance(item, str) else item
+            if 'parts' in item:
+                parts = [dict(part, path=str(manifest.parent / part['path'])) for part in item['parts']]
+                entries.append({'fileName': item['fileName'], 'parts': parts})
+            else:
+                path = manifest.parent / item['path']
+                entries.append({'fileName': item.get('fileName') or get_file_name_for_path(path), 'path': str(path)})
+    else:
+        output = output.resolve() if output else None
+        entries = [
+            {'fileName': get_file_name_for_path(path), 'path': str(path)}
+            for path in sorted(source.rglob('*.json'))
+            if not (output and output in path.resolve().parents)
+        ]
+
+    file_names = [entry['fileName'] for entry in entries]
+    duplicates = sorted({file_name for file_name in file_names if file_names.count(file_name) > 1})
+    if duplicates:
+        raise SystemExit(f"Several inputs share the file names {duplicates}; list them in a manifest with fileName set")
+    return entries
+
+
+class Checkpoint:
+    """
+    Append-only record of finished files, one JSON line each, flushed to disk per file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def read_completed(self):
+        completed = set()
+        if not self.path.exists():
+            return completed
+        for line in self.path.read_text().splitlines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # A line cut short by an interrupted run
+            if record.get('status') == 'completed':
+                completed.add(record['fileName'])
+        return completed
+
+    def append(self, record):
+        with open(self.path, 'a') as file:
+            file.write(json.dumps(dict(record, finishedAt=datetime.now(timezone.utc).isoformat())) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+
+
+class Progress:
+    """
+    Counts finished files and audio, and prints the throughput at most every `interval` seconds.
+    """
+
+    def __init__(self, total, interval):
+        self.total = total
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.last_report = self.started
+        self.completed = 0
+        self.failed = 0
+        self.audio_seconds = 0.0
+
+    def add(self, record):
+        if record['status'] == 'completed':
+            self.completed += 1
+            self.audio_seconds += record['audioSeconds']
+        else:
+            self.failed += 1
+
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            print(self.describe())
+
+    def summary(self):
+        minutes = max(time.perf_counter() - self.started, 1e-9) / 60
+        return {
+            'files': self.completed,
+            'failed': self.failed,
+            'audioHours': self.audio_seconds / 3600,
+            'minutes': minutes,
+            'filesPerMinute': self.completed / minutes,
+            'audioHoursPerMinute': self.audio_seconds / 3600 / minutes
+        }
+
+    def describe(self):
+        summary = self.summary()
+        return (f"{summary['files'] + summary['failed']}/{self.total} files ({summary['failed']} failed), "
+                f"{summary['audioHours']:.2f} audio-h in {summary['minutes']:.1f} min: "
+                f"{summary['filesPerMinute']:.1f} files/min, {summary['audioHoursPerMinute']:.2f} audio-h/min")
+
+
+class BackfillRunner:
+    """
+    Runs files through prepare (process pool), enhance (shared I/O pool) and store
+    (main thread), with at most `max_in_flight` files between the first and last.
+    """
+
+    def __init__(self, enhance, store, output, processes, io_workers, max_in_flight, max_attempts, report_interval):
+        self.enhance = enhance
+        self.store = store
+        self.output = output
+        self.processes = processes
+        self.io_workers = io_workers
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+        self.report_interval = report_interval
+        self.checkpoint = Checkpoint(output / CHECKPOINT_NAME)
+        self.events = queue.Queue()
+        self.lock = threading.Lock()
+
+        # The Lambdas' S3 calls all go to one in-memory stand-in
+        self.s3 = LocalS3()
+        enhance.s3 = self.s3
+        store.boto3 = SimpleNamespace(client=lambda *args, **kwargs: self.s3)
+
+        # The search index the store Lambda updates is mirrored in the output directory
+        self.index_prefix = sys.modules[store.update_search_index.__module__].SEARCH_INDEX_PREFIX
+        self.index_etags = self.load_search_index()
+
+    def run(self, entries):
+        progress = Progress(len(entries), self.report_interval)
+        pending = iter(entries)
+        in_flight = 0
+        context = multiprocessing.get_context('spawn')  # The stub server's threads make forking unsafe
+
+        with ProcessPoolExecutor(self.processes, mp_context=context, initializer=init_worker) as process_pool, \
+                ThreadPoolExecutor(max_workers=self.io_workers) as io_pool:
+            while True:
+                while in_flight < self.max_in_flight:
+                    entry = next(pending, None)
+                    if entry is None:
+                        break
+                    file = {'entry': entry, 'started': time.perf_counter()}
+                    process_pool.submit(prepare_file, entry).add_done_callback(partial(self.on_prepared, file))
+                    in_flight += 1
+                if not in_flight:
+                    break
+
+                file, error = self.events.get()
+                record = self.finish_file(file, error) if error or 'enhanced' in file else self.start_enhancing(file, io_pool)
+                if record:
+                    self.checkpoint.append(record)
+                    progress.add(record)
+                    in_flight -= 1
+
+        return progress
+
+    def on_prepared(self, file, future):
+        try:
+            file.update(future.result())
+        except Exception as e:
+            self.events.put((file, f"Preparing failed: {e}"))
+            return
+        self.events.put((file, None))
+
+    def start_enhancing(self, file, io_pool):
+        """
+        Queues the chunks of a prepared file on the shared I/O pool. Returns the
+        file's record straight away if it has nothing to enhance.
+        """
+        if not file['chunks']:
+            return self.finish_file(file, 'No speaker segments to enhance')
+
+        file['results'] = [None] * len(file['chunks'])
+        file['remaining'] = len(file['chunks'])
+        for index, chunk in enumerate(file['chunks']):
+            io_pool.submit(self.enhance_chunk, index, chunk).add_done_callback(partial(self.on_chunk_enhanced, file, index))
+        return None
+
+    def enhance_chunk(self, index, chunk):
+        """
+        Enhances a chunk and, unless the enhancement request already returned them,
+        extracts its entities, so every LLM request goes through the shared pool.
+        """
+        enhanced_chunk = self.enhance.enhance_chunk_with_retries(index, chunk, self.max_attempts)
+        if enhanced_chunk and not isinstance(enhanced_chunk.get('entities'), dict):
+            entities = self.enhance.extract_entities_with_retries(index, enhanced_chunk['transcript'], self.max_attempts)
+            if entities is None:
+                return None
+            enhanced_chunk['entities'] = entities
+        return enhanced_chunk
+
+    def on_chunk_enhanced(self, file, index, future):
+        try:
+            enhanced_chunk = future.result()
+        except Exception as e:
+            print(f"Warning: chunk {index} of {file['entry']['fileName']} failed: {e}")
+            enhanced_chunk = None
+
+        with self.lock:
+            file['results'][index] = enhanced_chunk
+            file['remaining'] -= 1
+            if file['remaining']:
+                return
+            file['enhanced'] = file.pop('results')
+        self.events.put((file, None))
+
+    def finish_file(self, file, error=None):
+        """
+        Stores an enhanced file and returns its checkpoint record.
+        """
+        file_name = file['entry']['fileName']
+        try:
+            if error:
+                raise ValueError(error)
+            segments = self.store_file(file_name, file['enhanced'])
+        except Exception as e:
+            print(f"Error: {file_name} failed: {e}")
+            return {'fileName': file_name, 'status': 'failed', 'error': str(e)}
+
+        return {
+            'fileName': file_name,
+            'status': 'completed',
+            'audioSeconds': file['audioSeconds'],
+            'chunks': len(file['chunks']),
+            'segments': segments,
+            'seconds': round(time.perf_counter() - file['started'], 3)
+        }
+
+    def store_file(self, file_name, enhanced_chunks):
+        """
+        Combines the chunks, merges their entities, and runs the store Lambda on the
+        written result, as the workflow's last two steps do. The stored objects are
+        copied to the output directory. Returns the number of segments.
+        """
+        failed_chunks = [index for index, chunk in enumerate(enhanced_chunks) if chunk is None]
+        if failed_chunks:
+            raise ValueError(f"Enhancement failed for chunks {failed_chunks}")
+
+        # Every chunk carries its entities, so this only adds the local extraction
+        result = self.enhance.perform_ner_on_transcript(
+            self.enhance.combine_enhanced_chunks(enhanced_chunks), enhanced_chunks)
+        if not result:
+            raise ValueError('NER process failed')
+
+        key = f"stt-{file_name}.json"
+        result['s3'] = {'transcriptionOutputBucket': OUTPUT_BUCKET, 'transcriptionJobName': key}
+        claim = self.enhance.write_enhanced_result(self.s3, OUTPUT_BUCKET, key, result)
+        self.store.lambda_handler({'statusCode': 200, 'result': claim, 'fileName': file_name}, None)
+
+        columnar_key = claim['key'].replace('_enhanced.json', '_enhanced.columnar')
+        for stored_key in (claim['key'], claim['indexKey'], columnar_key):
+            body = self.s3.get_object(Bucket=OUTPUT_BUCKET, Key=stored_key)['Body'].read()
+            (self.output / Path(stored_key).name).write_bytes(body)
+            self.s3.delete_object(Bucket=OUTPUT_BUCKET, Key=stored_key)
+        self.save_search_index()
+
+        return len(result['segments'])
+
+    def load_search_index(self):
+        """
+        Loads the index shards and file records of an earlier run, so resumed runs
+        keep adding to them. Returns their ETags.
+        """
+        etags = {}
+        index_dir = self.output / self.index_prefix
+        for path in sorted(index_dir.rglob('*.json*')) if index_dir.is_dir() else []:
+            if path.suffix == '.tmp':
+                continue
+            key = self.index_prefix + path.relative_to(index_dir).as_posix()
+            etags[key] = self.s3.put_object(Bucket=OUTPUT_BUCKET, Key=key, Body=path.read_bytes())['ETag']
+        return etags
+
+    def save_search_index(self):
+        """
+        Writes the index shards and file records changed since the last call to the output directory.
+        """
+        for stored in self.s3.list_objects_v2(Bucket=OUTPUT_BUCKET, Prefix=self.index_prefix)['Contents']:
+            if self.index_etags.get(stored['Key']) == stored['ETag']:
+                continue
+            path = self.output / stored['Key']
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temporary_path = path.with_name(path.name + '.tmp')
+            temporary_path.write_bytes(self.s3.get_object(Bucket=OUTPUT_BUCKET, Key=stored['Key'])['Body'].read())
+            os.replace(temporary_path, path)  # A shard is never left half written
+            self.index_etags[stored['Key']] = stored['ETag']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('source', type=Path, nargs='?', help='Directory of Transcribe output JSON files')
+    parser.add_argument('--manifest', type=Path, help='JSON list of the files to process, instead of a directory')
+    parser.add_argument('--output', type=Path, required=True, help='Directory for the results and the checkpoint')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='Processes for parsing and chunking')
+    parser.add_argument('--io-workers', type=int, default=16, help='LLM requests in flight across all files')
+    parser.add_argument('--max-in-flight', type=int, help='Files between reading and storing at once '
+                                                          '(default: processes + io-workers)')
+    parser.add_argument('--max-attempts', type=int, help='Attempts per chunk (default: ENHANCE_MAX_ATTEMPTS)')
+    parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint of an earlier run')
+    parser.add_argument('--report-interval', type=float, default=30.0, help='Seconds between throughput lines')
+    parser.add_argument('--openai-base-url', help='OpenAI-compatible stand-in to use instead of the stub server')
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds the stub server takes per response")
+    args = parser.parse_args()
+    if bool(args.source) == bool(args.manifest):
+        parser.error('Give either a source directory or --manifest')
+
+    args.output.mkdir(parents=True, exist_ok=True)
+    entries = read_entries(args.source, args.manifest, args.output)
+    checkpoint = Checkpoint(args.output / CHECKPOINT_NAME)
+    if args.restart and checkpoint.path.exists():
+        checkpoint.path.unlink()
+    completed = checkpoint.read_completed()
+    if completed:
+        entries = [entry for entry in entries if entry['fileName'] not in completed]
+        print(f"Resuming: {len(completed)} files already completed")
+
+    stub = None
+    if args.openai_base_url:
+        os.environ['OPENAI_BASE_URL'] = args.openai_base_url
+    else:
+        stub = start_stub_server(latency=args.latency)
+        os.environ['OPENAI_BASE_URL'] = stub.base_url
+
+    enhance = load_lambda('enhance_app', ROOT / 'enhance')
+    store = load_lambda('store_app', ROOT / 'store')
+    runner = BackfillRunner(
+        enhance, store, args.output,
+        processes=max(1, args.processes),
+        io_workers=max(1, args.io_workers),
+        max_in_flight=max(1, args.max_in_flight or args.processes + args.io_workers),
+        max_attempts=max(1, args.max_attempts or enhance.ENHANCE_MAX_ATTEMPTS),
+        report_interval=args.report_interval
+    )
+
+    print(f"Processing {len(entries)} files with {runner.processes} processes and {runner.io_workers} I/O workers")
+    try:
+        progress = runner.run(entries)
+    finally:
+        if stub:
+            stub.shutdown()
+    print(progress.describe())
+    if progress.failed:
+        raise SystemExit(f"{progress.failed} files failed; run again to retry them")
+
+
+if __name__ == '__main__':
+    main()
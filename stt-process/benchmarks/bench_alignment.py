@@ -0,0 +1,71 @@
+"""
+Benchmarks segment-to-word alignment in the enhance Lambda.
+
+Compares the previous linear scan per segment against the sorted time index
+on a synthetic multi-hour transcript:
+
+    python benchmarks/bench_alignment.py --hours 3 --speakers 4
+"""
+from pathlib import Path
+import argparse
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'enhance'))
+
+from synthetic import generate_transcript
+from transcript_index import build_transcript_index, get_words_in_range
+
+
+def scan_text_for_segment(segment, transcript_items):
+    # Previous implementation: a full scan of every item for each segment
+    segment_text = []
+    start_time = float(segment['start_time'])
+    end_time = float(segment['end_time'])
+
+    for item in transcript_items:
+        if 'start_time' in item and start_time <= float(item['start_time']) <= end_time:
+            if item['type'] == 'pronunciation' or item['type'] == 'punctuation':
+                segment_text.append(item['alternatives'][0]['content'])
+
+    return " ".join(segment_text)
+
+
+def indexed_text_for_segment(segment, transcript_index):
+    return " ".join(get_words_in_range(
+        transcript_index, float(segment['start_time']), float(segment['end_time'])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hours', type=float, default=3.0)
+    parser.add_argument('--speakers', type=int, default=4)
+    parser.add_argument('--scan-segments', type=int, default=200,
+                        help='Number of segments to time with the linear scan (extrapolated to the full transcript)')
+    args = parser.parse_args()
+
+    transcript = generate_transcript(hours=args.hours, speakers=args.speakers)
+    segments = transcript['results']['speaker_labels']['segments']
+    items = transcript['results']['items']
+    print(f"Transcript: {args.hours}h, {len(segments)} segments, {len(items)} items")
+
+    started = time.perf_counter()
+    transcript_index = build_transcript_index(items)
+    indexed = [indexed_text_for_segment(segment, transcript_index) for segment in segments]
+    indexed_seconds = time.perf_counter() - started
+
+    sample = segments[:args.scan_segments]
+    started = time.perf_counter()
+    scanned = [scan_text_for_segment(segment, items) for segment in sample]
+    scan_seconds = (time.perf_counter() - started) * len(segments) / max(len(sample), 1)
+
+    if scanned != indexed[:len(sample)]:
+        raise SystemExit("Mismatch between indexed and scanned segment text")
+
+    print(f"Linear scan (extrapolated): {scan_seconds:.2f}s")
+    print(f"Sorted index (build + lookups): {indexed_seconds:.3f}s")
+    print(f"Speedup: {scan_seconds / indexed_seconds:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
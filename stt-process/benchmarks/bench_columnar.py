@@ -0,0 +1,88 @@
+"""
+Benchmarks the columnar transcript format against the JSON enhanced result.
+
+Builds an enhanced result from a synthetic transcript and compares stored size,
+write time and load time of both formats:
+
+    python benchmarks/bench_columnar.py --hours 3 --speakers 4
+"""
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+import argparse
+import json
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'enhance'))
+
+from synthetic import generate_transcript
+from transcript_index import build_transcript_index, get_words_in_range
+
+
+def load_module(name, path):
+    # The writer and the loader share a module name in two deployment units
+    spec = spec_from_file_location(name, path)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+writer = load_module('columnar_writer', ROOT / 'store' / 'transcript_columnar.py')
+loader = load_module('columnar_loader', ROOT.parent / 'microservices' / 'stt-handler' / 'transcript_columnar.py')
+
+
+def build_enhanced_result(transcript):
+    results = transcript['results']
+    transcript_index = build_transcript_index(results['items'])
+    segments = [{
+        'timestamp': segment['start_time'],
+        'speaker': f"Speaker {segment['speaker_label'].split('_')[-1]}",
+        'text': " ".join(get_words_in_range(
+            transcript_index, float(segment['start_time']), float(segment['end_time'])))
+    } for segment in results['speaker_labels']['segments']]
+    return {
+        'transcript': " ".join(segment['text'] for segment in segments),
+        'segments': segments,
+        'entities': {'CASE_NUMBER': ['1:23-cv-04567'], 'DATE': ['March 3, 2023']}
+    }
+
+
+def best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hours', type=float, default=3.0)
+    parser.add_argument('--speakers', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    body = build_enhanced_result(generate_transcript(hours=args.hours, speakers=args.speakers))
+    print(f"Enhanced result: {args.hours}h, {len(body['segments'])} segments")
+
+    json_write, json_bytes = best_of(args.repeat, lambda: json.dumps(body).encode('utf-8'))
+    json_load, _ = best_of(args.repeat, lambda: json.loads(json_bytes))
+    columnar_write, columnar_bytes = best_of(args.repeat, lambda: writer.encode_columnar_transcript(body))
+    columnar_load, columnar = best_of(args.repeat, lambda: loader.load_columnar_transcript(columnar_bytes))
+    columnar_full, rebuilt = best_of(args.repeat, lambda: loader.load_columnar_transcript(columnar_bytes).to_dict())
+
+    if rebuilt != body:
+        raise SystemExit("Columnar transcript does not round-trip")
+
+    print(f"{'':10} {'size':>12} {'write':>10} {'load':>10}")
+    print(f"{'json':10} {len(json_bytes):>12,} {json_write * 1000:>8.1f}ms {json_load * 1000:>8.1f}ms")
+    print(f"{'columnar':10} {len(columnar_bytes):>12,} {columnar_write * 1000:>8.1f}ms {columnar_load * 1000:>8.1f}ms")
+    print(f"Columnar load + rebuild of every segment: {columnar_full * 1000:.1f}ms")
+    print(f"Size ratio: {len(columnar_bytes) / len(json_bytes):.2f}, "
+          f"{len(columnar)} segments addressable without parsing")
+
+
+if __name__ == '__main__':
+    main()
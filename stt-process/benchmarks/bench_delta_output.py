@@ -0,0 +1,100 @@
+"""
+Compares full and delta enhancement output against the stub OpenAI server.
+
+Packs a synthetic transcript into chunks and enhances them in both output modes.
+The stub takes time in proportion to the completion it writes, like the model
+does, and reports token usage from the text sizes. Checks that both modes give
+the same result shape and reports tokens and wall time:
+
+    python benchmarks/bench_delta_output.py --hours 3 --token-interval 0.002
+
+Needs the enhance Lambda's requirements (boto3, openai) installed.
+"""
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+import argparse
+import os
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'layer'))
+sys.path.insert(0, str(ROOT / 'enhance'))
+
+from stub_openai import start_stub_server
+from synthetic import generate_transcript
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ['OPENAI_API_KEY'] = 'stub'
+os.environ['RESPONSE_CACHE'] = 'none'
+os.environ['ENHANCE_STREAMING'] = 'false'
+
+
+def load_enhance():
+    spec = spec_from_file_location('enhance_app', ROOT / 'enhance' / 'app.py')
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run(enhance, chunks, mode):
+    enhance.ENHANCE_OUTPUT_MODE = mode
+    enhance.metrics.reset()
+    started = time.perf_counter()
+    enhanced_chunks = enhance.enhance_chunks(chunks, max_attempts=1)
+    wall = time.perf_counter() - started
+
+    values = enhance.metrics.values
+    return {
+        'wall': wall,
+        'promptTokens': values.get('PromptTokens', [0])[0],
+        'completionTokens': values.get('CompletionTokens', [0])[0],
+        'result': enhance.combine_enhanced_chunks(enhanced_chunks) if all(enhanced_chunks) else None
+    }
+
+
+def get_shape(result):
+    return (sorted(result), [(sorted(segment), segment['timestamp']) for segment in result['segments']])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hours', type=float, default=3.0)
+    parser.add_argument('--speakers', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds before the stub starts answering')
+    parser.add_argument('--token-interval', type=float, default=0.002, help='Seconds per four tokens of output')
+    args = parser.parse_args()
+
+    stub = start_stub_server(latency=args.latency, token_interval=args.token_interval)
+    os.environ['OPENAI_BASE_URL'] = stub.base_url
+    enhance = load_enhance()
+
+    transcript = generate_transcript(hours=args.hours, speakers=args.speakers)
+    chunks = enhance.split_transcript_into_batches(transcript, enhance.MAX_TOKENS)
+    print(f"Transcript: {args.hours}h, {sum(len(chunk) for chunk in chunks)} segments in {len(chunks)} chunks")
+
+    results = {}
+    with open(os.devnull, 'w') as devnull:
+        for mode in ('full', 'delta'):
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                results[mode] = run(enhance, chunks, mode)
+            finally:
+                sys.stdout = stdout
+    stub.shutdown()
+
+    if not results['full']['result'] or not results['delta']['result']:
+        raise SystemExit('Some chunks failed to enhance')
+    if get_shape(results['full']['result']) != get_shape(results['delta']['result']):
+        raise SystemExit('Delta output differs in shape from full output')
+
+    print(f"{'mode':<8}{'wall s':>9}{'prompt tokens':>15}{'completion tokens':>19}")
+    for mode, result in results.items():
+        print(f"{mode:<8}{result['wall']:>9.2f}{result['promptTokens']:>15}{result['completionTokens']:>19}")
+    full, delta = results['full'], results['delta']
+    print(f"Delta output: {1 - delta['completionTokens'] / full['completionTokens']:.0%} fewer completion tokens, "
+          f"{1 - delta['wall'] / full['wall']:.0%} less wall time, same result shape")
+
+
+if __name__ == '__main__':
+    main()
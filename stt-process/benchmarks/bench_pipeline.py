@@ -0,0 +1,332 @@
+"""
+Runs the stt-process pipeline offline and records the cost of every stage.
+
+Generates synthetic Transcribe output for each duration and speaker count, then
+drives the enhance helpers (split, segment text, enhancement against the stub
+OpenAI server, combine, write the result), the store Lambda and the stt-handler status and
+segments-page paths against an in-memory S3. Every stage reports wall time,
+peak RSS and traced allocations; results are saved under benchmarks/results so
+a later run can be compared against them:
+
+    python benchmarks/bench_pipeline.py --hours 1 3 10 --speakers 2 10
+    python benchmarks/bench_pipeline.py --compare benchmarks/results/<earlier>.json
+
+Needs the Lambdas' own requirements (boto3, openai, python-dotenv) installed.
+Peak RSS is per stage on Linux, where the high-water mark can be reset;
+elsewhere it is the process-wide maximum so far.
+"""
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+from types import SimpleNamespace
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = Path(__file__).resolve().parent.parent
+HANDLER_DIR = ROOT.parent / 'microservices' / 'stt-handler'
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+OUTPUT_BUCKET = 'bench-transcription-output'
+FILE_NAME = 'bench'
+JOB_NAME = f"stt-{FILE_NAME}"
+
+sys.path.insert(0, str(ROOT / 'layer'))
+
+from local_s3 import LocalS3
+from stub_openai import start_stub_server
+from synthetic import generate_transcript
+
+# The Lambdas read their configuration at import time
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+os.environ['OPENAI_API_KEY'] = 'stub'
+os.environ['RESPONSE_CACHE'] = 'none'
+os.environ['JOB_STATE_BUCKET'] = OUTPUT_BUCKET
+os.environ['TRANSCRIPTION_OUTPUT_BUCKET'] = OUTPUT_BUCKET
+os.environ.pop('PARTIAL_RESULTS_BUCKET', None)
+
+
+def load_lambda(name, directory):
+    """
+    Imports a Lambda's app.py under `name`. Every Lambda has an app.py and some
+    share helper module names, so its siblings are re-imported from its own directory.
+    """
+    for sibling in directory.glob('*.py'):
+        sys.modules.pop(sibling.stem, None)
+    sys.path.insert(0, str(directory))
+    try:
+        spec = spec_from_file_location(name, directory / 'app.py')
+        module = module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(str(directory))
+    return module
+
+
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')  # Resets VmHWM to the current RSS
+    except OSError:
+        pass
+
+
+def read_peak_rss_mb():
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def get_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (subprocess.SubprocessError, OSError):
+        return 'unknown'
+
+
+def create_handler_event(**query):
+    return {
+        'requestContext': {'http': {'method': 'GET'}},
+        'queryStringParameters': dict(query, fileName=FILE_NAME),
+        'headers': {'Accept-Encoding': 'gzip'}
+    }
+
+
+def build_stages(enhance, store, handler, concurrency):
+    """
+    Returns the pipeline stages as (name, function) pairs. Each function takes
+    the run's shared state, a dict every stage reads its input from and adds its
+    output to.
+    """
+    def generate(state):
+        state['transcript'] = generate_transcript(hours=state['hours'], speakers=state['speakers'])
+        state['s3'].put_object(Bucket=OUTPUT_BUCKET, Key=f"{JOB_NAME}.json", Body=json.dumps(state['transcript']))
+
+    def split(state):
+        state['chunks'] = enhance.split_transcript_into_batches(state['transcript'], enhance.MAX_TOKENS)
+
+    def segment_text(state):
+        results = state['transcript']['results']
+        transcript_index = enhance.build_transcript_index(results['items'])
+        state['segmentText'] = [
+            enhance.get_text_for_segment(segment, transcript_index)
+            for segment in results['speaker_labels']['segments']
+        ]
+
+    def enhance_chunks(state):
+        state['enhancedChunks'] = enhance.enhance_chunks(state['chunks'], concurrency=concurrency, max_attempts=1)
+        if any(chunk is None for chunk in state['enhancedChunks']):
+            raise RuntimeError('The stub failed to enhance some chunks')
+
+    def combine(state):
+        state['combined'] = enhance.combine_enhanced_chunks(state['enhancedChunks'])
+
+    def write_result(state):
+        body = dict(state['combined'], entities={}, s3={
+            'transcriptionOutputBucket': OUTPUT_BUCKET,
+            'transcriptionJobName': f"{JOB_NAME}.json"
+        })
+        state['claim'] = enhance.write_enhanced_result(state['s3'], OUTPUT_BUCKET, f"{JOB_NAME}.json", body)
+
+    def store_result(state):
+        store.boto3 = SimpleNamespace(client=lambda *args, **kwargs: state['s3'])
+        store.lambda_handler({'statusCode': 200, 'result': state['claim'], 'fileName': FILE_NAME}, None)
+
+    def handler_status(state):
+        response = handler.lambda_handler(create_handler_event(), None)
+        if response['statusCode'] != 200:
+            raise RuntimeError(f"Status request failed: {response}")
+
+    def handler_segments_page(state):
+        duration = float(state['transcript']['results']['speaker_labels']['segments'][-1]['end_time'])
+        events = [
+            create_handler_event(fromSegment='0', limit='50'),
+            create_handler_event(fromTime=str(duration / 2), toTime=str(duration / 2 + 300))
+        ]
+        for event in events:
+            response = handler.lambda_handler(event, None)
+            if response['statusCode'] != 200:
+                raise RuntimeError(f"Segments page request failed: {response}")
+
+    return [
+        ('generate', generate),
+        ('split_transcript_into_batches', split),
+        ('get_text_for_segment', segment_text),
+        ('enhance_chunks', enhance_chunks),
+        ('combine_enhanced_chunks', combine),
+        ('write_enhanced_result', write_result),
+        ('store', store_result),
+        ('handler_status', handler_status),
+        ('handler_segments_page', handler_segments_page)
+    ]
+
+
+def run_pipeline(stages, modules, hours, speakers, trace):
+    """
+    Runs every stage once against a fresh in-memory S3. With `trace`, records the
+    traced allocation peak and retained size of each stage instead of its time.
+    """
+    s3 = LocalS3()
+    for module in modules:
+        module.s3 = s3
+    state = {'hours': hours, 'speakers': speakers, 's3': s3}
+    measurements = {}
+
+    with open(os.devnull, 'w') as devnull:
+        for name, stage in stages:
+            if trace:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                with redirect_stdout(devnull):
+                    stage(state)
+                current, peak = tracemalloc.get_traced_memory()
+                measurements[name] = {
+                    'allocatedPeakMb': (peak - before) / 2 ** 20,
+                    'retainedMb': (current - before) / 2 ** 20
+                }
+            else:
+                reset_peak_rss()
+                started = time.perf_counter()
+                with redirect_stdout(devnull):
+                    stage(state)
+                measurements[name] = {
+                    'wallSeconds': time.perf_counter() - started,
+                    'peakRssMb': read_peak_rss_mb()
+                }
+
+    return measurements, {
+        'words': sum(1 for item in state['transcript']['results']['items'] if 'start_time' in item),
+        'segments': len(state['transcript']['results']['speaker_labels']['segments']),
+        'chunks': len(state['chunks']),
+        's3BytesWritten': s3.bytes_written,
+        's3BytesRead': s3.bytes_read
+    }
+
+
+def run_case(stages, modules, stub, hours, speakers, latency):
+    stub.settings['latency'] = latency
+    timings, counts = run_pipeline(stages, modules, hours, speakers, trace=False)
+
+    # The allocation pass doesn't need to wait on the stub
+    stub.settings['latency'] = 0.0
+    tracemalloc.start()
+    try:
+        allocations, _ = run_pipeline(stages, modules, hours, speakers, trace=True)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'hours': hours,
+        'speakers': speakers,
+        'counts': counts,
+        'stages': [dict(name=name, **timings[name], **allocations[name]) for name, _ in stages]
+    }
+
+
+def print_case(case):
+    counts = case['counts']
+    print(f"\n{case['hours']}h, {case['speakers']} speakers: {counts['words']} words, "
+          f"{counts['segments']} segments, {counts['chunks']} chunks")
+    print(f"  {'stage':<32}{'wall s':>10}{'peak RSS MB':>14}{'alloc MB':>12}{'kept MB':>10}")
+    for stage in case['stages']:
+        print(f"  {stage['name']:<32}{stage['wallSeconds']:>10.3f}{stage['peakRssMb']:>14.1f}"
+              f"{stage['allocatedPeakMb']:>12.1f}{stage['retainedMb']:>10.1f}")
+
+
+def compare_results(baseline, current, threshold):
+    """
+    Prints the change of every stage against a saved run and returns the
+    stages that got slower or allocate more by more than `threshold`.
+    """
+    regressions = []
+    baseline_cases = {(case['hours'], case['speakers']): case for case in baseline['cases']}
+    print(f"\nCompared with {baseline['commit']} ({baseline['createdAt']}):")
+
+    for case in current['cases']:
+        baseline_case = baseline_cases.get((case['hours'], case['speakers']))
+        if not baseline_case:
+            continue
+        baseline_stages = {stage['name']: stage for stage in baseline_case['stages']}
+        for stage in case['stages']:
+            baseline_stage = baseline_stages.get(stage['name'])
+            if not baseline_stage:
+                continue
+            changes = []
+            for metric in ('wallSeconds', 'peakRssMb', 'allocatedPeakMb'):
+                before, after = baseline_stage[metric], stage[metric]
+                change = (after - before) / before if before else 0.0
+                changes.append(f"{metric} {change:+.1%}")
+                # Sub-millisecond and sub-megabyte stages are too noisy to judge
+                if change > threshold and after - before > (0.001 if metric == 'wallSeconds' else 1.0):
+                    regressions.append((case['hours'], case['speakers'], stage['name'], metric, change))
+            print(f"  {case['hours']}h/{case['speakers']} {stage['name']:<32}" + ', '.join(changes))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hours', type=float, nargs='+', default=[1.0, 3.0, 10.0])
+    parser.add_argument('--speakers', type=int, nargs='+', default=[2, 10])
+    parser.add_argument('--latency', type=float, default=0.5, help='Seconds the stub OpenAI server takes per request')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--output', type=Path, help='Where to save the results (default: benchmarks/results/)')
+    parser.add_argument('--compare', type=Path, help='Earlier results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative change reported as a regression')
+    args = parser.parse_args()
+
+    stub = start_stub_server()
+    os.environ['OPENAI_BASE_URL'] = stub.base_url
+
+    enhance = load_lambda('enhance_app', ROOT / 'enhance')
+    store = load_lambda('store_app', ROOT / 'store')
+    handler = load_lambda('stt_handler_app', HANDLER_DIR)
+    stages = build_stages(enhance, store, handler, args.concurrency)
+
+    commit = get_commit()
+    results = {
+        'commit': commit,
+        'createdAt': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'settings': {'latency': args.latency, 'concurrency': args.concurrency},
+        'cases': []
+    }
+    for hours in args.hours:
+        for speakers in args.speakers:
+            case = run_case(stages, [enhance, handler], stub, hours, speakers, args.latency)
+            results['cases'].append(case)
+            print_case(case)
+    stub.shutdown()
+
+    output = args.output or RESULTS_DIR / f"{datetime.now(timezone.utc):%Y%m%d-%H%M%S}-{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"\nSaved results to {output}")
+
+    if args.compare:
+        regressions = compare_results(json.loads(args.compare.read_text()), results, args.threshold)
+        for hours, speakers, stage, metric, change in regressions:
+            print(f"Regression: {hours}h/{speakers} {stage} {metric} {change:+.1%}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Runs concurrent enhance invocations against a rate-limited stub OpenAI server.
+
+Every execution is a separate process enhancing the chunks of its own synthetic
+transcript, like the enhance Lambdas of concurrent Step Functions executions,
+while the stub answers requests over its RPM/TPM limits with 429s. Compares a
+single attempt per request, retries that honor Retry-After, and the shared
+governor (a file store) paced at the stub's limits. Reports wall time, failed
+chunks, the 429s the stub sent and the time spent throttled:
+
+    python benchmarks/bench_rate_limit.py --executions 8 --minutes 60 --rpm 20 --tpm 300000
+
+The default limits are set low enough for the 32 chunks of the default run to
+be throttled; at limits above the run's demand no case sees a 429.
+
+Needs the enhance Lambda's requirements (boto3, openai) installed.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from importlib.util import module_from_spec, spec_from_file_location
+from multiprocessing import get_context
+from pathlib import Path
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'layer'))
+sys.path.insert(0, str(ROOT / 'enhance'))
+
+from stub_openai import start_stub_server
+from synthetic import generate_transcript
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ['OPENAI_API_KEY'] = 'stub'
+os.environ['RESPONSE_CACHE'] = 'none'
+os.environ['ENHANCE_RETRY_DELAY'] = '1'
+os.environ['METRICS_LEVEL'] = 'info'
+
+
+def load_enhance():
+    spec = spec_from_file_location('enhance_app', ROOT / 'enhance' / 'app.py')
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_execution(index, minutes, environment):
+    """
+    Enhances one transcript in a fresh process configured by `environment`.
+    """
+    os.environ.update(environment)
+    enhance = load_enhance()
+    transcript = generate_transcript(hours=minutes / 60, speakers=3, seed=index)
+    chunks = enhance.split_transcript_into_batches(transcript, enhance.MAX_TOKENS)
+
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            enhanced_chunks = enhance.enhance_chunks(chunks)
+        finally:
+            sys.stdout = stdout
+
+    values = enhance.metrics.values
+    return {
+        'chunks': len(chunks),
+        'failedChunks': sum(chunk is None for chunk in enhanced_chunks),
+        'throttleSeconds': sum(values.get('ThrottleTime', [0])) / 1000,
+        'rateLimitHits': sum(values.get('RateLimitHits', [0]))
+    }
+
+
+def run_case(stub, args, environment):
+    stub.settings['rateLimited'] = 0
+    stub.settings['requests'] = 0
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.executions, mp_context=get_context('spawn')) as executor:
+        futures = [executor.submit(run_execution, index, args.minutes, environment) for index in range(args.executions)]
+        results = [future.result() for future in futures]
+    return {
+        'wall': time.perf_counter() - started,
+        'chunks': sum(result['chunks'] for result in results),
+        'failedChunks': sum(result['failedChunks'] for result in results),
+        'requests': stub.settings['requests'],
+        'rateLimited': stub.settings['rateLimited'],
+        'throttleSeconds': sum(result['throttleSeconds'] for result in results)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--executions', type=int, default=8, help='Concurrent enhance invocations')
+    parser.add_argument('--minutes', type=float, default=60.0, help='Length of every transcript')
+    parser.add_argument('--concurrency', type=int, default=4, help='Chunks enhanced in parallel per invocation')
+    parser.add_argument('--latency', type=float, default=0.5, help='Seconds before the stub answers')
+    parser.add_argument('--rpm', type=int, default=20, help="The stub's requests per minute")
+    parser.add_argument('--tpm', type=int, default=300000, help="The stub's tokens per minute")
+    args = parser.parse_args()
+
+    stub = start_stub_server(latency=args.latency, requests_per_minute=args.rpm, tokens_per_minute=args.tpm, seed=7)
+    state_file = Path(tempfile.mkdtemp()) / 'openai-rate-limit.json'
+    base = {
+        'OPENAI_BASE_URL': stub.base_url,
+        'ENHANCE_CONCURRENCY': str(args.concurrency),
+        'OPENAI_RPM_LIMIT': '0',
+        'OPENAI_TPM_LIMIT': '0',
+        'RATE_LIMIT_BASE_DELAY': '1'
+    }
+    cases = {
+        'single attempt': dict(base, RATE_LIMIT_MAX_ATTEMPTS='1'),
+        'retries': dict(base, RATE_LIMIT_MAX_ATTEMPTS='6'),
+        'governed': dict(base, RATE_LIMIT_MAX_ATTEMPTS='6', RATE_LIMIT_STORE='file', RATE_LIMIT_FILE=str(state_file),
+                         OPENAI_RPM_LIMIT=str(args.rpm), OPENAI_TPM_LIMIT=str(args.tpm))
+    }
+
+    print(f"{args.executions} executions of {args.minutes:g} min transcripts, stub limits {args.rpm} RPM / {args.tpm} TPM")
+    print(f"\n{'case':<16}{'wall s':>8}{'chunks':>8}{'failed':>8}{'requests':>10}{'429s':>7}{'throttled s':>13}")
+    for name, environment in cases.items():
+        # Start every case with full buckets on the stub and in the shared store
+        with stub.settings['lock']:
+            stub.settings['buckets'] = {'requests': float(args.rpm), 'tokens': float(args.tpm)}
+            stub.settings['bucketsUpdatedAt'] = time.monotonic()
+        state_file.unlink(missing_ok=True)
+        result = run_case(stub, args, environment)
+        print(f"{name:<16}{result['wall']:>8.1f}{result['chunks']:>8}{result['failedChunks']:>8}{result['requests']:>10}"
+              f"{result['rateLimited']:>7}{result['throttleSeconds']:>13.1f}")
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+Measures transcript search over a synthetic corpus indexed by the store Lambda.
+
+Indexes synthetic enhanced transcripts into an in-memory S3 with the store
+Lambda's search_index, one update per file as the store Lambda makes them, then
+runs phrase, single-term and entity searches through the stt-handler's search
+route, first with an empty shard cache and then warm. Every answer is checked
+against a scan of the transcripts. Reports the index size, update time and
+search latency percentiles:
+
+    python benchmarks/bench_search.py --files 2000 --minutes 5 --s3-latency 0.02
+
+Needs the stt-handler's requirements (boto3, python-dotenv) installed.
+"""
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+HANDLER_DIR = ROOT.parent / 'microservices' / 'stt-handler'
+OUTPUT_BUCKET = 'bench-transcription-output'
+sys.path.insert(0, str(ROOT / 'layer'))
+
+from local_s3 import LocalS3
+from synthetic import generate_enhanced_transcript, get_vocabulary
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ['TRANSCRIPTION_OUTPUT_BUCKET'] = OUTPUT_BUCKET
+os.environ['METRICS_LEVEL'] = 'off'
+
+
+def load_module(name, path):
+    spec = spec_from_file_location(name, path)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_handler():
+    # The stt-handler has its own search_index, the reading side of the store Lambda's
+    sys.modules.pop('search_index', None)
+    sys.path.insert(0, str(HANDLER_DIR))
+    try:
+        return load_module('stt_handler_app', HANDLER_DIR / 'app.py')
+    finally:
+        sys.path.remove(str(HANDLER_DIR))
+
+
+class DelayedS3:
+    """
+    Adds a fixed first-byte latency to the GETs of a LocalS3, like the real service.
+    """
+
+    def __init__(self, s3, latency):
+        self.s3 = s3
+        self.latency = latency
+        self.exceptions = s3.exceptions
+
+    def get_object(self, **kwargs):
+        time.sleep(self.latency)
+        return self.s3.get_object(**kwargs)
+
+
+def build_index(search_index, s3, corpus):
+    update_seconds = []
+    for file_name, body in corpus.items():
+        started = time.perf_counter()
+        search_index.update_search_index(s3, OUTPUT_BUCKET, file_name, body)
+        update_seconds.append(time.perf_counter() - started)
+    return update_seconds
+
+
+def create_queries(search_index, corpus, count, seed):
+    """
+    Picks phrases and terms from the corpus text and entities from its entity lists.
+    """
+    rng = random.Random(seed)
+    file_names = sorted(corpus)
+    queries = {'phrase': [], 'term': [], 'entity': []}
+    for _ in range(count):
+        body = corpus[rng.choice(file_names)]
+        terms = search_index.tokenize(rng.choice(body['segments'])['text'])
+        length = rng.randint(2, 3)
+        start = rng.randrange(max(len(terms) - length, 0) + 1)
+        queries['phrase'].append((' '.join(terms[start:start + length]), None))
+        queries['term'].append((rng.choice(terms), None))
+        category = rng.choice([category for category, values in body['entities'].items() if values])
+        queries['entity'].append((rng.choice(body['entities'][category]), category))
+    return queries
+
+
+def get_segment_texts(search_index, corpus):
+    """
+    Returns every segment's terms joined by single spaces, for scanning.
+    """
+    return {
+        file_name: [f" {' '.join(search_index.tokenize(segment['text']))} " for segment in body['segments']]
+        for file_name, body in corpus.items()
+    }
+
+
+def scan_corpus(search_index, corpus, segment_texts, query, category):
+    """
+    Answers a query by reading every transcript: {fileName: matching segment count}.
+    """
+    expected = {}
+    if category:
+        key = search_index.normalize_entity(query)
+        for file_name, body in corpus.items():
+            if key in {search_index.normalize_entity(value) for value in body['entities'].get(category, [])}:
+                expected[file_name] = None
+        return expected
+
+    phrase = f" {' '.join(search_index.tokenize(query))} "
+    for file_name, texts in segment_texts.items():
+        count = sum(phrase in text for text in texts)
+        if count:
+            expected[file_name] = count
+    return expected
+
+
+def run_queries(handler, queries, cold):
+    latencies = []
+    answers = []
+    for query, category in queries:
+        if cold:
+            handler.search_shard_cache.clear()
+        parameters = {'search': query, 'limit': '500'}
+        if category:
+            parameters['category'] = category
+        started = time.perf_counter()
+        response = handler.lambda_handler({
+            'requestContext': {'http': {'method': 'GET'}},
+            'queryStringParameters': parameters
+        }, None)
+        latencies.append(time.perf_counter() - started)
+        if response['statusCode'] != 200:
+            raise RuntimeError(f"Search failed: {response}")
+        answers.append(json.loads(response['body']))
+    return latencies, answers
+
+
+def check_answers(search_index, corpus, segment_texts, queries, answers):
+    for (query, category), answer in zip(queries, answers):
+        expected = scan_corpus(search_index, corpus, segment_texts, query, category)
+        found = {result['fileName']: result['matchCount'] for result in answer['results']}
+        if answer['totalFiles'] != len(expected) or not set(found) <= set(expected):
+            raise SystemExit(f"Wrong files for {query!r}: {answer['totalFiles']} instead of {len(expected)}")
+        if not category and any(found[file_name] != expected[file_name] for file_name in found):
+            raise SystemExit(f"Wrong segment counts for {query!r}")
+
+
+def get_percentile(values, percentile):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--minutes', type=float, default=5.0, help='Length of every transcript')
+    parser.add_argument('--vocabulary', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=100, help='Queries of each kind')
+    parser.add_argument('--s3-latency', type=float, default=0.02, help='Seconds before an S3 GET answers')
+    args = parser.parse_args()
+
+    search_index = load_module('store_search_index', ROOT / 'store' / 'search_index.py')
+    handler = load_handler()
+
+    vocabulary = get_vocabulary(args.vocabulary)
+    corpus = {
+        f"recording-{index:05d}": generate_enhanced_transcript(minutes=args.minutes, vocabulary=vocabulary, seed=index)
+        for index in range(args.files)
+    }
+    words = sum(len(search_index.tokenize(body['transcript'])) for body in corpus.values())
+
+    s3 = LocalS3()
+    update_seconds = build_index(search_index, s3, corpus)
+    shards = [stored for stored in s3.list_objects_v2(Bucket=OUTPUT_BUCKET, Prefix=search_index.SEARCH_INDEX_PREFIX)['Contents']
+              if stored['Key'].endswith('.json.gz')]  # Leaves out the per-file shard records
+    index_bytes = sum(shard['Size'] for shard in shards)
+    print(f"Corpus: {args.files} transcripts of {args.minutes:g} min, {words} words")
+    print(f"Index: {index_bytes / 2 ** 20:.1f} MB gzipped in {len(shards)} shards, built in {sum(update_seconds):.1f}s; "
+          f"update p50 {get_percentile(update_seconds, 0.5) * 1000:.0f} ms, "
+          f"p95 {get_percentile(update_seconds, 0.95) * 1000:.0f} ms, "
+          f"last {update_seconds[-1] * 1000:.0f} ms")
+
+    handler.s3 = DelayedS3(s3, args.s3_latency)
+    queries = create_queries(search_index, corpus, args.queries, seed=7)
+    segment_texts = get_segment_texts(search_index, corpus)
+    print(f"\n{'query':<8}{'shards':>8}{'cold p50 ms':>13}{'cold p95 ms':>13}{'warm p50 ms':>13}"
+          f"{'warm p95 ms':>13}{'files p50':>11}")
+    for kind, kind_queries in queries.items():
+        cold, _ = run_queries(handler, kind_queries, cold=True)
+        warm, answers = run_queries(handler, kind_queries, cold=False)
+        check_answers(search_index, corpus, segment_texts, kind_queries, answers)
+        shard_counts = [len(handler.get_query_shard_keys(handler.get_query_keys(query, category)[1]))
+                        for query, category in kind_queries]
+        print(f"{kind:<8}{get_percentile(shard_counts, 0.5):>8}"
+              f"{get_percentile(cold, 0.5) * 1000:>13.1f}{get_percentile(cold, 0.95) * 1000:>13.1f}"
+              f"{get_percentile(warm, 0.5) * 1000:>13.1f}{get_percentile(warm, 0.95) * 1000:>13.1f}"
+              f"{get_percentile([answer['totalFiles'] for answer in answers], 0.5):>11}")
+    print("\nEvery answer matched a scan of the transcripts")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Compares streamed and whole-response enhancement against the stub OpenAI server.
+
+Packs a synthetic transcript into chunks and enhances them both ways while the
+stub paces its output and cuts off a share of the responses. Reports wall time,
+time to the first segment, completion characters requested and whether every
+segment came back:
+
+    python benchmarks/bench_streaming.py --hours 2 --truncate-rate 0.3 --token-interval 0.002
+
+Needs the enhance Lambda's requirements (boto3, openai) installed.
+"""
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+import argparse
+import os
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'layer'))
+sys.path.insert(0, str(ROOT / 'enhance'))
+
+from stub_openai import start_stub_server
+from synthetic import generate_transcript
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ['OPENAI_API_KEY'] = 'stub'
+os.environ['RESPONSE_CACHE'] = 'none'
+os.environ['ENHANCE_RETRY_DELAY'] = '0'
+
+
+def load_enhance():
+    spec = spec_from_file_location('enhance_app', ROOT / 'enhance' / 'app.py')
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run(enhance, chunks, streaming, max_attempts):
+    enhance.ENHANCE_STREAMING = streaming
+    enhance.metrics.reset()
+    started = time.perf_counter()
+    enhanced_chunks = enhance.enhance_chunks(chunks, max_attempts=max_attempts)
+    wall = time.perf_counter() - started
+
+    values = enhance.metrics.values
+    expected = [entry['timestamp'] for chunk in chunks for entry in chunk]
+    received = [segment['timestamp'] for chunk in enhanced_chunks if chunk for segment in chunk['segments']]
+    first_segment = values.get('TimeToFirstSegment') or values.get('LlmLatency') or [0]
+    return {
+        'wall': wall,
+        'firstSegment': min(first_segment) / 1000,
+        'completionChars': values.get('CompletionTokens', [0])[0] * 4,
+        'failedChunks': sum(chunk is None for chunk in enhanced_chunks),
+        'complete': received == expected
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hours', type=float, default=2.0)
+    parser.add_argument('--speakers', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds before the stub starts answering')
+    parser.add_argument('--token-interval', type=float, default=0.002, help='Seconds between streamed events')
+    parser.add_argument('--truncate-rate', type=float, default=0.3, help='Fraction of responses cut off')
+    parser.add_argument('--max-attempts', type=int, default=3)
+    args = parser.parse_args()
+
+    stub = start_stub_server(latency=args.latency, truncate_rate=args.truncate_rate,
+                             token_interval=args.token_interval, seed=7)
+    os.environ['OPENAI_BASE_URL'] = stub.base_url
+    enhance = load_enhance()
+
+    transcript = generate_transcript(hours=args.hours, speakers=args.speakers)
+    chunks = enhance.split_transcript_into_batches(transcript, enhance.MAX_TOKENS)
+    print(f"Transcript: {args.hours}h, {sum(len(chunk) for chunk in chunks)} segments in {len(chunks)} chunks, "
+          f"{args.truncate_rate:.0%} of responses cut off")
+
+    with open(os.devnull, 'w') as devnull:
+        results = {}
+        for mode, streaming in (('whole', False), ('streamed', True)):
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                results[mode] = run(enhance, chunks, streaming, args.max_attempts)
+            finally:
+                sys.stdout = stdout
+    stub.shutdown()
+
+    print(f"{'mode':<10}{'wall s':>9}{'first segment s':>17}{'completion chars':>18}{'failed chunks':>15}{'complete':>10}")
+    for mode, result in results.items():
+        print(f"{mode:<10}{result['wall']:>9.2f}{result['firstSegment']:>17.2f}{result['completionChars']:>18}"
+              f"{result['failedChunks']:>15}{str(result['complete']):>10}")
+
+
+if __name__ == '__main__':
+    main()
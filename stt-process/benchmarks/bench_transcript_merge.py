@@ -0,0 +1,114 @@
+"""
+Checks and times the merge of split-transcribe parts offline.
+
+Cuts a synthetic transcript into overlapping windows, relabels the speakers of
+every window at random (as independent Transcribe jobs would), merges the
+parts back and compares the result with the original:
+
+    python benchmarks/bench_transcript_merge.py --hours 6 --speakers 4
+"""
+from collections import Counter
+from pathlib import Path
+import argparse
+import random
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'transcribe'))
+
+from synthetic import generate_transcript
+from long_audio import plan_windows
+from transcript_merge import merge_transcripts
+
+
+def cut_part(transcript, start, length, speakers, rng):
+    """
+    Returns the part of `transcript` a Transcribe job over [start, start + length)
+    would produce, with times relative to the window and shuffled speaker labels.
+    """
+    labels = [f"spk_{index}" for index in range(speakers)]
+    relabel = dict(zip(labels, rng.sample(labels, len(labels))))
+
+    def shift(value):
+        return f"{float(value) - start:.3f}"
+
+    items = []
+    included = False
+    for item in transcript['results']['items']:
+        if 'start_time' in item:
+            included = start <= float(item['start_time']) < start + length
+            if included:
+                items.append(dict(item, start_time=shift(item['start_time']), end_time=shift(item['end_time'])))
+        elif included:
+            items.append(dict(item))
+
+    segments = []
+    for segment in transcript['results']['speaker_labels']['segments']:
+        segment_items = [
+            {'start_time': shift(item['start_time']), 'end_time': shift(item['end_time']),
+             'speaker_label': relabel[item['speaker_label']]}
+            for item in segment['items'] if start <= float(item['start_time']) < start + length
+        ]
+        if segment_items:
+            segments.append({
+                'start_time': segment_items[0]['start_time'],
+                'end_time': segment_items[-1]['end_time'],
+                'speaker_label': relabel[segment['speaker_label']],
+                'items': segment_items
+            })
+
+    return {'results': {'items': items, 'speaker_labels': {'speakers': speakers, 'segments': segments}}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hours', type=float, default=6.0)
+    parser.add_argument('--speakers', type=int, default=4)
+    parser.add_argument('--window', type=float, default=1800.0)
+    parser.add_argument('--overlap', type=float, default=120.0)
+    args = parser.parse_args()
+
+    transcript = generate_transcript(hours=args.hours, speakers=args.speakers)
+    rng = random.Random(7)
+    # The last segment may run past the requested duration
+    duration = max(float(item['end_time']) for item in transcript['results']['items'] if 'end_time' in item)
+    windows = plan_windows(duration, args.window, args.overlap)
+    parts = [
+        {'offset': start, 'transcript': cut_part(transcript, start, length, args.speakers, rng)}
+        for start, length in windows
+    ]
+    print(f"Transcript: {args.hours}h, {len(parts)} parts of {args.window:.0f}s with {args.overlap:.0f}s overlap")
+
+    started = time.perf_counter()
+    merged = merge_transcripts(parts, job_name='stt-benchmark')
+    merge_seconds = time.perf_counter() - started
+
+    original_words = [(item['start_time'], item['alternatives'][0]['content'])
+                      for item in transcript['results']['items'] if 'start_time' in item]
+    merged_words = [(item['start_time'], item['alternatives'][0]['content'])
+                    for item in merged['results']['items'] if 'start_time' in item]
+    if merged_words != original_words:
+        raise SystemExit(f"Word mismatch: {len(merged_words)} merged vs {len(original_words)} original")
+    if len(merged['results']['items']) != len(transcript['results']['items']):
+        raise SystemExit("Punctuation mismatch")
+
+    # Speaker accuracy under the best one-to-one naming of merged speakers
+    true_speakers = {item['start_time']: segment['speaker_label']
+                     for segment in transcript['results']['speaker_labels']['segments'] for item in segment['items']}
+    pairs = Counter((item['speaker_label'], true_speakers[item['start_time']])
+                    for segment in merged['results']['speaker_labels']['segments'] for item in segment['items'])
+    naming = {}
+    for (merged_label, true_label), _ in pairs.most_common():
+        if merged_label not in naming and true_label not in naming.values():
+            naming[merged_label] = true_label
+    correct = sum(count for (merged_label, true_label), count in pairs.items() if naming.get(merged_label) == true_label)
+
+    print(f"Merge: {merge_seconds * 1000:.0f}ms, {len(merged_words)} words, "
+          f"{len(merged['results']['speaker_labels']['segments'])} segments "
+          f"(original {len(transcript['results']['speaker_labels']['segments'])})")
+    print(f"Speakers: {merged['results']['speaker_labels']['speakers']} merged vs {args.speakers} actual, "
+          f"{correct / len(merged_words):.1%} of words attributed correctly")
+
+
+if __name__ == '__main__':
+    main()
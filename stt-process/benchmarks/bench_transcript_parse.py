@@ -0,0 +1,123 @@
+"""
+Compares peak memory of loading Transcribe output whole and parsing it as a stream.
+
+Writes synthetic transcripts of several lengths to disk and reads each one in a
+fresh process both ways: the read()/json.loads path followed by
+build_transcript_index, and parse_transcript_stream over the file object the
+way the enhance Lambda reads the S3 body. Reports the file size, the peak RSS
+growth over the process baseline and the parse time, and checks that both ways
+produce the same segments and transcript index, and so the same chunks:
+
+    python benchmarks/bench_transcript_parse.py --hours 1 4 8
+
+Runs with the standard library only.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import resource
+import sys
+import tempfile
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'enhance'))
+
+from synthetic import generate_transcript
+from transcript_index import build_transcript_index
+from transcript_stream import READ_SIZE, parse_transcript_stream
+
+
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')  # Resets VmHWM to the current RSS
+    except OSError:
+        pass
+
+
+def read_rss_mb(field):
+    """
+    Returns VmRSS or VmHWM (the peak) from /proc, falling back to the peak from getrusage.
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_whole(path, read_size):
+    with open(path, 'rb') as body:
+        transcript = json.loads(body.read().decode('utf-8'))
+    segments = transcript['results']['speaker_labels']['segments']
+    return segments, build_transcript_index(transcript['results']['items']), transcript
+
+
+def parse_stream(path, read_size):
+    with open(path, 'rb') as body:
+        segments, transcript_index = parse_transcript_stream(body, read_size)
+    return segments, transcript_index, None
+
+
+MODES = {'whole': load_whole, 'stream': parse_stream}
+
+
+def run_mode(mode, path, read_size):
+    """
+    Parses the transcript in a fresh process. Returns the peak RSS growth, the
+    RSS still held with the result alive, the parse time and a digest of the result.
+    """
+    reset_peak_rss()
+    baseline = read_rss_mb('VmRSS')
+    started = time.perf_counter()
+    segments, transcript_index, transcript = MODES[mode](path, read_size)
+    elapsed = time.perf_counter() - started
+    peak = read_rss_mb('VmHWM') - baseline
+    held = read_rss_mb('VmRSS') - baseline
+
+    digest = hashlib.sha256(json.dumps([
+        [[segment['start_time'], segment['end_time'], segment['speaker_label']] for segment in segments],
+        list(transcript_index['start_times']),
+        transcript_index['contents']
+    ]).encode('utf-8')).hexdigest()
+    return {'peak': peak, 'held': held, 'seconds': elapsed, 'digest': digest}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hours', type=float, nargs='+', default=[1.0, 4.0, 8.0])
+    parser.add_argument('--speakers', type=int, default=4)
+    parser.add_argument('--read-size', type=int, default=READ_SIZE, help='Bytes read from the body at a time')
+    args = parser.parse_args()
+
+    directory = Path(tempfile.mkdtemp())
+    print(f"{'hours':>6}{'JSON MB':>9}{'mode':>8}{'peak MB':>10}{'held MB':>10}{'parse s':>9}")
+    for hours in args.hours:
+        path = directory / f"transcript-{hours:g}h.json"
+        path.write_text(json.dumps(generate_transcript(hours=hours, speakers=args.speakers)))
+        size_mb = path.stat().st_size / 2 ** 20
+
+        results = {}
+        for mode in MODES:
+            # A fresh process per run, so one run's heap does not hide the next one's peak
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                results[mode] = executor.submit(run_mode, mode, str(path), args.read_size).result()
+            print(f"{hours:>6g}{size_mb:>9.1f}{mode:>8}{results[mode]['peak']:>10.1f}"
+                  f"{results[mode]['held']:>10.1f}{results[mode]['seconds']:>9.2f}")
+
+        if results['whole']['digest'] != results['stream']['digest']:
+            raise SystemExit(f"The streaming parse of the {hours:g}h transcript differs from json.loads")
+        path.unlink()
+
+    print("\nBoth parses produced the same segments and transcript index")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+In-memory stand-in for the S3 client calls the stt-process Lambdas make.
+
+Objects are kept per bucket and key with an MD5 ETag. Missing keys raise
+`exceptions.NoSuchKey`, a botocore ClientError like the real client's, and
+conditional reads with a matching IfNoneMatch raise a ClientError with code 304.
+Conditional writes (IfMatch, IfNoneMatch='*') and copies (CopySourceIfMatch)
+that do not hold raise a ClientError with code PreconditionFailed.
+"""
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+import hashlib
+import io
+import threading
+
+
+class NoSuchKey(ClientError):
+    pass
+
+
+class LocalS3:
+    class exceptions:
+        ClientError = ClientError
+        NoSuchKey = NoSuchKey
+
+    def __init__(self):
+        self.objects = {}
+        self.lock = threading.Lock()
+        self.bytes_written = 0
+        self.bytes_read = 0
+
+    def put_object(self, Bucket, Key, Body, ContentType=None, IfMatch=None, IfNoneMatch=None, Metadata=None, **kwargs):
+        if isinstance(Body, str):
+            Body = Body.encode('utf-8')
+        elif hasattr(Body, 'read'):
+            Body = Body.read()
+        etag = f'"{hashlib.md5(Body).hexdigest()}"'
+        with self.lock:
+            current = self.objects.get((Bucket, Key))
+            if (IfMatch and (current is None or current['ETag'] != IfMatch)) or (IfNoneMatch == '*' and current):
+                raise ClientError({'Error': {'Code': 'PreconditionFailed', 'Message': 'Precondition Failed'}},
+                                  'PutObject')
+            self.objects[(Bucket, Key)] = {
+                'Body': bytes(Body),
+                'ETag': etag,
+                'ContentType': ContentType,
+                'Metadata': dict(Metadata or {}),
+                'LastModified': datetime.now(timezone.utc)
+            }
+            self.bytes_written += len(Body)
+        return {'ETag': etag}
+
+    def get_object(self, Bucket, Key, Range=None, IfNoneMatch=None, **kwargs):
+        stored = self.get_stored_object(Bucket, Key, 'GetObject')
+        if IfNoneMatch and IfNoneMatch == stored['ETag']:
+            raise ClientError({'Error': {'Code': '304', 'Message': 'Not Modified'}}, 'GetObject')
+
+        body = stored['Body']
+        if Range:
+            start, end = Range[len('bytes='):].split('-')
+            body = body[int(start):int(end) + 1]
+        with self.lock:
+            self.bytes_read += len(body)
+
+        return {
+            'Body': io.BytesIO(body),
+            'ETag': stored['ETag'],
+            'ContentLength': len(body),
+            'ContentType': stored['ContentType'],
+            'LastModified': stored['LastModified']
+        }
+
+    def head_object(self, Bucket, Key, **kwargs):
+        stored = self.get_stored_object(Bucket, Key, 'HeadObject')
+        return {
+            'ETag': stored['ETag'],
+            'ContentLength': len(stored['Body']),
+            'ContentType': stored['ContentType'],
+            'Metadata': stored['Metadata'],
+            'LastModified': stored['LastModified']
+        }
+
+    def copy_object(self, Bucket, Key, CopySource, CopySourceIfMatch=None, Metadata=None, MetadataDirective='COPY',
+                    ContentType=None, **kwargs):
+        stored = self.get_stored_object(CopySource['Bucket'], CopySource['Key'], 'CopyObject')
+        if CopySourceIfMatch and CopySourceIfMatch != stored['ETag']:
+            raise ClientError({'Error': {'Code': 'PreconditionFailed', 'Message': 'Precondition Failed'}},
+                              'CopyObject')
+        if MetadataDirective == 'REPLACE':
+            return self.put_object(Bucket, Key, stored['Body'], ContentType, Metadata=Metadata)
+        return self.put_object(Bucket, Key, stored['Body'], stored['ContentType'], Metadata=stored['Metadata'])
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        with self.lock:
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', **kwargs):
+        with self.lock:
+            keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+            contents = [
+                {'Key': key, 'Size': len(self.objects[(Bucket, key)]['Body']), 'ETag': self.objects[(Bucket, key)]['ETag']}
+                for key in keys
+            ]
+        return {'Contents': contents, 'KeyCount': len(contents), 'IsTruncated': False}
+
+    def upload_file(self, Filename, Bucket, Key, **kwargs):
+        with open(Filename, 'rb') as file:
+            self.put_object(Bucket, Key, file.read())
+
+    def get_stored_object(self, bucket, key, operation):
+        with self.lock:
+            stored = self.objects.get((bucket, key))
+        if stored is None:
+            raise NoSuchKey({'Error': {'Code': 'NoSuchKey', 'Message': f"{bucket}/{key}"}}, operation)
+        return stored
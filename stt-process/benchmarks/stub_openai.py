@@ -0,0 +1,253 @@
+"""
+Local stand-in for the OpenAI chat completions API.
+
+Point the enhance Lambda at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1
+and OPENAI_API_KEY=stub. Enhancement prompts are answered by echoing the chunk
+back as segments (or, for delta prompts, naming the speakers and correcting a
+few segments), anything else gets an empty entity list. Requests with
+`"stream": true` are answered as server-sent events, and a share of responses
+can be cut off with finish_reason "length" like an exhausted max_tokens.
+
+Requests over a requests- or tokens-per-minute limit, and a random share of the
+rest, are answered with a 429 and a Retry-After header like the real API's.
+Tokens are counted as OpenAI does when a request arrives: the prompt plus its
+max_tokens.
+
+    python benchmarks/stub_openai.py --port 8089 --latency 1.5 --failure-rate 0.1 --truncate-rate 0.2
+    python benchmarks/stub_openai.py --port 8089 --rpm 60 --tpm 400000 --rate-limit-rate 0.05
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import random
+import threading
+import time
+
+TRANSCRIPT_MARKER = 'The transcript is:'
+STREAM_PIECE_CHARS = 16  # Content per streamed event, roughly four tokens
+TRUNCATE_AT = 0.6  # Share of the content a cut-off response gets to
+
+
+def build_completion_content(prompt):
+    """
+    Builds a plausible completion for one of the enhance Lambda prompts.
+    """
+    payload = prompt.split(TRANSCRIPT_MARKER, 1)[-1].strip()
+    try:
+        segments = json.loads(payload)
+    except json.JSONDecodeError:
+        segments = None
+
+    if isinstance(segments, list) and '"corrections"' in prompt:
+        # Delta output: name every speaker and correct every tenth segment
+        return json.dumps({
+            'speakers': {segment['speaker']: f"Speaker {segment['speaker'].rsplit('_', 1)[-1]}" for segment in segments},
+            'corrections': [
+                {'index': segment['index'], 'text': segment['text'][:1].upper() + segment['text'][1:]}
+                for segment in segments if segment['index'] % 10 == 0
+            ]
+        })
+
+    if isinstance(segments, list):
+        transcript = ' '.join(segment['text'] for segment in segments)
+        # Answer in the field order the prompt's schema asks for
+        if prompt.find('"segments"') < prompt.find('"transcript"'):
+            return json.dumps({'segments': segments, 'transcript': transcript})
+        return json.dumps({'transcript': transcript, 'segments': segments})
+
+    return json.dumps({'transcript': payload, 'entities': {}})
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    server_version = 'StubOpenAI/1.0'
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        settings = self.server.settings
+
+        with settings['lock']:
+            settings['requests'] += 1
+            retry_after = self.take_rate_limit(request)
+            if retry_after is None and settings['rate_limit_rate'] > 0 and settings['rng'].random() < settings['rate_limit_rate']:
+                retry_after = 1.0
+            if retry_after is not None:
+                settings['rateLimited'] += 1
+        if retry_after is not None:
+            return self.send_json(429, {
+                'error': {'message': 'Rate limit reached (stub)', 'type': 'requests', 'code': 'rate_limit_exceeded'}
+            }, {'Retry-After': str(max(1, round(retry_after))), 'retry-after-ms': str(int(retry_after * 1000))})
+
+        time.sleep(settings['latency'])
+
+        with settings['lock']:
+            failed = settings['rng'].random() < settings['failure_rate']
+            truncated = settings['truncate_rate'] > 0 and settings['rng'].random() < settings['truncate_rate']
+        if failed:
+            return self.send_json(500, {'error': {'message': 'stub failure', 'type': 'server_error'}})
+
+        prompt = request.get('messages', [{}])[-1].get('content', '')
+        content = build_completion_content(prompt)
+        finish_reason = 'stop'
+        if truncated:
+            content = content[:int(len(content) * TRUNCATE_AT)]
+            finish_reason = 'length'
+        usage = {
+            'prompt_tokens': len(prompt) // 4,
+            'completion_tokens': len(content) // 4,
+            'total_tokens': (len(prompt) + len(content)) // 4
+        }
+
+        if request.get('stream'):
+            return self.send_stream(request, content, finish_reason, usage)
+
+        # Take as long as the same response would take to stream
+        time.sleep(settings['token_interval'] * -(-len(content) // STREAM_PIECE_CHARS))
+        self.send_json(200, {
+            'id': f"chatcmpl-stub-{settings['requests']}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'stub'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': finish_reason
+            }],
+            'usage': usage
+        })
+
+    def take_rate_limit(self, request):
+        """
+        Takes the request from the stub's per-minute buckets. Returns None, or the
+        seconds until it would have fitted. Called with the settings lock held.
+        """
+        settings = self.server.settings
+        limits = settings['limits']
+        if not (limits['requests'] or limits['tokens']):
+            return None
+
+        now = time.monotonic()
+        elapsed = now - settings['bucketsUpdatedAt']
+        settings['bucketsUpdatedAt'] = now
+        buckets = settings['buckets']
+        for name, limit in limits.items():
+            if limit:
+                buckets[name] = min(limit, buckets[name] + elapsed * limit / 60)
+
+        prompt = ''.join(str(message.get('content', '')) for message in request.get('messages', []))
+        needed = {'requests': 1, 'tokens': min(len(prompt) // 4 + (request.get('max_tokens') or 0), limits['tokens'])}
+        waits = [(needed[name] - buckets[name]) * 60 / limit
+                 for name, limit in limits.items() if limit and buckets[name] < needed[name]]
+        if waits:
+            return max(waits)
+        for name, limit in limits.items():
+            if limit:
+                buckets[name] -= needed[name]
+        return None
+
+    def send_stream(self, request, content, finish_reason, usage):
+        """
+        Streams the content as chat.completion.chunk events, ending with the
+        finish reason, the usage when asked for, and [DONE].
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        base = {
+            'id': f"chatcmpl-stub-{self.server.settings['requests']}",
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': request.get('model', 'stub')
+        }
+
+        def send_event(choices, **fields):
+            self.wfile.write(f"data: {json.dumps(dict(base, choices=choices, **fields))}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        send_event([{'index': 0, 'delta': {'role': 'assistant', 'content': ''}, 'finish_reason': None}])
+        for start in range(0, len(content), STREAM_PIECE_CHARS):
+            time.sleep(self.server.settings['token_interval'])
+            send_event([{
+                'index': 0,
+                'delta': {'content': content[start:start + STREAM_PIECE_CHARS]},
+                'finish_reason': None
+            }])
+        send_event([{'index': 0, 'delta': {}, 'finish_reason': finish_reason}])
+        if (request.get('stream_options') or {}).get('include_usage'):
+            send_event([], usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port=0, latency=0.0, failure_rate=0.0, seed=0, truncate_rate=0.0, token_interval=0.0,
+                      requests_per_minute=0, tokens_per_minute=0, rate_limit_rate=0.0):
+    """
+    Starts the stub server on a background thread and returns it.
+    The base URL for the OpenAI client is available as `server.base_url`.
+    `token_interval` is the delay between streamed events, also applied to
+    non-streamed responses so both take equally long. Requests over
+    `requests_per_minute` or `tokens_per_minute` (0 for no limit), and a
+    `rate_limit_rate` share of the rest, are answered with a 429;
+    `server.settings['rateLimited']` counts them.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubOpenAIHandler)
+    server.daemon_threads = True
+    server.settings = {
+        'latency': latency,
+        'failure_rate': failure_rate,
+        'truncate_rate': truncate_rate,
+        'token_interval': token_interval,
+        'rate_limit_rate': rate_limit_rate,
+        'limits': {'requests': requests_per_minute, 'tokens': tokens_per_minute},
+        'buckets': {'requests': float(requests_per_minute), 'tokens': float(tokens_per_minute)},
+        'bucketsUpdatedAt': time.monotonic(),
+        'rng': random.Random(seed),
+        'lock': threading.Lock(),
+        'requests': 0,
+        'rateLimited': 0
+    }
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before answering')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of requests answered with a 500')
+    parser.add_argument('--truncate-rate', type=float, default=0.0, help='Fraction of responses cut off early')
+    parser.add_argument('--token-interval', type=float, default=0.0, help='Seconds between streamed events')
+    parser.add_argument('--rpm', type=int, default=0, help='Requests per minute before answering 429s')
+    parser.add_argument('--tpm', type=int, default=0, help='Tokens per minute before answering 429s')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Fraction of requests answered with a 429')
+    args = parser.parse_args()
+
+    server = start_stub_server(args.port, args.latency, args.failure_rate,
+                               truncate_rate=args.truncate_rate, token_interval=args.token_interval,
+                               requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+                               rate_limit_rate=args.rate_limit_rate)
+    print(f"Stub OpenAI server listening on {server.base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
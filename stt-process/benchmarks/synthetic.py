@@ -0,0 +1,130 @@
+"""
+Synthetic AWS Transcribe output and enhanced results for the stt-process benchmarks.
+"""
+import random
+
+WORDS = [
+    'the', 'witness', 'counsel', 'objection', 'exhibit', 'court', 'record',
+    'deposition', 'plaintiff', 'defendant', 'agreement', 'contract', 'testimony',
+    'yes', 'no', 'sir', 'your', 'honor', 'question', 'answer', 'document'
+]
+
+
+def generate_transcript(hours=1.0, speakers=2, words_per_second=2.5, seed=42):
+    """
+    Generates a Transcribe-shaped transcript with `results.items` and
+    `results.speaker_labels.segments` covering the requested duration.
+    """
+    rng = random.Random(seed)
+    duration = hours * 3600
+    word_length = 1.0 / words_per_second
+    items = []
+    segments = []
+    current_time = 0.0
+
+    while current_time < duration:
+        speaker_label = f"spk_{rng.randrange(speakers)}"
+        segment_start = current_time
+        segment_items = []
+
+        for _ in range(rng.randint(5, 60)):
+            start_time = current_time
+            end_time = start_time + word_length * 0.8
+            item = {
+                'start_time': f"{start_time:.3f}",
+                'end_time': f"{end_time:.3f}",
+                'alternatives': [{'confidence': '0.99', 'content': rng.choice(WORDS)}],
+                'type': 'pronunciation'
+            }
+            items.append(item)
+            segment_items.append({
+                'start_time': item['start_time'],
+                'end_time': item['end_time'],
+                'speaker_label': speaker_label
+            })
+            current_time += word_length
+
+        items.append({
+            'alternatives': [{'confidence': '0.0', 'content': '.'}],
+            'type': 'punctuation'
+        })
+        segments.append({
+            'start_time': f"{segment_start:.3f}",
+            'end_time': f"{current_time - word_length * 0.2:.3f}",
+            'speaker_label': speaker_label,
+            'items': segment_items
+        })
+        current_time += rng.uniform(0.2, 1.5)
+
+    return {
+        'jobName': 'stt-benchmark',
+        'accountId': '000000000000',
+        'results': {
+            'transcripts': [{'transcript': ' '.join(item['alternatives'][0]['content'] for item in items)}],
+            'speaker_labels': {'speakers': speakers, 'segments': segments},
+            'items': items
+        },
+        'status': 'COMPLETED'
+    }
+
+
+SYLLABLES = ['ba', 'ker', 'lo', 'mi', 'ran', 'de', 'so', 'tu', 'vin', 'cal', 'pe', 'nor', 'ga', 'ri', 'sen', 'ho']
+FIRST_NAMES = ['Alice', 'Brian', 'Carmen', 'David', 'Elena', 'Frank', 'Grace', 'Hector', 'Irene', 'James',
+               'Karen', 'Luis', 'Maria', 'Nathan', 'Olivia', 'Peter', 'Rosa', 'Samuel', 'Teresa', 'Victor']
+LAST_NAMES = ['Adams', 'Baker', 'Chen', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Hughes', 'Ito', 'Jensen',
+              'Kowalski', 'Lopez', 'Moreau', 'Nguyen', 'Okafor', 'Patel', 'Quinn', 'Rossi', 'Schmidt', 'Torres',
+              'Usman', 'Vargas', 'Weber', 'Xu', 'Young', 'Zimmer']
+
+
+def get_vocabulary(size, seed=0):
+    """
+    Returns `size` distinct made-up words, the legal terms of WORDS first.
+    """
+    rng = random.Random(seed)
+    vocabulary = list(WORDS)
+    seen = set(vocabulary)
+    while len(vocabulary) < size:
+        word = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4)))
+        if word not in seen:
+            seen.add(word)
+            vocabulary.append(word)
+    return vocabulary[:size]
+
+
+def generate_enhanced_transcript(minutes=5.0, speakers=3, vocabulary=None, words_per_second=2.5, seed=42):
+    """
+    Generates an enhanced result as the store Lambda receives it: segments whose
+    words follow a Zipf-like distribution over `vocabulary`, a few of which name
+    witnesses and exhibits, and the `entities` listing them.
+    """
+    rng = random.Random(seed)
+    vocabulary = vocabulary or get_vocabulary(5000)
+    cum_weights = []
+    total = 0.0
+    for rank in range(1, len(vocabulary) + 1):
+        total += 1.0 / rank
+        cum_weights.append(total)
+
+    witnesses = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" for _ in range(rng.randint(1, 4))]
+    exhibits = [f"Exhibit {rng.randint(1, 300)}" for _ in range(rng.randint(0, 6))]
+    mentions = [f"witness {name}" for name in witnesses] + exhibits
+
+    duration = minutes * 60
+    segments = []
+    current_time = 0.0
+    while current_time < duration:
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(5, 60))
+        if rng.random() < 0.1:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(mentions))
+        segments.append({
+            'timestamp': f"{current_time:.3f}",
+            'speaker': f"Speaker {rng.randrange(speakers) + 1}",
+            'text': ' '.join(words).capitalize() + '.'
+        })
+        current_time += len(words) / words_per_second + rng.uniform(0.2, 1.5)
+
+    return {
+        'transcript': ' '.join(segment['text'] for segment in segments),
+        'segments': segments,
+        'entities': {'WITNESS': witnesses, 'EXHIBIT': sorted(set(exhibits))}
+    }
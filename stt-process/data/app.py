@@ -1,7 +1,11 @@
-import json
+from metrics import Metrics
 
+metrics = Metrics('data')
+
+
+@metrics.instrument_handler
 def lambda_handler(event, context):
-    # Log the received event
-    print(json.dumps(event))
+    # Log the received event when debugging
+    metrics.debug("Received event", event)
     # Return the received event
-    return event
\ No newline at end of file
+    return event
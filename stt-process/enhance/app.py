@@ -1,22 +1,160 @@
+from concurrent.futures import ThreadPoolExecutor
+from entities import ENTITY_CATEGORIES, describe_entity_categories, merge_entities
+from enhanced_result import write_enhanced_result
+from entity_patterns import STRUCTURED_ENTITY_CATEGORIES, extract_structured_entities
+from job_state import get_file_name, get_file_name_from_job, update_job_state
+from metrics import Metrics
 from openai import OpenAI, OpenAIError
+from partial_results import PartialResultWriter
+from rate_limit import create_rate_limit_governor
+from response_cache import create_response_cache, make_cache_key
+from segment_stream import SegmentStreamParser
 from urllib.parse import urlparse
+from token_packing import count_tokens, pack_segments
+from transcript_index import build_transcript_index, get_words_in_range
+from transcript_stream import parse_transcript_stream
 import boto3
+import httpx
 import json
 import os
+import time
+
+metrics = Metrics('enhance')
 
 # Initialize OpenAI API key from environment variable
-s3 = boto3.client('s3')
+s3 = metrics.instrument_s3(boto3.client('s3'))
+
+# Set up OpenAI client (OPENAI_BASE_URL can point it at a local stub server).
+# 429s and transient errors are retried by the rate-limit governor instead.
+client = OpenAI(max_retries=0)
+
+# Cache of parsed OpenAI responses, configured through RESPONSE_CACHE_* variables
+response_cache = create_response_cache(s3)
 
-# Set up OpenAI client
-client = OpenAI()
+# RPM/TPM limits shared by concurrent invocations, configured through
+# OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT and RATE_LIMIT_* variables
+rate_limiter = create_rate_limit_governor(s3, metrics)
 
+OPENAI_MODEL = "gpt-4o-2024-08-06"
 MAX_TOKENS = 15000  # Define a limit to keep the token count well below the GPT model limit
+CONTEXT_WINDOW_TOKENS = 128000  # Context window of the enhancement model
+MESSAGE_OVERHEAD_TOKENS = 4  # Tokens the chat format adds around each message
+
+SYSTEM_PROMPT = "You are a legal transcription assistant."
+
+# Bump a prompt version whenever its template changes so cached responses are not reused
+ENHANCE_PROMPT_VERSION = "2"
+ENHANCE_WITH_NER_PROMPT_VERSION = "2"
+NER_PROMPT_VERSION = "2"
+ENHANCE_DELTA_PROMPT_VERSION = "1"
+
+ENHANCE_PROMPT_TEMPLATE = """
+    You are a legal transcription assistant. Format the following transcript into a JSON object with the following structure:
+    {{
+        "segments": [
+            {{
+            "timestamp": "timestamp for when the speaker starts talking",
+            "speaker": "best guess name or title label of the speaker otherwise use the original label",
+            "text": "The actual speech text from the speaker"
+            }}
+        ],
+        "transcript": "The entire transcript as a single string."
+    }}
+    The transcript is:
+    {transcript_chunk}
+    """
+
+ENHANCE_WITH_NER_PROMPT_TEMPLATE = """
+    You are a legal transcription assistant. Format the following transcript into a JSON object with the following structure, and perform Named Entity Recognition (NER) on it:
+    {{
+        "segments": [
+            {{
+            "timestamp": "timestamp for when the speaker starts talking",
+            "speaker": "best guess name or title label of the speaker otherwise use the original label",
+            "text": "The actual speech text from the speaker"
+            }}
+        ],
+        "transcript": "The entire transcript as a single string.",
+        "entities": {{
+{entity_schema}
+        }}
+    }}
+    The transcript is:
+    {transcript_chunk}
+    """
+
+# Delta output: the model names the speakers and corrects the segments that need
+# it, and the transcript and segments are rebuilt locally from the Transcribe text
+ENHANCE_DELTA_PROMPT_TEMPLATE = """
+    You are a legal transcription assistant. The transcript below is a JSON list of numbered speaker segments. Do not repeat the transcript; return only a JSON object with the following structure:
+    {{
+        "speakers": {{
+            "original speaker label": "best guess name or title label of the speaker"
+        }},
+        "corrections": [
+            {{
+            "index": "index of a segment whose text needs correcting",
+            "text": "The corrected speech text of that segment"
+            }}
+        ]{entities_field}
+    }}
+    Leave out the speakers you can't name and the segments that need no correction.
+    The transcript is:
+    {transcript_chunk}
+    """
+
+NER_PROMPT_TEMPLATE = """
+    Perform Named Entity Recognition (NER) on the following transcript. Return the identified entities categorized into the following categories:
+    {{
+        "entities": {{
+{entity_schema}
+        }}
+    }}
+    The transcript is:
+    {transcript}
+    """
+
+# 'full' has the model return the whole enhanced chunk, 'delta' only the speaker
+# names and text corrections
+ENHANCE_OUTPUT_MODE = os.environ.get('ENHANCE_OUTPUT_MODE', 'full').lower()
+
+# Fuse NER into the enhancement request instead of running a separate NER pass
+ENHANCE_WITH_NER = os.environ.get('ENHANCE_WITH_NER', 'false').lower() == 'true'
+NER_OUTPUT_RESERVE_TOKENS = 2000  # Completion tokens kept free for entities in fused mode
+
+# Structured categories (case numbers, statutes, exhibits, dates, courts) are extracted
+# locally with patterns and left out of the LLM prompts
+LOCAL_ENTITY_EXTRACTION = os.environ.get('LOCAL_ENTITY_EXTRACTION', 'true').lower() == 'true'
+LLM_ENTITY_CATEGORIES = [
+    category for category in ENTITY_CATEGORIES
+    if not (LOCAL_ENTITY_EXTRACTION and category in STRUCTURED_ENTITY_CATEGORIES)
+]
 
+# Number of chunks enhanced in parallel and attempts per chunk before giving up
+ENHANCE_CONCURRENCY = int(os.environ.get('ENHANCE_CONCURRENCY', '4'))
+ENHANCE_MAX_ATTEMPTS = int(os.environ.get('ENHANCE_MAX_ATTEMPTS', '3'))
+ENHANCE_RETRY_DELAY = float(os.environ.get('ENHANCE_RETRY_DELAY', '2'))
 
+# Stream enhancement responses, keeping the segments of a cut-off response
+ENHANCE_STREAMING = os.environ.get('ENHANCE_STREAMING', 'false').lower() == 'true'
+# Follow-up requests for the rest of a cut-off stream, within one enhancement attempt
+ENHANCE_STREAM_RESUMES = int(os.environ.get('ENHANCE_STREAM_RESUMES', '1'))
+
+# Parse the Transcribe output as it is read from S3, keeping only compact arrays
+STREAMING_TRANSCRIPT_PARSE = os.environ.get('STREAMING_TRANSCRIPT_PARSE', 'false').lower() == 'true'
+
+# Bucket enhanced chunks are persisted to as they complete, for paged delivery
+PARTIAL_RESULTS_BUCKET = os.environ.get('PARTIAL_RESULTS_BUCKET')
+
+
+@metrics.instrument_handler
 def lambda_handler(event, context):
+    file_name = event.get('fileName') or get_file_name_from_job(get_file_name(event.get('key', '')))
+
     try:
-        # Log the incoming event
-        print(f"Received event: {json.dumps(event)}")
+        # Log the incoming event when debugging
+        metrics.debug("Received event", event)
+        metrics.set_property('fileName', file_name)
         
         # Parse S3 URI to get the transcript
         bucket = event['bucket']
@@ -25,142 +163,261 @@ def lambda_handler(event, context):
         # Handle case where bucket is a list
         if isinstance(bucket, list):
             bucket = bucket[0]  # Take the first element if it's a list
+
+        update_job_state(s3, file_name, 'ENHANCING')
         
         # Fetch the transcript file from S3
         transcript_obj = s3.get_object(Bucket=bucket, Key=key)
-        transcript = json.loads(transcript_obj['Body'].read().decode('utf-8'))
-        
-        # Split the transcript into smaller chunks if necessary
-        transcript_chunks = split_transcript_into_batches(transcript, MAX_TOKENS)
-
-        # Process each chunk using GPT-4 Turbo for enhancing the segments
-        enhanced_chunks = []
-        for chunk in transcript_chunks:
-            enhanced_chunk = enhance_with_openai(chunk)
-            if enhanced_chunk:
-                enhanced_chunks.append(enhanced_chunk)
-            else:
-                print(f"Warning: enhance_with_openai returned None for chunk: {chunk}")
-        
-        if not enhanced_chunks:
+        if STREAMING_TRANSCRIPT_PARSE:
+            with metrics.span('ParseTime'):
+                segments, transcript_index = parse_transcript_stream(transcript_obj['Body'])
+
+            # Split the transcript into smaller chunks if necessary
+            with metrics.span('SplitTime'):
+                transcript_chunks = split_segments_into_batches(segments, transcript_index, MAX_TOKENS)
+        else:
+            transcript_content = transcript_obj['Body'].read()
+            with metrics.span('ParseTime'):
+                transcript = json.loads(transcript_content.decode('utf-8'))
+
+            # Split the transcript into smaller chunks if necessary
+            with metrics.span('SplitTime'):
+                transcript_chunks = split_transcript_into_batches(transcript, MAX_TOKENS)
+        metrics.count('Chunks', len(transcript_chunks))
+
+        # Enhance the chunks in parallel, keeping the original chunk order, and
+        # persist each chunk as it completes so it can be served before the rest
+        on_chunk_enhanced = create_partial_result_callback(file_name, len(transcript_chunks))
+        enhanced_chunks = enhance_chunks(transcript_chunks, on_chunk_enhanced=on_chunk_enhanced)
+
+        failed_chunks = [index for index, chunk in enumerate(enhanced_chunks) if chunk is None]
+        if failed_chunks:
+            update_job_state(s3, file_name, 'FAILED', error='Enhancement failed for some chunks')
             return {
                 'statusCode': 500,
-                'body': json.dumps({'error': 'No valid enhanced chunks were returned'})
+                'body': json.dumps({
+                    'error': 'Enhancement failed for some chunks',
+                    'failedChunks': failed_chunks
+                })
             }
         
         # Combine the processed chunks into a single transcript
         combined_transcript = combine_enhanced_chunks(enhanced_chunks)
 
-        # Perform NER on the entire combined transcript
-        enhanced_transcript_with_ner = perform_ner_on_transcript(combined_transcript)
+        # Perform NER per chunk and merge the results
+        enhanced_transcript_with_ner = perform_ner_on_transcript(combined_transcript, enhanced_chunks)
         
         if not enhanced_transcript_with_ner:
+            update_job_state(s3, file_name, 'FAILED', error='NER process failed')
             return {
                 'statusCode': 500,
                 'body': json.dumps({'error': 'NER process failed'})
             }
         
+        cache_stats = response_cache.stats()
+        metrics.count('ResponseCacheHits', cache_stats['hits'])
+        metrics.count('ResponseCacheMisses', cache_stats['misses'])
+
         enhanced_transcript_with_ner['s3'] = {
             'transcriptionOutputBucket': bucket, 
             'transcriptionJobName': key
         }
 
+        # Write the result once and pass the store step a claim check, which keeps
+        # long transcripts under the Step Functions payload limit
+        with metrics.span('SerializeTime'):
+            result = write_enhanced_result(s3, bucket, key, enhanced_transcript_with_ner)
+
+        update_job_state(s3, file_name, 'STORING')
+
         return {
             'statusCode': 200,
-            'body': json.dumps(enhanced_transcript_with_ner)  # Return JSON serializable output
+            'result': result,
+            'fileName': file_name
         }
     
     except Exception as e:
         print(f"Error in lambda_handler: {str(e)}")
+        update_job_state(s3, file_name, 'FAILED', error=str(e))
         raise e
     
 
+def create_partial_result_callback(file_name, chunk_count):
+    """
+    Returns the on_chunk_enhanced callback that writes each enhanced chunk to the
+    partial results and reports the progress, or None without PARTIAL_RESULTS_BUCKET.
+    """
+    if not PARTIAL_RESULTS_BUCKET:
+        return None
+
+    partial_results = PartialResultWriter(s3, PARTIAL_RESULTS_BUCKET, file_name, chunk_count)
+
+    def on_chunk_enhanced(index, enhanced_chunk):
+        # The job state is updated outside the writer's lock, so chunks completing
+        # together only wait for each other's manifest write
+        ready_chunks, ready_segments = partial_results.write_chunk(index, enhanced_chunk)
+        update_job_state(s3, file_name, 'ENHANCING',
+                         percent=50 + 35 * ready_chunks // chunk_count,
+                         readySegments=ready_segments)
+
+    return on_chunk_enhanced
+
+
 def split_transcript_into_batches(transcript, max_tokens):
     """
-    Splits the transcript into smaller chunks based on the max token limit.
+    Splits the transcript into as few chunks as the model's context allows.
+    `max_tokens` is the completion limit of each enhancement request; the prompt
+    template overhead and the expected response size are both counted against it.
     """
     segments = transcript['results']['speaker_labels']['segments']
-    transcript_items = transcript['results']['items']
-    chunks = []
-    current_chunk = []
-    current_token_count = 0
-    
-    for segment in segments:
-        # Calculate segment token count using an approximation (word count)
-        segment_text = get_text_for_segment(segment, transcript_items)
-        segment_token_count = len(segment_text.split())
-        
-        if current_token_count + segment_token_count > max_tokens:
-            # If adding this segment exceeds the token limit, start a new chunk
-            chunks.append(current_chunk)
-            current_chunk = []
-            current_token_count = 0
-        
-        # Add the segment to the current chunk
-        current_chunk.append({
-            'timestamp': segment['start_time'],
-            'speaker': segment['speaker_label'],
-            'text': segment_text
-        })
-        current_token_count += segment_token_count
-    
-    # Add the last chunk if it's not empty
-    if current_chunk:
-        chunks.append(current_chunk)
+    transcript_index = build_transcript_index(transcript['results']['items'])
+    return split_segments_into_batches(segments, transcript_index, max_tokens)
 
-    return chunks
+
+def split_segments_into_batches(segments, transcript_index, max_tokens):
+    """
+    Packs speaker segments, with their text looked up in the transcript index,
+    into enhancement chunks as split_transcript_into_batches does.
+    """
+    max_input_tokens = CONTEXT_WINDOW_TOKENS - max_tokens - get_prompt_overhead_tokens()
+    max_output_tokens = max_tokens - NER_OUTPUT_RESERVE_TOKENS if ENHANCE_WITH_NER else max_tokens
+
+    return pack_segments(
+        segments, transcript_index, max_input_tokens, max_output_tokens,
+        delta_output=ENHANCE_OUTPUT_MODE == 'delta'
+    )
+
+
+def get_prompt_overhead_tokens():
+    """
+    Returns the tokens an enhancement request costs before any transcript is added.
+    """
+    return (
+        count_tokens(SYSTEM_PROMPT)
+        + count_tokens(build_enhance_prompt(''))
+        + 2 * MESSAGE_OVERHEAD_TOKENS
+    )
 
 
-def get_text_for_segment(segment, transcript_items):
+def build_enhance_prompt(transcript_chunk_json):
+    """
+    Builds the enhancement prompt, asking for entities as well in fused NER mode.
+    """
+    if ENHANCE_OUTPUT_MODE == 'delta':
+        entities_field = ''
+        if ENHANCE_WITH_NER:
+            entities_field = (',\n        "entities": {\n' + describe_entity_categories(LLM_ENTITY_CATEGORIES)
+                              + '\n        }')
+        return ENHANCE_DELTA_PROMPT_TEMPLATE.format(
+            entities_field=entities_field,
+            transcript_chunk=transcript_chunk_json
+        )
+    if ENHANCE_WITH_NER:
+        return ENHANCE_WITH_NER_PROMPT_TEMPLATE.format(
+            entity_schema=describe_entity_categories(LLM_ENTITY_CATEGORIES),
+            transcript_chunk=transcript_chunk_json
+        )
+    return ENHANCE_PROMPT_TEMPLATE.format(transcript_chunk=transcript_chunk_json)
+
+
+def get_text_for_segment(segment, transcript_index):
     """
     Get the transcript text corresponding to a given speaker segment.
+    Accepts either a prebuilt transcript index or the raw transcript items.
     """
-    segment_text = []
+    if not isinstance(transcript_index, dict):
+        transcript_index = build_transcript_index(transcript_index)
+
     start_time = float(segment['start_time'])
     end_time = float(segment['end_time'])
 
-    for item in transcript_items:
-        if 'start_time' in item and start_time <= float(item['start_time']) <= end_time:
-            if item['type'] == 'pronunciation' or item['type'] == 'punctuation':
-                segment_text.append(item['alternatives'][0]['content'])
+    return " ".join(get_words_in_range(transcript_index, start_time, end_time))
 
-    return " ".join(segment_text)
+
+def enhance_chunks(transcript_chunks, concurrency=None, max_attempts=None, on_chunk_enhanced=None):
+    """
+    Enhances the transcript chunks with at most `concurrency` requests in flight.
+    Results are returned in the original chunk order, with None for any chunk
+    that still failed after `max_attempts`. `on_chunk_enhanced(index, chunk)` is
+    called as soon as each chunk succeeds.
+    """
+    concurrency = max(1, concurrency or ENHANCE_CONCURRENCY)
+    max_attempts = max(1, max_attempts or ENHANCE_MAX_ATTEMPTS)
+
+    def enhance(indexed_chunk):
+        index, chunk = indexed_chunk
+        enhanced_chunk = enhance_chunk_with_retries(index, chunk, max_attempts)
+        if enhanced_chunk and on_chunk_enhanced:
+            try:
+                on_chunk_enhanced(index, enhanced_chunk)
+            except Exception as e:
+                print(f"Warning: failed to persist chunk {index}: {e}")
+        return enhanced_chunk
+
+    with metrics.span('EnhanceTime'), ThreadPoolExecutor(max_workers=concurrency) as executor:
+        enhanced_chunks = list(executor.map(enhance, enumerate(transcript_chunks)))
+
+    metrics.set_property('enhanceConcurrency', concurrency)
+    return enhanced_chunks
+
+
+def enhance_chunk_with_retries(index, transcript_chunk, max_attempts):
+    """
+    Enhances a single chunk, retrying it with exponential backoff on failure.
+    Logs the latency of every attempt so the concurrency level can be tuned.
+    """
+    for attempt in range(1, max_attempts + 1):
+        started = time.perf_counter()
+        enhanced_chunk = enhance_with_openai(transcript_chunk)
+        latency = time.perf_counter() - started
+
+        if enhanced_chunk:
+            metrics.debug(f"Chunk {index}: enhanced in {latency:.2f}s (attempt {attempt}/{max_attempts})")
+            return enhanced_chunk
+
+        print(f"Warning: chunk {index} failed after {latency:.2f}s (attempt {attempt}/{max_attempts})")
+        if attempt < max_attempts:
+            metrics.count('LlmRetries')
+            time.sleep(ENHANCE_RETRY_DELAY * 2 ** (attempt - 1))
+
+    metrics.count('FailedChunks')
+    return None
 
 
 def enhance_with_openai(transcript_chunk):
     """
     Enhances a chunk of the transcript using GPT-4o.
     """
-    prompt = f"""
-    You are a legal transcription assistant. Format the following transcript into a JSON object with the following structure:
-    {{
-        "transcript": "The entire transcript as a single string.",
-        "segments": [
-            {{
-            "timestamp": "timestamp for when the speaker starts talking",
-            "speaker": "best guess name or title label of the speaker otherwise use the original label",
-            "text": "The actual speech text from the speaker"
-            }}
-        ]
-    }}
-    The transcript is:
-    {json.dumps(transcript_chunk)}
-    """
+    delta_output = ENHANCE_OUTPUT_MODE == 'delta'
+    if delta_output:
+        prompt = build_enhance_prompt(json.dumps(number_chunk_entries(transcript_chunk)))
+        prompt_version = f"delta-{ENHANCE_DELTA_PROMPT_VERSION}"
+    else:
+        prompt = build_enhance_prompt(json.dumps(transcript_chunk))
+        prompt_version = ENHANCE_WITH_NER_PROMPT_VERSION if ENHANCE_WITH_NER else ENHANCE_PROMPT_VERSION
+
+    if ENHANCE_WITH_NER:
+        cache_key = make_cache_key(OPENAI_MODEL, prompt_version, {
+            'chunk': transcript_chunk,
+            'categories': LLM_ENTITY_CATEGORIES
+        })
+    else:
+        cache_key = make_cache_key(OPENAI_MODEL, prompt_version, transcript_chunk)
+    cached_response = response_cache.get(cache_key)
+    if cached_response is not None:
+        return cached_response
+
+    # Delta responses are short, so there is little to gain from streaming them
+    if ENHANCE_STREAMING and not delta_output:
+        response_json = stream_enhancement(transcript_chunk)
+        if response_json is not None:
+            response_cache.put(cache_key, response_json)
+        return response_json
     
     try:
         # Make the API call to OpenAI's GPT-4 Turbo model
-        completion = client.beta.chat.completions.parse(
-            model="gpt-4o-2024-08-06",
-            messages=[
-                {"role": "system", "content": "You are a legal transcription assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=MAX_TOKENS,
-            temperature=0
-        )
-
-        # Add logging to check the raw response
-        print(f"Raw completion response: {completion}")
+        completion = create_completion(prompt)
+        record_completion_usage(completion)
 
         # Check if the response content exists
         if not completion or not completion.choices:
@@ -170,8 +427,8 @@ def enhance_with_openai(transcript_chunk):
         # Extract the response text from the first choice and clean it
         response_text = completion.choices[0].message.content.strip()
 
-        # Log the extracted response text
-        print(f"Extracted response content: {response_text}")
+        # Log the extracted response text when debugging
+        metrics.debug("Extracted response content", response_text)
 
         # Remove backticks and language indicators like ```json
         if response_text.startswith("```"):
@@ -179,6 +436,10 @@ def enhance_with_openai(transcript_chunk):
 
         # Parse the cleaned response text as JSON
         response_json = json.loads(response_text)
+        if delta_output:
+            response_json = apply_enhancement_delta(transcript_chunk, response_json)
+
+        response_cache.put(cache_key, response_json)
 
         return response_json
     
@@ -193,49 +454,257 @@ def enhance_with_openai(transcript_chunk):
         return None
 
 
-def perform_ner_on_transcript(transcript):
+def create_completion(prompt):
     """
-    Enhances the entire transcript with Named Entity Recognition using GPT-4 Turbo.
+    Sends a chat completion request once the rate limits allow it, retrying it
+    on 429s and transient errors.
     """
-    prompt = f"""
-    Perform Named Entity Recognition (NER) on the following transcript. Return the transcript with the identified entities categorized into the following categories:
-    {{
-        "transcript": "The entire transcript as a single string.",
-        "entities": {{
-            "ATTORNEY": ["List of unique attorney names"],
-            "PLAINTIFF": ["List of unique plaintiff names"],
-            "DEFENDANT": ["List of unique defendant names"],
-            "JUDGE": ["List of unique judge names"],
-            "WITNESS": ["List of unique witness names"],
-            "EXPERT": ["List of unique expert witness names"],
-            "COMPANY": ["List of unique company names"],
-            "CASE_NUMBER": ["List of unique case numbers"],
-            "COURT": ["List of unique court names"],
-            "DATE": ["List of unique relevant dates"],
-            "LOCATION": ["List of unique relevant locations"],
-            "STATUTE": ["List of unique statute references"],
-            "EXHIBIT": ["List of unique exhibit references"],
-            "LEGAL_TERM": ["List of unique legal terms or jargon"]
-        }}
-    }}
-    The transcript is:
-    {transcript['transcript']}
+    def send():
+        with metrics.span('LlmLatency'):
+            return client.beta.chat.completions.parse(
+                model=OPENAI_MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=MAX_TOKENS,
+                temperature=0
+            )
+
+    return rate_limiter.call(send, estimate_request_tokens(prompt))
+
+
+def estimate_request_tokens(prompt):
     """
-    
-    try:
-        # Make the API call to OpenAI's GPT-4 Turbo model
-        completion = client.beta.chat.completions.parse(
-            model="gpt-4o-2024-08-06",
+    Returns the tokens a request counts against the TPM limit when it is sent:
+    the prompt and the whole completion allowance, as OpenAI counts them.
+    """
+    return count_tokens(SYSTEM_PROMPT) + count_tokens(prompt) + 2 * MESSAGE_OVERHEAD_TOKENS + MAX_TOKENS
+
+
+def number_chunk_entries(transcript_chunk):
+    """
+    Adds to each chunk entry the index delta corrections refer to it by.
+    """
+    return [dict(index=index, **entry) for index, entry in enumerate(transcript_chunk)]
+
+
+def apply_enhancement_delta(transcript_chunk, delta):
+    """
+    Rebuilds the enhanced chunk a full response would have held from the chunk's
+    own text, the speaker names and the text corrections of a delta response.
+    Corrections of unknown segments are ignored.
+    """
+    if not isinstance(delta, dict):
+        raise ValueError('Malformed delta response')
+    speakers = delta.get('speakers') or {}
+    if not isinstance(speakers, dict) or not isinstance(delta.get('corrections') or [], list):
+        raise ValueError('Malformed delta response')
+
+    corrections = {}
+    for correction in delta.get('corrections') or []:
+        try:
+            index = int(correction['index'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= index < len(transcript_chunk) and isinstance(correction.get('text'), str):
+            corrections[index] = correction['text']
+    metrics.count('DeltaCorrections', len(corrections))
+
+    segments = [{
+        'timestamp': entry['timestamp'],
+        'speaker': speakers.get(entry['speaker']) or entry['speaker'],
+        'text': corrections.get(index, entry['text'])
+    } for index, entry in enumerate(transcript_chunk)]
+
+    enhanced_chunk = {
+        'transcript': ' '.join(segment['text'] for segment in segments),
+        'segments': segments
+    }
+    if isinstance(delta.get('entities'), dict):
+        enhanced_chunk['entities'] = delta['entities']
+    return enhanced_chunk
+
+
+def stream_enhancement(transcript_chunk, max_resumes=None):
+    """
+    Enhances a chunk from streamed completions, parsing each segment as soon as it
+    is complete. When a stream is cut off, the segments already received are kept
+    and only the rest of the chunk is requested again, up to `max_resumes` times.
+    A stream that returns no segments fails the attempt instead, leaving the retry
+    to enhance_chunk_with_retries. A response assembled from several requests
+    leaves out `entities`, so the NER pass covers the chunk.
+    """
+    max_resumes = max(0, ENHANCE_STREAM_RESUMES if max_resumes is None else max_resumes)
+    segments = []
+    remaining = transcript_chunk
+
+    for request in range(1 + max_resumes):
+        parser = stream_completion(build_enhance_prompt(json.dumps(remaining)))
+        if not parser.complete and not parser.segments:
+            return None
+        segments.extend(parser.segments)
+
+        if parser.complete and request == 0:
+            return parser.get_result()
+        if parser.complete:
+            remaining = []
+        else:
+            remaining = get_remaining_entries(remaining, parser.segments)
+        if not remaining:
+            return {
+                'transcript': ' '.join(segment['text'] for segment in segments),
+                'segments': segments
+            }
+
+        metrics.count('StreamResumes')
+        print(f"Warning: enhancement stream cut off after {len(segments)} segments, "
+              f"requesting the remaining {len(remaining)}")
+
+    return None
+
+
+def stream_completion(prompt):
+    """
+    Streams an enhancement completion into a SegmentStreamParser and returns it.
+    A stream that fails or stops early leaves the parser incomplete.
+    """
+    parser = SegmentStreamParser()
+    reserved_tokens = estimate_request_tokens(prompt)
+    started = None
+
+    def send():
+        # Latency is measured from the attempt that was answered, not the rate-limit waits
+        nonlocal started
+        started = time.perf_counter()
+        return client.chat.completions.create(
+            model=OPENAI_MODEL,
             messages=[
-                {"role": "system", "content": "You are a legal transcription assistant."},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=MAX_TOKENS,
-            temperature=0
+            temperature=0,
+            stream=True,
+            stream_options={'include_usage': True}
         )
-        
-        # Add logging to check the raw response
-        print(f"Raw NER completion response: {completion}")
+
+    try:
+        stream = rate_limiter.call(send, reserved_tokens)
+        for chunk in stream:
+            if chunk.usage:
+                record_completion_usage(chunk)
+                rate_limiter.settle(reserved_tokens, chunk.usage.total_tokens)
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            first_segment = not parser.segments
+            if parser.feed(chunk.choices[0].delta.content) and first_segment:
+                metrics.record('TimeToFirstSegment', (time.perf_counter() - started) * 1000, 'Milliseconds')
+    except (OpenAIError, httpx.HTTPError) as e:
+        print(f"OpenAI stream error: {e}")
+    except json.JSONDecodeError as e:
+        print(f"JSON parsing error in stream: {e}")
+    finally:
+        if started is not None:
+            metrics.record('LlmLatency', (time.perf_counter() - started) * 1000, 'Milliseconds')
+
+    return parser
+
+
+def get_remaining_entries(entries, segments):
+    """
+    Returns the chunk entries after the last segment received.
+    """
+    if not segments:
+        return entries
+    try:
+        last_timestamp = float(segments[-1]['timestamp'])
+        return [entry for entry in entries if float(entry['timestamp']) > last_timestamp]
+    except (KeyError, TypeError, ValueError):
+        # The model rewrote the timestamps, so fall back to counting segments
+        return entries[len(segments):]
+
+
+def record_completion_usage(completion):
+    """
+    Adds the tokens a completion used to the invocation's metrics.
+    """
+    usage = getattr(completion, 'usage', None)
+    if usage:
+        metrics.count('PromptTokens', usage.prompt_tokens)
+        metrics.count('CompletionTokens', usage.completion_tokens)
+
+
+def perform_ner_on_transcript(transcript, enhanced_chunks=None):
+    """
+    Performs Named Entity Recognition on each chunk in parallel and merges the results
+    into the transcript's `entities`. Chunks that already carry entities from a fused
+    enhancement request are not sent again, and the structured categories come from
+    the local pattern extractor.
+    """
+    chunks = enhanced_chunks or [transcript]
+
+    def extract(index, chunk):
+        if isinstance(chunk.get('entities'), dict):
+            return chunk['entities']
+        return extract_entities_with_retries(index, chunk['transcript'], ENHANCE_MAX_ATTEMPTS)
+
+    with ThreadPoolExecutor(max_workers=max(1, ENHANCE_CONCURRENCY)) as executor:
+        chunk_entities = list(executor.map(extract, range(len(chunks)), chunks))
+
+    failed_chunks = [index for index, entities in enumerate(chunk_entities) if entities is None]
+    if failed_chunks:
+        print(f"Warning: NER failed for chunks {failed_chunks}")
+        return None
+
+    if LOCAL_ENTITY_EXTRACTION:
+        chunk_entities.insert(0, extract_structured_entities(transcript['transcript']))
+
+    transcript['entities'] = merge_entities(chunk_entities)
+
+    return transcript
+
+
+def extract_entities_with_retries(index, text, max_attempts):
+    """
+    Extracts the entities of a single chunk, retrying it with exponential backoff
+    on failure like enhance_chunk_with_retries.
+    """
+    for attempt in range(1, max_attempts + 1):
+        entities = extract_entities_with_openai(text)
+        if entities is not None:
+            return entities
+
+        print(f"Warning: NER for chunk {index} failed (attempt {attempt}/{max_attempts})")
+        if attempt < max_attempts:
+            metrics.count('LlmRetries')
+            time.sleep(ENHANCE_RETRY_DELAY * 2 ** (attempt - 1))
+
+    metrics.count('FailedNerChunks')
+    return None
+
+
+def extract_entities_with_openai(text):
+    """
+    Extracts the named entities from a piece of the transcript using GPT-4o.
+    """
+    prompt = NER_PROMPT_TEMPLATE.format(
+        entity_schema=describe_entity_categories(LLM_ENTITY_CATEGORIES),
+        transcript=text
+    )
+
+    cache_key = make_cache_key(OPENAI_MODEL, NER_PROMPT_VERSION, {
+        'transcript': text,
+        'categories': LLM_ENTITY_CATEGORIES
+    })
+    cached_entities = response_cache.get(cache_key)
+    if cached_entities is not None:
+        return cached_entities
+    
+    try:
+        # Make the API call to OpenAI's GPT-4 Turbo model
+        completion = create_completion(prompt)
+        record_completion_usage(completion)
 
         # Check if the response content exists
         if not completion or not completion.choices:
@@ -245,8 +714,8 @@ def perform_ner_on_transcript(transcript):
         # Extract the response text from the first choice and clean it
         response_text = completion.choices[0].message.content.strip()
 
-        # Log the extracted response text
-        print(f"Extracted NER response content: {response_text}")
+        # Log the extracted response text when debugging
+        metrics.debug("Extracted NER response content", response_text)
 
         # Remove backticks and language indicators like ```json
         if response_text.startswith("```"):
@@ -254,11 +723,13 @@ def perform_ner_on_transcript(transcript):
 
         # Parse the cleaned response text as JSON
         response_json = json.loads(response_text)
+        if not isinstance(response_json, dict) or not isinstance(response_json.get('entities', {}), dict):
+            raise ValueError('Malformed NER response')
 
-        # Add identified entities to the transcript and return it
-        transcript['entities'] = response_json.get('entities', {})
+        entities = response_json.get('entities', {})
+        response_cache.put(cache_key, entities)
 
-        return transcript
+        return entities
     
     except OpenAIError as e:
         print(f"OpenAI API error during NER: {e}")
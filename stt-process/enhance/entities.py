@@ -0,0 +1,57 @@
+# Entity categories in the order the store Lambda and frontend expect them
+ENTITY_CATEGORIES = {
+    "ATTORNEY": "List of unique attorney names",
+    "PLAINTIFF": "List of unique plaintiff names",
+    "DEFENDANT": "List of unique defendant names",
+    "JUDGE": "List of unique judge names",
+    "WITNESS": "List of unique witness names",
+    "EXPERT": "List of unique expert witness names",
+    "COMPANY": "List of unique company names",
+    "CASE_NUMBER": "List of unique case numbers",
+    "COURT": "List of unique court names",
+    "DATE": "List of unique relevant dates",
+    "LOCATION": "List of unique relevant locations",
+    "STATUTE": "List of unique statute references",
+    "EXHIBIT": "List of unique exhibit references",
+    "LEGAL_TERM": "List of unique legal terms or jargon"
+}
+
+
+def normalize_entity(value):
+    """
+    Returns the key used to match entity names regardless of case and whitespace.
+    """
+    return " ".join(value.split()).casefold()
+
+
+def merge_entities(entity_lists):
+    """
+    Merges per-chunk entity results into a single `entities` object.
+    Every category is present; values are deduplicated on their normalized form,
+    keeping the first spelling seen.
+    """
+    merged = {category: [] for category in ENTITY_CATEGORIES}
+    seen = {category: set() for category in ENTITY_CATEGORIES}
+
+    for entities in entity_lists:
+        for category, values in (entities or {}).items():
+            if category not in merged or not isinstance(values, list):
+                continue
+            for value in values:
+                if not isinstance(value, str):
+                    continue
+                normalized = normalize_entity(value)
+                if normalized and normalized not in seen[category]:
+                    seen[category].add(normalized)
+                    merged[category].append(" ".join(value.split()))
+
+    return merged
+
+
+def describe_entity_categories(categories, indent="        "):
+    """
+    Renders the categories as the JSON-like listing used in the prompts.
+    """
+    return ",\n".join(
+        f'{indent}    "{category}": ["{ENTITY_CATEGORIES[category]}"]' for category in categories
+    )
@@ -0,0 +1,101 @@
+import re
+
+from entities import normalize_entity
+
+MONTHS = (
+    r"(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|June?|July?|Aug(?:ust)?"
+    r"|Sep(?:t(?:ember)?)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)"
+)
+
+STATES = (
+    r"(?:Alabama|Alaska|Arizona|Arkansas|California|Colorado|Connecticut|Delaware|Florida|Georgia"
+    r"|Hawaii|Idaho|Illinois|Indiana|Iowa|Kansas|Kentucky|Louisiana|Maine|Maryland|Massachusetts"
+    r"|Michigan|Minnesota|Mississippi|Missouri|Montana|Nebraska|Nevada|New Hampshire|New Jersey"
+    r"|New Mexico|New York|North Carolina|North Dakota|Ohio|Oklahoma|Oregon|Pennsylvania"
+    r"|Rhode Island|South Carolina|South Dakota|Tennessee|Texas|Utah|Vermont|Virginia|Washington"
+    r"|West Virginia|Wisconsin|Wyoming|Columbia|Puerto Rico)"
+)
+
+CIRCUITS = r"(?:First|Second|Third|Fourth|Fifth|Sixth|Seventh|Eighth|Ninth|Tenth|Eleventh|D\.C\.|Federal)"
+
+# Patterns per category, tried in order at each position. A `value` group, when
+# present, is the part of the match reported as the entity.
+ENTITY_PATTERNS = {
+    "CASE_NUMBER": [
+        r"\b\d{1,2}:\d{2}-(?i:cv|cr|bk|mc|mj|md|ap)-\d{3,6}(?:-[A-Z]{2,4})*\b",
+        r"\b(?:Case|Docket|Cause|Civil Action)\s+(?:No\.|Number|#)\s*(?P<value>[A-Za-z0-9][A-Za-z0-9:\-]*\d[A-Za-z0-9\-]*)",
+    ],
+    "STATUTE": [
+        r"\b\d+\s+U\.\s?S\.\s?C\.(?:\s*(?:§§?|[Ss]ections?|[Ss]ec\.))?\s*\d+[a-z]?(?:\([a-zA-Z0-9]+\))*",
+        r"\b\d+\s+C\.\s?F\.\s?R\.(?:\s*(?:§§?|[Pp]art))?\s*\d+(?:\.\d+[a-z]?(?:-\d+)?)*(?:\([a-zA-Z0-9]+\))*",
+        r"\b(?:Federal\s+)?Rules?\s+of\s+(?:Civil|Criminal|Appellate)\s+Procedure\s+\d+(?:\([a-zA-Z0-9]+\))*",
+        r"\b(?:Federal\s+)?Rules?\s+of\s+Evidence\s+\d+(?:\([a-zA-Z0-9]+\))*",
+        r"§§?\s*\d+(?:\.\d+)*[a-z]?(?:\([a-zA-Z0-9]+\))*",
+    ],
+    "EXHIBIT": [
+        r"\b(?:(?:Plaintiff|Defendant|Government|Joint|Petitioner|Respondent)(?:'s|s'|s)?\s+)?(?i:exhibits?)"
+        r"\s+(?:(?i:no\.|number)\s+)?(?:[A-Z]{1,3}-?)?\d+[A-Za-z]?\b",
+        r"\b(?:(?:Plaintiff|Defendant|Government|Joint|Petitioner|Respondent)(?:'s|s'|s)?\s+)?(?i:exhibits?)"
+        r"\s+[A-Z]{1,2}\b(?!['\w])",
+    ],
+    "DATE": [
+        MONTHS + r"\.?\s+\d{1,2}(?:st|nd|rd|th)?,?\s+\d{4}\b",
+        r"\b\d{1,2}(?:st|nd|rd|th)?\s+(?:day\s+)?of\s+" + MONTHS + r",?\s+\d{4}\b",
+        r"\b\d{1,2}/\d{1,2}/(?:\d{4}|\d{2})\b",
+        r"\b\d{4}-\d{2}-\d{2}\b",
+    ],
+    "COURT": [
+        r"\b(?:United\s+States|U\.S\.)\s+(?:District|Bankruptcy)\s+Court\s+for\s+the\s+"
+        r"(?:(?:Northern|Southern|Eastern|Western|Middle|Central)\s+)?District\s+of\s+" + STATES,
+        r"\b(?:United\s+States\s+|U\.S\.\s+)?Court\s+of\s+Appeals\s+for\s+the\s+" + CIRCUITS + r"\s+Circuit",
+        r"\b(?:United\s+States|U\.S\.)\s+Supreme\s+Court\b",
+        r"\bSupreme\s+Court\s+of\s+(?:the\s+)?(?:United\s+States|State\s+of\s+" + STATES + r"|" + STATES + r")",
+        r"\b(?:Superior|Circuit|District|Chancery|Probate|Family)\s+Court\s+of\s+(?:the\s+State\s+of\s+)?"
+        + STATES + r"(?:,?\s+(?:County|Parish)\s+of\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)?",
+        r"\b(?:[A-Z][a-z]+\s+){1,2}County\s+(?:Superior|Circuit|District|Probate|Family)\s+Court\b",
+    ],
+}
+
+STRUCTURED_ENTITY_CATEGORIES = tuple(ENTITY_PATTERNS)
+
+
+def compile_entity_patterns(patterns):
+    """
+    Compiles all category patterns into a single alternation so the text is
+    scanned once. Each alternative is a named group `<CATEGORY>__<n>`.
+    """
+    alternatives = []
+    for category, category_patterns in patterns.items():
+        for position, pattern in enumerate(category_patterns):
+            name = f"{category}__{position}"
+            pattern = pattern.replace("(?P<value>", f"(?P<{name}__value>")
+            alternatives.append(f"(?P<{name}>{pattern})")
+    # Every pattern starts with a digit, a capital letter, "§" or "exhibit", so most
+    # positions are rejected by the lookahead before any alternative is tried
+    return re.compile("(?=[0-9A-Z§eE])(?:" + "|".join(alternatives) + ")")
+
+
+ENTITY_REGEX = compile_entity_patterns(ENTITY_PATTERNS)
+
+
+def extract_structured_entities(text):
+    """
+    Extracts the structured legal entities (case numbers, statutes, exhibits,
+    dates and courts) from the text in a single pass.
+    Returns the categories in the `entities` schema with deduplicated values.
+    """
+    entities = {category: [] for category in STRUCTURED_ENTITY_CATEGORIES}
+    seen = set()
+
+    for match in ENTITY_REGEX.finditer(text):
+        name = match.lastgroup
+        category = name.split("__", 1)[0]
+        value = match.groupdict().get(f"{name}__value") or match.group(name)
+        value = " ".join(value.split()).rstrip(".,-")
+
+        key = (category, normalize_entity(value))
+        if key not in seen:
+            seen.add(key)
+            entities[category].append(value)
+
+    return entities
@@ -0,0 +1,78 @@
+from datetime import datetime, timezone
+import json
+import os
+import threading
+
+PARTIAL_RESULTS_PREFIX = os.environ.get('PARTIAL_RESULTS_PREFIX', 'partial/')
+
+
+def get_partial_results_prefix(file_name):
+    return f"{PARTIAL_RESULTS_PREFIX}{file_name}/"
+
+
+class PartialResultWriter:
+    """
+    Persists each enhanced chunk as soon as it completes, together with a manifest
+    listing the chunks that are ready, so the transcript can be served page by page
+    while the remaining chunks are still being enhanced.
+    """
+
+    def __init__(self, s3, bucket, file_name, chunk_count):
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = get_partial_results_prefix(file_name)
+        self.lock = threading.Lock()
+        self.manifest = {
+            'fileName': file_name,
+            'chunkCount': chunk_count,
+            'chunks': [{'index': index, 'ready': False} for index in range(chunk_count)],
+            'readySegments': 0,
+            'complete': False
+        }
+        self.write_manifest()
+
+    def write_chunk(self, index, enhanced_chunk):
+        """
+        Stores an enhanced chunk and marks it ready in the manifest. Returns the
+        number of chunks now ready and of segments now readable from the start of
+        the transcript, as (ready chunks, ready segments).
+        """
+        key = f"{self.prefix}chunk-{index:05d}.json"
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=json.dumps({'segments': enhanced_chunk['segments']}),
+            ContentType='application/json'
+        )
+
+        with self.lock:
+            self.manifest['chunks'][index] = {
+                'index': index,
+                'ready': True,
+                'key': key,
+                'segmentCount': len(enhanced_chunk['segments'])
+            }
+            self.manifest['readySegments'] = self.count_ready_segments()
+            self.manifest['complete'] = all(chunk['ready'] for chunk in self.manifest['chunks'])
+            self.write_manifest()
+            ready_chunks = sum(chunk['ready'] for chunk in self.manifest['chunks'])
+            return ready_chunks, self.manifest['readySegments']
+
+    def count_ready_segments(self):
+        # Only the contiguous run of ready chunks from the start can be served in order
+        ready_segments = 0
+        for chunk in self.manifest['chunks']:
+            if not chunk['ready']:
+                break
+            ready_segments += chunk['segmentCount']
+        return ready_segments
+
+    def write_manifest(self):
+        self.manifest['updatedAt'] = datetime.now(timezone.utc).isoformat()
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=f"{self.prefix}manifest.json",
+            Body=json.dumps(self.manifest),
+            ContentType='application/json',
+            CacheControl='no-cache'
+        )
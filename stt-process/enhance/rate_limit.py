@@ -0,0 +1,336 @@
+"""
+Rate-limit governor for the OpenAI calls of the enhance Lambda.
+
+Concurrent Step Functions executions each run their own enhance Lambda, and
+together they can exceed the account's requests-per-minute (RPM) and
+tokens-per-minute (TPM) limits. The governor keeps a token bucket for each
+limit in a store shared by every invocation, and a request waits until both
+buckets can pay for it before it is sent. Requests still answered with a 429
+are retried with jittered exponential backoff, never sooner than their
+Retry-After header asks, and hold back every invocation sharing the store for
+as long.
+
+RATE_LIMIT_STORE selects the store: 'memory' (one container), 'file' (the
+processes of one machine, for local runs and the backfill runner) or 's3'
+(every invocation, kept consistent with conditional writes).
+"""
+from botocore.exceptions import ClientError
+from email.utils import parsedate_to_datetime
+from openai import APIConnectionError, InternalServerError, RateLimitError
+from pathlib import Path
+import fcntl
+import json
+import os
+import random
+import threading
+import time
+
+MAX_ACQUIRE_WAIT = 5.0  # Longest sleep before the buckets are checked again
+ACQUIRE_JITTER = 0.25  # Spreads out waiters that would otherwise wake together
+STORE_UPDATE_ATTEMPTS = 8  # Conditional writes of the shared state before giving up
+CONFLICT_ERROR_CODES = ('PreconditionFailed', 'ConditionalRequestConflict', '412', '409')
+CONFLICT_RETRY_WAIT = 0.25  # Wait before acquiring again when every write lost to another invocation
+
+# Returned by update_store when other invocations kept changing the state under every write
+STORE_CONFLICT = object()
+
+
+class StoreConflict(Exception):
+    """
+    Raised by a store whose conditional writes all lost to other invocations.
+    """
+
+
+class RateLimitGovernor:
+    """
+    Paces requests against RPM and TPM limits shared through `store` and
+    retries them on 429s and transient errors. A limit of 0 is not enforced.
+    """
+
+    def __init__(self, store, requests_per_minute=0, tokens_per_minute=0, max_attempts=6,
+                 base_delay=1.0, max_delay=60.0, metrics=None):
+        self.store = store
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.metrics = metrics
+
+    def call(self, send, tokens=0):
+        """
+        Sends a request once the limits allow it and returns the response.
+        `tokens` is the share of the TPM limit to take, topped up to the
+        response's usage when the response reports more.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            self.acquire(tokens)
+            try:
+                response = send()
+            except RateLimitError as e:
+                self.count('RateLimitHits')
+                if attempt == self.max_attempts:
+                    raise
+                delay = self.get_retry_delay(e, attempt)
+                print(f"Warning: OpenAI rate limit hit, retrying in {delay:.1f}s (attempt {attempt}/{self.max_attempts})")
+                self.update_store(lambda state, now: self.block(state, now, delay))
+                self.wait(delay)
+                continue
+            except (APIConnectionError, InternalServerError) as e:
+                if attempt == self.max_attempts:
+                    raise
+                delay = self.get_backoff(attempt)
+                print(f"Warning: OpenAI request failed ({e}), retrying in {delay:.1f}s")
+                self.count('LlmRequestRetries')
+                time.sleep(delay)
+                continue
+
+            usage = getattr(response, 'usage', None)
+            if usage:
+                self.settle(tokens, usage.total_tokens)
+            return response
+
+    def acquire(self, tokens=0):
+        """
+        Waits until both buckets can pay for a request of `tokens` and takes its
+        share. Returns the seconds waited.
+        """
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)  # A larger request could never fit
+        waited = 0.0
+        while True:
+            wait = self.update_store(lambda state, now: self.take(state, now, tokens))
+            if wait is STORE_CONFLICT:
+                # The buckets are busy, not unreachable: wait and try again rather than send unpaced
+                self.count('RateLimitStoreConflicts')
+                wait = CONFLICT_RETRY_WAIT
+            if not wait or wait <= 0:
+                return waited
+            wait = min(wait, MAX_ACQUIRE_WAIT) + random.uniform(0, ACQUIRE_JITTER)
+            self.wait(wait)
+            waited += wait
+
+    def settle(self, reserved, used):
+        """
+        Takes the tokens a request used beyond those reserved for it. Unused
+        tokens are not returned, as OpenAI counts the reservation itself.
+        """
+        if self.tokens_per_minute and used is not None and used > reserved:
+            self.update_store(lambda state, now: self.adjust_tokens(state, now, reserved - used))
+
+    def take(self, state, now, tokens):
+        """
+        Takes one request and `tokens` from the refilled buckets. Returns
+        (new state, 0), or (None, seconds until they could pay for it).
+        """
+        state = self.refill(state, now)
+        if state['blockedUntil'] > now:
+            return None, state['blockedUntil'] - now
+        if not (self.requests_per_minute or self.tokens_per_minute):
+            return None, 0  # Without limits only the shared 429 pause applies
+
+        waits = []
+        if self.requests_per_minute and state['requests'] < 1:
+            waits.append((1 - state['requests']) * 60 / self.requests_per_minute)
+        if self.tokens_per_minute and state['tokens'] < tokens:
+            waits.append((tokens - state['tokens']) * 60 / self.tokens_per_minute)
+        if waits:
+            return None, max(waits)
+
+        state['requests'] -= 1
+        state['tokens'] -= tokens
+        return state, 0
+
+    def block(self, state, now, delay):
+        state = self.refill(state, now)
+        if state['blockedUntil'] >= now + delay:
+            return None, None
+        state['blockedUntil'] = now + delay
+        return state, None
+
+    def adjust_tokens(self, state, now, tokens):
+        state = self.refill(state, now)
+        state['tokens'] = max(-self.tokens_per_minute, state['tokens'] + tokens)
+        return state, None
+
+    def refill(self, state, now):
+        """
+        Returns the state with both buckets refilled for the time since its last
+        update. A missing state starts with full buckets.
+        """
+        if not state:
+            return {
+                'requests': float(self.requests_per_minute),
+                'tokens': float(self.tokens_per_minute),
+                'updatedAt': now,
+                'blockedUntil': 0.0
+            }
+        elapsed = max(0.0, now - state['updatedAt'])
+        return {
+            'requests': min(self.requests_per_minute, state['requests'] + elapsed * self.requests_per_minute / 60),
+            'tokens': min(self.tokens_per_minute, state['tokens'] + elapsed * self.tokens_per_minute / 60),
+            'updatedAt': max(now, state['updatedAt']),
+            'blockedUntil': state['blockedUntil']
+        }
+
+    def update_store(self, update):
+        """
+        Applies `update(state, now)` to the shared state and returns its result, or
+        STORE_CONFLICT when other invocations won every write. A store that cannot be
+        reached lets requests through rather than failing them.
+        """
+        try:
+            return self.store.update(lambda state: update(state, time.time()))
+        except StoreConflict as e:
+            print(f"Rate limit store update conflicted: {e}")
+            return STORE_CONFLICT
+        except Exception as e:
+            print(f"Rate limit store update failed: {e}")
+            return None
+
+    def get_retry_delay(self, error, attempt):
+        """
+        Returns the Retry-After of a 429 plus a little jitter, or the backoff for
+        `attempt` if the response has no usable header.
+        """
+        headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+        retry_after = None
+        try:
+            if headers.get('retry-after-ms'):
+                retry_after = float(headers['retry-after-ms']) / 1000
+            elif headers.get('retry-after'):
+                value = headers['retry-after']
+                try:
+                    retry_after = float(value)
+                except ValueError:
+                    retry_after = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            retry_after = None
+
+        if retry_after is None or retry_after < 0:
+            return self.get_backoff(attempt)
+        return retry_after + random.uniform(0, min(1.0, retry_after * 0.1))
+
+    def get_backoff(self, attempt):
+        """
+        Exponential backoff with half of it jittered, so retries of requests that
+        failed together are spread out.
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def wait(self, seconds):
+        self.count('ThrottleTime', seconds * 1000, 'Milliseconds')
+        time.sleep(seconds)
+
+    def count(self, name, value=1, unit='Count'):
+        if self.metrics:
+            self.metrics.count(name, value, unit)
+
+
+class MemoryStore:
+    """
+    Keeps the state in memory, shared by the threads of one process.
+    """
+
+    def __init__(self):
+        self.state = None
+        self.lock = threading.Lock()
+
+    def update(self, update):
+        with self.lock:
+            new_state, result = update(self.state)
+            if new_state is not None:
+                self.state = new_state
+            return result
+
+
+class FileStore:
+    """
+    Keeps the state in a local JSON file, shared by the processes of one machine
+    through an exclusive lock on the file.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()  # flock does not exclude threads sharing one process
+
+    def update(self, update):
+        with self.lock, open(self.path, 'a+') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                file.seek(0)
+                content = file.read()
+                new_state, result = update(json.loads(content) if content else None)
+                if new_state is not None:
+                    file.seek(0)
+                    file.truncate()
+                    file.write(json.dumps(new_state))
+                    file.flush()
+                return result
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+
+class S3Store:
+    """
+    Keeps the state in one S3 object, written only if no other invocation
+    changed it since it was read.
+    """
+
+    def __init__(self, s3_client, bucket, key='rate-limit/openai.json'):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+
+    def update(self, update):
+        for attempt in range(1, STORE_UPDATE_ATTEMPTS + 1):
+            try:
+                response = self.s3.get_object(Bucket=self.bucket, Key=self.key)
+                state, etag = json.loads(response['Body'].read()), response['ETag']
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') not in ('NoSuchKey', '404'):
+                    raise
+                state, etag = None, None
+
+            new_state, result = update(state)
+            if new_state is None:
+                return result
+
+            condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+            try:
+                self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=json.dumps(new_state),
+                                   ContentType='application/json', **condition)
+                return result
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') not in CONFLICT_ERROR_CODES:
+                    raise
+                if attempt == STORE_UPDATE_ATTEMPTS:
+                    raise StoreConflict(f"s3://{self.bucket}/{self.key} changed under {attempt} writes") from e
+                time.sleep(random.uniform(0, 0.02 * 2 ** attempt))
+
+
+def create_rate_limit_governor(s3_client=None, metrics=None):
+    """
+    Creates the governor configured by the OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT and
+    RATE_LIMIT_* environment variables.
+    """
+    store_name = os.environ.get('RATE_LIMIT_STORE', 'memory').lower()
+    if store_name == 'file':
+        store = FileStore(os.environ.get('RATE_LIMIT_FILE', '/tmp/openai-rate-limit.json'))
+    elif store_name == 's3':
+        store = S3Store(s3_client, os.environ['RATE_LIMIT_BUCKET'],
+                        os.environ.get('RATE_LIMIT_KEY', 'rate-limit/openai.json'))
+    else:
+        store = MemoryStore()
+
+    return RateLimitGovernor(
+        store,
+        requests_per_minute=int(os.environ.get('OPENAI_RPM_LIMIT', '0')),
+        tokens_per_minute=int(os.environ.get('OPENAI_TPM_LIMIT', '0')),
+        max_attempts=int(os.environ.get('RATE_LIMIT_MAX_ATTEMPTS', '6')),
+        base_delay=float(os.environ.get('RATE_LIMIT_BASE_DELAY', '1')),
+        max_delay=float(os.environ.get('RATE_LIMIT_MAX_DELAY', '60')),
+        metrics=metrics
+    )
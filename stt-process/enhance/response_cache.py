@@ -0,0 +1,186 @@
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def make_cache_key(model, prompt_version, payload):
+    """
+    Builds a content-addressed cache key from the model, the prompt template
+    version and the request payload.
+    """
+    material = json.dumps({
+        'model': model,
+        'promptVersion': prompt_version,
+        'payload': payload
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    Caches parsed OpenAI responses in a pluggable backend and counts hits and misses.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        try:
+            data = self.backend.get(key) if self.backend else None
+        except Exception as e:
+            print(f"Response cache read failed: {e}")
+            data = None
+
+        with self.lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return json.loads(data) if data is not None else None
+
+    def put(self, key, value):
+        if not self.backend:
+            return
+        try:
+            self.backend.put(key, json.dumps(value).encode('utf-8'))
+        except Exception as e:
+            print(f"Response cache write failed: {e}")
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class MemoryBackend:
+    """
+    In-memory LRU backend bounded by entry count and TTL.
+    """
+
+    def __init__(self, max_entries=1024, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            stored_at, data = entry
+            if self.ttl and time.time() - stored_at > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        with self.lock:
+            self.entries[key] = (time.time(), data)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class DirectoryBackend:
+    """
+    Local directory backend, one file per key, evicting the least recently
+    used files once `max_entries` is exceeded.
+    """
+
+    def __init__(self, path, max_entries=10000, ttl=None):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+    def get(self, key):
+        entry_path = self.path / f"{key}.json"
+        try:
+            modified = entry_path.stat().st_mtime
+            if self.ttl and time.time() - modified > self.ttl:
+                entry_path.unlink()
+                return None
+            data = entry_path.read_bytes()
+            os.utime(entry_path)
+            return data
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, data):
+        entry_path = self.path / f"{key}.json"
+        temporary_path = self.path / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        temporary_path.write_bytes(data)
+        os.replace(temporary_path, entry_path)
+        self.evict()
+
+    def evict(self):
+        entries = list(self.path.glob('*.json'))
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry_path: entry_path.stat().st_mtime)
+        for entry_path in entries[:len(entries) - self.max_entries]:
+            entry_path.unlink(missing_ok=True)
+
+
+class S3Backend:
+    """
+    S3 prefix backend. Objects older than `ttl` are treated as misses; size is
+    bounded by the bucket lifecycle rule on the prefix.
+    """
+
+    def __init__(self, s3_client, bucket, prefix='cache/openai/', ttl=None):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get(self, key):
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=f"{self.prefix}{key}.json")
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        if self.ttl and time.time() - response['LastModified'].timestamp() > self.ttl:
+            return None
+        return response['Body'].read()
+
+    def put(self, key, data):
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=f"{self.prefix}{key}.json",
+            Body=data,
+            ContentType='application/json'
+        )
+
+
+def create_response_cache(s3_client=None):
+    """
+    Creates the response cache configured by the RESPONSE_CACHE_* environment variables.
+    RESPONSE_CACHE selects the backend: 'memory', 'directory', 's3' or 'none'.
+    """
+    backend_name = os.environ.get('RESPONSE_CACHE', 'none').lower()
+    ttl = float(os.environ['RESPONSE_CACHE_TTL']) if os.environ.get('RESPONSE_CACHE_TTL') else None
+    max_entries = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '1024'))
+
+    if backend_name == 'memory':
+        backend = MemoryBackend(max_entries, ttl)
+    elif backend_name == 'directory':
+        backend = DirectoryBackend(os.environ.get('RESPONSE_CACHE_DIR', '/tmp/openai-cache'), max_entries, ttl)
+    elif backend_name == 's3':
+        backend = S3Backend(
+            s3_client,
+            os.environ['RESPONSE_CACHE_BUCKET'],
+            os.environ.get('RESPONSE_CACHE_PREFIX', 'cache/openai/'),
+            ttl
+        )
+    else:
+        backend = None
+
+    return ResponseCache(backend)
@@ -0,0 +1,118 @@
+"""
+Incremental parser for streamed enhancement responses.
+
+The model answers with a JSON object whose `segments` array holds one object
+per speaker segment. The parser is fed the completion text as it arrives and
+returns every segment as soon as its closing brace is seen, so segments are
+available before the response finishes and survive a response that is cut
+off. Anything before the first `{`, such as a ```json fence, is skipped.
+"""
+import json
+import re
+
+# Characters that change the parser's state outside and inside strings
+STRUCTURE_PATTERN = re.compile(r'["{}\[\]:,]')
+STRING_PATTERN = re.compile(r'["\\]')
+
+
+class SegmentStreamParser:
+    def __init__(self, array_key='segments'):
+        self.array_key = array_key
+        self.buffer = ''
+        self.position = 0  # Everything before this offset has been scanned
+        self.start = None  # Offset of the top-level object
+        self.end = None  # Offset just past the top-level object once it closed
+        self.depth = 0
+        self.in_string = False
+        self.string_start = None
+        self.last_string = None  # (start, end) of the last string closed at the top level
+        self.key = None  # Key of the top-level value being read
+        self.array_depth = None  # Depth of the segments array while inside it
+        self.element_start = None
+        self.segments = []
+
+    @property
+    def complete(self):
+        return self.end is not None
+
+    def feed(self, text):
+        """
+        Adds the next piece of the response and returns the segments it completed.
+        """
+        self.buffer += text
+        buffer = self.buffer
+        length = len(buffer)
+        position = self.position
+        completed = []
+
+        if self.start is None:
+            position = buffer.find('{', position)
+            if position < 0:
+                self.position = length
+                return completed
+            self.start = position
+
+        while position < length and self.end is None:
+            if self.in_string:
+                match = STRING_PATTERN.search(buffer, position)
+                if not match:
+                    position = length
+                    break
+                index = match.start()
+                if buffer[index] == '\\':
+                    if index + 1 >= length:
+                        position = index  # Wait for the escaped character
+                        break
+                    position = index + 2
+                    continue
+                self.in_string = False
+                if self.depth == 1:
+                    self.last_string = (self.string_start, index + 1)
+                position = index + 1
+                continue
+
+            match = STRUCTURE_PATTERN.search(buffer, position)
+            if not match:
+                position = length
+                break
+            index = match.start()
+            char = buffer[index]
+
+            if char == '"':
+                self.in_string = True
+                self.string_start = index
+            elif char == ':':
+                if self.depth == 1 and self.last_string:
+                    self.key = json.loads(buffer[self.last_string[0]:self.last_string[1]])
+            elif char == ',':
+                if self.depth == 1:
+                    self.key = None
+                    self.last_string = None
+            elif char in '{[':
+                self.depth += 1
+                if char == '[' and self.depth == 2 and self.key == self.array_key:
+                    self.array_depth = self.depth
+                elif char == '{' and self.array_depth is not None and self.depth == self.array_depth + 1:
+                    self.element_start = index
+            else:
+                if char == '}' and self.element_start is not None and self.depth == self.array_depth + 1:
+                    completed.append(json.loads(buffer[self.element_start:index + 1]))
+                    self.element_start = None
+                elif char == ']' and self.depth == self.array_depth:
+                    self.array_depth = None
+                self.depth -= 1
+                if self.depth == 0:
+                    self.end = index + 1
+            position = index + 1
+
+        self.position = position
+        self.segments.extend(completed)
+        return completed
+
+    def get_result(self):
+        """
+        Returns the whole response object once it is complete.
+        """
+        if not self.complete:
+            raise ValueError('The response is incomplete')
+        return json.loads(self.buffer[self.start:self.end])
@@ -0,0 +1,162 @@
+from functools import lru_cache
+from transcript_index import get_item_range
+import json
+import math
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a conservative character estimate
+    tiktoken = None
+
+ENCODING_NAME = 'o200k_base'  # Tokenizer used by the gpt-4o family
+
+OUTPUT_SAFETY_MARGIN = 0.9  # Fraction of the output limit a chunk may be planned to use
+RESPONSE_OVERHEAD_TOKENS = 32  # JSON wrapper and code fence around the response
+SPEAKER_NAME_TOKENS = 8  # Room for a resolved speaker name replacing the label
+SEGMENT_OVERHEAD_TOKENS = 32  # JSON framing of a single segment
+DELTA_INDEX_TOKENS = 8  # Segment index added to every entry of a delta prompt
+DELTA_CORRECTION_OVERHEAD_TOKENS = 16  # JSON framing of a single correction
+DELTA_SPEAKER_MAP_TOKENS = 200  # Speaker names of a delta response
+DELTA_CORRECTED_SHARE = 0.1  # Expected share of the text a delta response rewrites
+SENTENCE_ENDINGS = ('.', '?', '!')
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """
+    Returns the tokenizer, or None to count with the character estimate. The
+    encoding file is bundled in the layer (TIKTOKEN_CACHE_DIR); when it is
+    missing tiktoken downloads it, and a failed load must not fail enhancement.
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(ENCODING_NAME)
+    except Exception as e:
+        print(f"Warning: could not load the {ENCODING_NAME} tokenizer, estimating tokens from characters: {e}")
+        return None
+
+
+@lru_cache(maxsize=65536)
+def count_tokens(text):
+    """
+    Counts the model tokens in a piece of text.
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // 3 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+@lru_cache(maxsize=65536)
+def count_segment_tokens(timestamp, speaker, text, delta_output=False):
+    """
+    Returns the (input, output) tokens a segment costs in an enhancement request.
+    A full response repeats the text twice: once in the transcript and once in the
+    segment. A delta response only holds corrections, expected for a share of the text.
+    """
+    text_tokens = count_tokens(text)
+    framing_tokens = count_tokens(json.dumps({'timestamp': timestamp, 'speaker': speaker, 'text': ''}))
+    if delta_output:
+        correction_tokens = DELTA_CORRECTED_SHARE * (text_tokens + DELTA_CORRECTION_OVERHEAD_TOKENS)
+        return text_tokens + framing_tokens + DELTA_INDEX_TOKENS, math.ceil(correction_tokens)
+    return text_tokens + framing_tokens, 2 * text_tokens + framing_tokens + SPEAKER_NAME_TOKENS
+
+
+def pack_segments(segments, transcript_index, max_input_tokens, max_output_tokens, delta_output=False):
+    """
+    Packs whole speaker segments, in order, into as few chunks as the token budgets allow.
+    A segment too large for a chunk of its own is split on sentence boundaries.
+    `delta_output` budgets the output of delta responses instead of full ones.
+    """
+    output_budget = int(max_output_tokens * OUTPUT_SAFETY_MARGIN) - RESPONSE_OVERHEAD_TOKENS
+    if delta_output:
+        output_budget -= DELTA_SPEAKER_MAP_TOKENS
+    chunks = []
+    current_chunk = []
+    input_total = 0
+    output_total = 0
+
+    for segment in segments:
+        for entry in split_segment(segment, transcript_index, max_input_tokens, output_budget, delta_output):
+            input_tokens, output_tokens = count_segment_tokens(
+                entry['timestamp'], entry['speaker'], entry['text'], delta_output
+            )
+
+            if current_chunk and (input_total + input_tokens > max_input_tokens
+                                  or output_total + output_tokens > output_budget):
+                chunks.append(current_chunk)
+                current_chunk = []
+                input_total = 0
+                output_total = 0
+
+            current_chunk.append(entry)
+            input_total += input_tokens
+            output_total += output_tokens
+
+    if current_chunk:
+        chunks.append(current_chunk)
+
+    return chunks
+
+
+def split_segment(segment, transcript_index, max_input_tokens, output_budget, delta_output=False):
+    """
+    Returns the chunk entries for a speaker segment: the whole segment when it fits
+    the budgets, otherwise consecutive sentence groups that each do.
+    """
+    low, high = get_item_range(transcript_index, float(segment['start_time']), float(segment['end_time']))
+    contents = transcript_index['contents']
+    entry = {
+        'timestamp': segment['start_time'],
+        'speaker': segment['speaker_label'],
+        'text': " ".join(contents[low:high])
+    }
+
+    input_tokens, output_tokens = count_segment_tokens(
+        entry['timestamp'], entry['speaker'], entry['text'], delta_output
+    )
+    if input_tokens <= max_input_tokens and output_tokens <= output_budget:
+        return [entry]
+
+    start_times = transcript_index['start_times']
+    output_piece_limit = int(output_budget / DELTA_CORRECTED_SHARE) if delta_output else output_budget // 2
+    piece_limit = min(max_input_tokens, output_piece_limit) - SEGMENT_OVERHEAD_TOKENS
+    pieces = []
+    piece_start = low
+    piece_tokens = 0
+
+    for unit_start, unit_end, unit_tokens in iter_split_units(contents, low, high, piece_limit):
+        if piece_tokens and piece_tokens + unit_tokens > piece_limit:
+            pieces.append((piece_start, unit_start))
+            piece_start = unit_start
+            piece_tokens = 0
+        piece_tokens += unit_tokens
+
+    pieces.append((piece_start, high))
+
+    return [
+        {
+            'timestamp': segment['start_time'] if start == low else f"{start_times[start]:.3f}",
+            'speaker': segment['speaker_label'],
+            'text': " ".join(contents[start:end])
+        }
+        for start, end in pieces
+    ]
+
+
+def iter_split_units(contents, low, high, piece_limit):
+    """
+    Yields (start, end, tokens) for each sentence in contents[low:high].
+    A sentence that exceeds the piece limit on its own is yielded word by word.
+    """
+    sentence_start = low
+    for position in range(low, high):
+        if position == high - 1 or contents[position].endswith(SENTENCE_ENDINGS):
+            sentence_tokens = count_tokens(" ".join(contents[sentence_start:position + 1]))
+            if sentence_tokens <= piece_limit:
+                yield sentence_start, position + 1, sentence_tokens
+            else:
+                for word_position in range(sentence_start, position + 1):
+                    yield word_position, word_position + 1, count_tokens(contents[word_position]) + 1
+            sentence_start = position + 1
@@ -0,0 +1,64 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+INDEXED_ITEM_TYPES = ('pronunciation', 'punctuation')
+
+
+def build_transcript_index(transcript_items):
+    """
+    Builds a sorted time index over the transcript items.
+
+    Only timed 'pronunciation' and 'punctuation' items are indexed, matching the
+    items a segment lookup can return. The sort is stable, so items sharing a
+    start time keep their original order.
+    """
+    entries = sorted(
+        (
+            (float(item['start_time']), item['alternatives'][0]['content'])
+            for item in transcript_items
+            if 'start_time' in item and item['type'] in INDEXED_ITEM_TYPES
+        ),
+        key=lambda entry: entry[0]
+    )
+
+    return {
+        'start_times': array('d', (start_time for start_time, _ in entries)),
+        'contents': [content for _, content in entries]
+    }
+
+
+def build_sorted_index(start_times, contents):
+    """
+    Builds the same index from parallel arrays of item start times and contents,
+    in transcript order. Transcribe writes items in time order, so the arrays are
+    only copied when they need sorting.
+    """
+    if all(start_times[position] <= start_times[position + 1] for position in range(len(start_times) - 1)):
+        return {'start_times': start_times, 'contents': contents}
+
+    order = sorted(range(len(start_times)), key=start_times.__getitem__)
+    return {
+        'start_times': array('d', (start_times[position] for position in order)),
+        'contents': [contents[position] for position in order]
+    }
+
+
+def get_item_range(transcript_index, start_time, end_time):
+    """
+    Returns the [low, high) positions of the indexed items whose start time falls
+    within [start_time, end_time].
+    """
+    start_times = transcript_index['start_times']
+    low = bisect_left(start_times, start_time)
+    high = bisect_right(start_times, end_time, low)
+    return low, high
+
+
+def get_words_in_range(transcript_index, start_time, end_time):
+    """
+    Returns the indexed words whose start time falls within [start_time, end_time].
+    Runs in O(log n + k) for k matching words.
+    """
+    low, high = get_item_range(transcript_index, start_time, end_time)
+    return transcript_index['contents'][low:high]
@@ -0,0 +1,217 @@
+"""
+Streaming parse of AWS Transcribe output for the enhance Lambda.
+
+`json.loads` on a multi-hour transcript holds the raw bytes, the decoded text
+and a dict for every word item at the same time. This module reads the S3 body
+in pieces instead and keeps only what chunking needs: the start time and content
+of every timed item, as a float array and interned strings, and the start, end
+and speaker of every speaker segment. The per-word items of the segments and the
+full transcript text are skipped without being decoded, so memory grows with
+the compact arrays and one read buffer rather than with the JSON text.
+"""
+from array import array
+from transcript_index import INDEXED_ITEM_TYPES, build_sorted_index
+import codecs
+import json
+import re
+import sys
+
+READ_SIZE = 256 * 1024  # Bytes read from the body at a time
+SEGMENT_FIELDS = ('start_time', 'end_time', 'speaker_label')
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+STRING_SPECIAL = re.compile(r'["\\]')
+STRUCTURE = re.compile(r'["\[\]{}]')
+
+
+class JsonStreamReader:
+    """
+    Pull parser over a file-like body of JSON. Objects and arrays are walked
+    with iter_object and iter_array, and each value is either decoded with
+    read_value or passed over with skip_value, so only decoded values use memory.
+    """
+
+    def __init__(self, body, read_size=READ_SIZE):
+        self.body = body
+        self.read_size = read_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """
+        Appends the next piece of the body to the buffer, dropping what was
+        consumed. Returns False at the end of the body.
+        """
+        if self.eof:
+            return False
+        data = self.body.read(self.read_size)
+        text = self.decoder.decode(data or b'', final=not data)
+        self.eof = not data
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return bool(text) or not self.eof
+
+    def fill_or_fail(self):
+        if not self.fill():
+            raise ValueError(f"Unexpected end of JSON at {self.pos}")
+
+    def peek(self):
+        """
+        Returns the next non-whitespace character without consuming it.
+        """
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            self.fill_or_fail()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at {self.pos}, found {self.buffer[self.pos]!r}")
+        self.pos += 1
+
+    def read_value(self):
+        """
+        Decodes the next value. Meant for small values: one that spans more than
+        the buffer is retried as more of the body arrives.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                self.fill_or_fail()
+                continue
+            # A number ending the buffer may continue in the next piece
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def skip_value(self):
+        """
+        Passes over the next value without decoding it.
+        """
+        char = self.peek()
+        if char == '"':
+            self.skip_string()
+            return
+        if char not in '[{':
+            self.read_value()
+            return
+
+        depth = 0
+        while True:
+            match = STRUCTURE.search(self.buffer, self.pos)
+            if match is None:
+                self.pos = len(self.buffer)
+                self.fill_or_fail()
+                continue
+            self.pos = match.start()
+            if match.group() == '"':
+                self.skip_string()
+                continue
+            self.pos += 1
+            depth += 1 if match.group() in '[{' else -1
+            if depth == 0:
+                return
+
+    def skip_string(self):
+        self.pos += 1  # Opening quote
+        while True:
+            match = STRING_SPECIAL.search(self.buffer, self.pos)
+            if match is None:
+                self.pos = len(self.buffer)
+                self.fill_or_fail()
+            elif match.group() == '"':
+                self.pos = match.end()
+                return
+            elif match.end() == len(self.buffer):
+                # The escaped character is still to come
+                self.pos = match.start()
+                self.fill_or_fail()
+            else:
+                self.pos = match.end() + 1
+
+    def iter_object(self):
+        """
+        Yields the keys of the next object. The caller consumes each key's value
+        before asking for the next key.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self.expect(':')
+            yield key
+            if self.peek() == '}':
+                self.pos += 1
+                return
+            self.expect(',')
+
+    def iter_array(self):
+        """
+        Yields once per element of the next array; the caller consumes each element.
+        """
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.peek() == ']':
+                self.pos += 1
+                return
+            self.expect(',')
+
+
+def parse_transcript_stream(body, read_size=READ_SIZE):
+    """
+    Parses a Transcribe JSON body into (segments, transcript index) without
+    loading it whole. Segments carry only start_time, end_time and
+    speaker_label; the index is the one build_transcript_index returns.
+    """
+    reader = JsonStreamReader(body, read_size)
+    start_times = array('d')
+    contents = []
+    segments = None
+
+    for key in reader.iter_object():
+        if key != 'results':
+            reader.skip_value()
+            continue
+        for results_key in reader.iter_object():
+            if results_key == 'items':
+                for _ in reader.iter_array():
+                    item = reader.read_value()
+                    if 'start_time' in item and item['type'] in INDEXED_ITEM_TYPES:
+                        start_times.append(float(item['start_time']))
+                        contents.append(sys.intern(item['alternatives'][0]['content']))
+            elif results_key == 'speaker_labels':
+                for labels_key in reader.iter_object():
+                    if labels_key == 'segments':
+                        segments = [read_segment(reader) for _ in reader.iter_array()]
+                    else:
+                        reader.skip_value()
+            else:
+                reader.skip_value()
+
+    if segments is None:
+        raise ValueError("Transcript has no speaker_labels segments")
+    return segments, build_sorted_index(start_times, contents)
+
+
+def read_segment(reader):
+    segment = {}
+    for key in reader.iter_object():
+        if key in SEGMENT_FIELDS:
+            value = reader.read_value()
+            segment[key] = sys.intern(value) if key == 'speaker_label' else value
+        else:
+            reader.skip_value()
+    return segment
@@ -11,6 +11,14 @@ mkdir -p "$LAYER_DIR"
 # Install packages into the layer directory
 pip install -r requirements.txt -t "$LAYER_DIR"
 
+# Add the modules shared by the Lambdas
+cp ./*.py "$LAYER_DIR"/
+
+# Bundle the tokenizer file, so no Lambda downloads it on a cold start
+mkdir -p "$LAYER_DIR/tiktoken_cache"
+PYTHONPATH="$LAYER_DIR" TIKTOKEN_CACHE_DIR="$LAYER_DIR/tiktoken_cache" \
+    python3 -c "import tiktoken; tiktoken.get_encoding('o200k_base')"
+
 # Remove unnecessary files to reduce layer size
 find "$LAYER_DIR" -type d -name "tests" -exec rm -rf {} +
 find "$LAYER_DIR" -type d -name "*.dist-info" -exec rm -rf {} +
@@ -0,0 +1,113 @@
+"""
+Stored enhanced results, shared by the enhance and store Lambdas.
+
+The enhance Lambda writes its result once, to s3://<bucket>/<job>_enhanced.json
+next to a sidecar index of segment byte ranges, and hands the store step a
+claim check ({'bucket', 'key', 'indexKey', 'size', 'sha256'}) rather than the
+result itself, which keeps long transcripts under the 256 KB Step Functions
+payload limit.
+"""
+import hashlib
+import json
+
+SEGMENT_INDEX_WINDOW_SECONDS = 60  # Width of the time windows in the segment index
+
+
+def write_enhanced_result(s3, bucket, transcript_key, result):
+    """
+    Writes the enhanced result and its segment index, and returns the claim check.
+    """
+    result_bytes, offsets, lengths = serialize_enhanced_result(result)
+    key = transcript_key.replace('.json', '_enhanced.json')
+    index_key = transcript_key.replace('.json', '_enhanced.index.json')
+
+    s3.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=result_bytes,
+        ContentType='application/json'
+    )
+
+    # Sidecar index so segment and time ranges can be served with S3 Range reads
+    s3.put_object(
+        Bucket=bucket,
+        Key=index_key,
+        Body=json.dumps(build_segment_index(result.get('segments') or [], offsets, lengths, len(result_bytes))),
+        ContentType='application/json'
+    )
+
+    return {
+        'bucket': bucket,
+        'key': key,
+        'indexKey': index_key,
+        'size': len(result_bytes),
+        'sha256': hashlib.sha256(result_bytes).hexdigest()
+    }
+
+
+def read_enhanced_result(s3, claim):
+    """
+    Returns the bytes a claim check refers to, raising ValueError if they are not
+    the bytes that were written.
+    """
+    content = s3.get_object(Bucket=claim['bucket'], Key=claim['key'])['Body'].read()
+    if len(content) != claim['size'] or hashlib.sha256(content).hexdigest() != claim['sha256']:
+        raise ValueError(f"s3://{claim['bucket']}/{claim['key']} does not match its claim check")
+    return content
+
+
+def serialize_enhanced_result(body):
+    """
+    Serializes the enhanced result to JSON bytes with the segments last, and returns
+    the byte offset and length of every segment within them.
+    """
+    head = {key: value for key, value in body.items() if key != 'segments'}
+    prefix = json.dumps(head)[:-1] + ', "segments": [' if head else '{"segments": ['
+    parts = [prefix.encode('utf-8')]
+    position = len(parts[0])
+    offsets = []
+    lengths = []
+
+    for index, segment in enumerate(body.get('segments') or []):
+        if index:
+            parts.append(b', ')
+            position += 2
+        segment_bytes = json.dumps(segment).encode('utf-8')
+        parts.append(segment_bytes)
+        offsets.append(position)
+        lengths.append(len(segment_bytes))
+        position += len(segment_bytes)
+
+    parts.append(b']}')
+    return b''.join(parts), offsets, lengths
+
+
+def build_segment_index(segments, offsets, lengths, total_size, window_seconds=SEGMENT_INDEX_WINDOW_SECONDS):
+    """
+    Builds the sidecar index of an enhanced result: the byte range and start time of
+    every segment, and the first segment of every `window_seconds` time window.
+    """
+    timestamps = []
+    timestamp = 0.0
+    for segment in segments:
+        try:
+            timestamp = max(timestamp, float(segment.get('timestamp')))
+        except (TypeError, ValueError):
+            pass  # Keep the previous start time for segments without a usable timestamp
+        timestamps.append(timestamp)
+
+    windows = []
+    for index, timestamp in enumerate(timestamps):
+        while len(windows) * window_seconds <= timestamp:
+            windows.append(index)
+
+    return {
+        'version': 1,
+        'size': total_size,
+        'segmentCount': len(segments),
+        'offsets': offsets,
+        'lengths': lengths,
+        'timestamps': timestamps,
+        'windowSeconds': window_seconds,
+        'windows': windows
+    }
@@ -0,0 +1,102 @@
+"""
+Job-state records shared by the stt-process Lambdas.
+
+Each pipeline stage writes a small JSON record to
+s3://<JOB_STATE_BUCKET>/<JOB_STATE_PREFIX><fileName>.json so that the
+stt-handler status endpoint can answer from it without polling Transcribe.
+"""
+from datetime import datetime, timezone
+import json
+import os
+
+JOB_STATE_PREFIX = os.environ.get('JOB_STATE_PREFIX', 'jobs/')
+
+# Progress reported for each stage of the workflow
+STAGE_PERCENT = {
+    'QUEUED': 0,
+    'TRANSCRIBING': 10,
+    'TRANSCRIBED': 40,
+    'ENHANCING': 50,
+    'STORING': 90,
+    'COMPLETED': 100,
+    'FAILED': 100
+}
+
+
+def get_file_name(key):
+    """
+    Returns the file name a job is tracked under: the audio key without its extension.
+    """
+    return key.rsplit('.', 1)[0]
+
+
+def get_file_name_from_job(job_name):
+    """
+    Returns the file name for a Transcribe job named `stt-<fileName>`.
+    """
+    return job_name[len('stt-'):] if job_name.startswith('stt-') else job_name
+
+
+def get_job_state_key(file_name):
+    return f"{JOB_STATE_PREFIX}{file_name}.json"
+
+
+def read_job_state(s3, bucket, file_name):
+    """
+    Returns the job-state record, or None when the job has no record yet.
+    """
+    try:
+        response = s3.get_object(Bucket=bucket, Key=get_job_state_key(file_name))
+    except s3.exceptions.NoSuchKey:
+        return None
+    return json.loads(response['Body'].read())
+
+
+def update_job_state(s3, file_name, stage, bucket=None, **fields):
+    """
+    Records that a job reached `stage`, keeping the timestamps of earlier stages.
+    A new run of the file (QUEUED under another execution) starts a new record, so
+    the error, result and stages of the previous run are not reported for it.
+    Failures are logged and swallowed so job tracking never fails the pipeline.
+    """
+    bucket = bucket or os.environ.get('JOB_STATE_BUCKET')
+    if not bucket or not file_name:
+        return None
+
+    try:
+        now = datetime.now(timezone.utc).isoformat()
+        record = read_job_state(s3, bucket, file_name)
+        if record and stage == 'QUEUED' and is_new_run(record, fields):
+            record = None
+        record = record or {
+            'fileName': file_name,
+            'createdAt': now,
+            'stages': {}
+        }
+
+        record.update(fields)
+        record['stage'] = stage
+        record['status'] = stage if stage in ('COMPLETED', 'FAILED') else 'IN_PROGRESS'
+        record['percent'] = fields.get('percent', STAGE_PERCENT.get(stage, record.get('percent', 0)))
+        record['updatedAt'] = now
+        record['stages'][stage] = now
+
+        s3.put_object(
+            Bucket=bucket,
+            Key=get_job_state_key(file_name),
+            Body=json.dumps(record),
+            ContentType='application/json',
+            CacheControl='no-cache'
+        )
+        return record
+
+    except Exception as e:
+        print(f"Failed to update job state for {file_name}: {e}")
+        return None
+
+
+def is_new_run(record, fields):
+    """
+    Returns whether `fields` queue another run than the one the record tracks.
+    """
+    return any(field in fields and fields[field] != record.get(field) for field in ('audioEtag', 'executionName'))
@@ -0,0 +1,44 @@
+"""
+Step Functions task tokens registered against Transcribe job names.
+
+The transcribe Lambda stores the token of a waiting execution under
+s3://<TASK_TOKEN_BUCKET>/<TASK_TOKEN_PREFIX><jobName>.json and the completion
+handler takes it back when the job finishes.
+"""
+import json
+import os
+
+TASK_TOKEN_PREFIX = os.environ.get('TASK_TOKEN_PREFIX', 'task-tokens/')
+
+
+def get_task_token_key(job_name):
+    return f"{TASK_TOKEN_PREFIX}{job_name}.json"
+
+
+def register_task_token(s3, job_name, task_token, bucket=None, **fields):
+    """
+    Registers the task token of the execution waiting for `job_name`.
+    """
+    bucket = bucket or os.environ['TASK_TOKEN_BUCKET']
+    s3.put_object(
+        Bucket=bucket,
+        Key=get_task_token_key(job_name),
+        Body=json.dumps(dict(fields, jobName=job_name, taskToken=task_token)),
+        ContentType='application/json'
+    )
+
+
+def pop_task_token(s3, job_name, bucket=None):
+    """
+    Returns and removes the token record registered for `job_name`, or None if
+    no execution is waiting for it.
+    """
+    bucket = bucket or os.environ['TASK_TOKEN_BUCKET']
+    key = get_task_token_key(job_name)
+    try:
+        response = s3.get_object(Bucket=bucket, Key=key)
+    except s3.exceptions.NoSuchKey:
+        return None
+
+    s3.delete_object(Bucket=bucket, Key=key)
+    return json.loads(response['Body'].read())
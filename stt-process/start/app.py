@@ -1,31 +1,289 @@
+from job_state import get_file_name, read_job_state, update_job_state
+from metrics import Metrics
+from datetime import datetime, timezone
+from urllib.parse import unquote_plus
+import hashlib
 import boto3
+import csv
+import io
 import json
 import os
+import re
 
+metrics = Metrics('start')
 sfn_client = boto3.client('stepfunctions')
+s3 = metrics.instrument_s3(boto3.client('s3'))
 
+MANIFEST_PREFIX = os.environ.get('MANIFEST_PREFIX', 'manifests/')
+# Batches with more new files than this go through the bulk ingestion workflow,
+# whose Distributed Map bounds how many pipelines run at once
+BULK_EXECUTION_THRESHOLD = int(os.environ.get('BULK_EXECUTION_THRESHOLD', '25'))
+MAX_EXECUTION_NAME_LENGTH = 80
+# A job not updated for this long is retried when its execution cannot be described
+STALE_EXECUTION_SECONDS = int(os.environ.get('STALE_EXECUTION_SECONDS', '21600'))
+LIVE_EXECUTION_STATUSES = ('RUNNING', 'SUCCEEDED')
+
+
+@metrics.instrument_handler
 def lambda_handler(event, context):
-    # Log the received event
-    print(json.dumps(event))
+    # Log the received event when debugging
+    metrics.debug("Received event", event)
 
-    # Extract bucket name and object key from the S3 event
     try:
-        for record in event['Records']:
-            bucket = record['s3']['bucket']['name']
-            key = record['s3']['object']['key']
-            
-            # Start the Step Functions state machine execution
-            response = sfn_client.start_execution(
-                stateMachineArn=os.environ['STT_WORKFLOW_ARN'],
-                input=json.dumps({
-                    'bucket': bucket,
-                    'key': key
-                })
-            )
-            print(f"Started execution: {response['executionArn']}")
+        if 'prepare' in event:
+            # A single item of the bulk ingestion workflow's Distributed Map
+            return prepare_execution(event['prepare'], record_queued=True)
+
+        if 'manifest' in event:
+            return start_backfill(read_manifest(event['manifest']))
+
+        if event.get('Records') and event['Records'][0].get('eventSource') == 'aws:sqs':
+            return handle_sqs_batch(event['Records'])
+
+        return start_ingestion(get_s3_event_objects(event))
     except KeyError as e:
         print(f"KeyError: {e}")
         raise e
     except Exception as e:
         print(f"Exception: {e}")
-        raise e
\ No newline at end of file
+        raise e
+
+
+def get_s3_event_objects(event):
+    """
+    Returns the audio objects of an S3 event notification as {'bucket', 'key', 'etag'}.
+    """
+    objects = []
+    for record in event.get('Records', []):
+        if 's3' not in record:
+            continue
+        objects.append({
+            'bucket': record['s3']['bucket']['name'],
+            'key': unquote_plus(record['s3']['object']['key']),  # Keys are URL-encoded in S3 events
+            'etag': record['s3']['object'].get('eTag')
+        })
+    return objects
+
+
+def get_message_objects(body):
+    """
+    Returns the audio objects of an SQS message: an S3 event notification,
+    a single {'bucket', 'key'} object or a list of them.
+    """
+    message = json.loads(body)
+    if isinstance(message, dict) and 'Records' in message:
+        return get_s3_event_objects(message)
+    if isinstance(message, dict) and message.get('Event') == 's3:TestEvent':
+        return []
+    return message if isinstance(message, list) else [message]
+
+
+def handle_sqs_batch(records):
+    """
+    Starts the files of an SQS batch, reporting unreadable messages as batch item
+    failures so only those are redelivered.
+    """
+    objects = []
+    failures = []
+    for record in records:
+        try:
+            objects.extend(get_message_objects(record['body']))
+        except (ValueError, TypeError) as e:
+            print(f"Skipping unreadable message {record.get('messageId')}: {e}")
+            failures.append({'itemIdentifier': record['messageId']})
+
+    summary = start_ingestion(objects)
+    summary['batchItemFailures'] = failures
+    return summary
+
+
+def start_ingestion(objects):
+    """
+    Starts one execution per new audio object. Duplicate records are dropped, and
+    large batches are handed to the bulk ingestion workflow instead.
+    """
+    objects = dedupe_objects(objects)
+    metrics.count('Objects', len(objects))
+    if len(objects) > BULK_EXECUTION_THRESHOLD:
+        return start_backfill(objects)
+
+    started = 0
+    skipped = 0
+    for audio_object in objects:
+        execution = prepare_execution(audio_object)
+        if execution['skip']:
+            skipped += 1
+            continue
+
+        try:
+            response = sfn_client.start_execution(
+                stateMachineArn=os.environ['STT_WORKFLOW_ARN'],
+                name=execution['name'],
+                input=json.dumps(execution['input'])
+            )
+        except sfn_client.exceptions.ExecutionAlreadyExists:
+            print(f"Execution {execution['name']} already exists, skipping")
+            skipped += 1
+            continue
+
+        print(f"Started execution: {response['executionArn']}")
+        update_job_state(s3, get_file_name(audio_object['key']), 'QUEUED',
+                         audioBucket=audio_object['bucket'], audioKey=audio_object['key'],
+                         audioEtag=execution['input']['etag'], executionName=execution['name'],
+                         executionArn=response['executionArn'], executionAttempt=execution['attempt'])
+        started += 1
+
+    metrics.count('ExecutionsStarted', started)
+    metrics.count('ExecutionsSkipped', skipped)
+    return {'started': started, 'skipped': skipped}
+
+
+def start_backfill(objects):
+    """
+    Writes the objects to a manifest and starts the bulk ingestion workflow on it.
+    """
+    objects = dedupe_objects(objects)
+    if not objects:
+        return {'started': 0, 'skipped': 0}
+
+    body = json.dumps(objects)
+    manifest_key = f"{MANIFEST_PREFIX}{hashlib.sha256(body.encode('utf-8')).hexdigest()}.json"
+    s3.put_object(
+        Bucket=os.environ['MANIFEST_BUCKET'],
+        Key=manifest_key,
+        Body=body,
+        ContentType='application/json'
+    )
+
+    try:
+        response = sfn_client.start_execution(
+            stateMachineArn=os.environ['BULK_INGESTION_WORKFLOW_ARN'],
+            name=f"backfill-{manifest_key[len(MANIFEST_PREFIX):-len('.json')][:64]}",
+            input=json.dumps({'manifest': {'bucket': os.environ['MANIFEST_BUCKET'], 'key': manifest_key}})
+        )
+    except sfn_client.exceptions.ExecutionAlreadyExists:
+        print(f"Backfill of {manifest_key} already started")
+        return {'manifest': manifest_key, 'objects': len(objects)}
+
+    print(f"Started backfill of {len(objects)} files: {response['executionArn']}")
+    metrics.count('BackfillObjects', len(objects))
+    return {'manifest': manifest_key, 'objects': len(objects), 'executionArn': response['executionArn']}
+
+
+def read_manifest(manifest):
+    """
+    Reads a backfill manifest from S3: a JSON list of {'bucket', 'key'} objects, or
+    CSV lines of bucket,key[,etag] such as an S3 Inventory report.
+    """
+    content = s3.get_object(Bucket=manifest['bucket'], Key=manifest['key'])['Body'].read().decode('utf-8')
+    if content.lstrip().startswith('['):
+        return json.loads(content)
+
+    objects = []
+    for row in csv.reader(io.StringIO(content)):
+        if len(row) < 2 or row[:2] == ['bucket', 'key']:
+            continue
+        objects.append({'bucket': row[0], 'key': unquote_plus(row[1]), 'etag': row[2] if len(row) > 2 else None})
+    return objects
+
+
+def dedupe_objects(objects):
+    """
+    Drops repeated records of the same object version, keyed by bucket/key/ETag.
+    """
+    unique = {}
+    for audio_object in objects:
+        etag = (audio_object.get('etag') or '').strip('"') or None
+        identity = (audio_object['bucket'], audio_object['key'], etag)
+        if identity not in unique:
+            unique[identity] = {'bucket': audio_object['bucket'], 'key': audio_object['key'], 'etag': etag}
+    return list(unique.values())
+
+
+def get_execution_name(bucket, key, etag, attempt=0):
+    """
+    Derives a deterministic execution name from the object version, so a redelivered
+    record maps onto the execution its first delivery started. A retry of a dead
+    execution is a new attempt, as the name of a closed execution cannot be reused.
+    """
+    identity = f"{bucket}/{key}/{etag or ''}" + (f"/{attempt}" if attempt else '')
+    digest = hashlib.sha256(identity.encode('utf-8')).hexdigest()[:16]
+    prefix = re.sub(r'[^A-Za-z0-9_-]', '-', get_file_name(key))
+    return f"{prefix[:MAX_EXECUTION_NAME_LENGTH - len(digest) - 1]}-{digest}"
+
+
+def prepare_execution(audio_object, record_queued=False):
+    """
+    Returns the execution name and input for an audio object, and whether it can be
+    skipped because this version of the file is already queued, running or done.
+    A version whose job failed or whose execution died is started again.
+    Objects without an ETag (e.g. from a bare manifest) are looked up with HEAD.
+    """
+    bucket = audio_object['bucket']
+    key = audio_object['key']
+    etag = (audio_object.get('etag') or '').strip('"') or None
+    if etag is None:
+        etag = s3.head_object(Bucket=bucket, Key=key)['ETag'].strip('"')
+
+    file_name = get_file_name(key)
+    job_state = read_job_state(s3, os.environ['JOB_STATE_BUCKET'], file_name) \
+        if os.environ.get('JOB_STATE_BUCKET') else None
+    skip = False
+    attempt = 0
+    if job_state and job_state.get('audioEtag') == etag:
+        attempt = job_state.get('executionAttempt', 0)
+        skip = is_job_alive(job_state)
+        if skip:
+            print(f"{bucket}/{key} ({etag}) is already {job_state['stage']}, skipping")
+        else:
+            attempt += 1
+
+    name = get_execution_name(bucket, key, etag, attempt)
+    if record_queued and not skip:
+        update_job_state(s3, file_name, 'QUEUED', audioBucket=bucket, audioKey=key, audioEtag=etag,
+                         executionName=name, executionAttempt=attempt)
+
+    return {
+        'skip': skip,
+        'name': name,
+        'attempt': attempt,
+        'input': {'bucket': bucket, 'key': key, 'etag': etag}
+    }
+
+
+def is_job_alive(job_state):
+    """
+    Returns whether a job is done or still has an execution working on it. An
+    execution that failed, timed out or was aborted leaves its job IN_PROGRESS,
+    so the recorded execution is described; when it cannot be, a job whose record
+    has not changed for STALE_EXECUTION_SECONDS counts as dead.
+    """
+    if job_state['status'] != 'IN_PROGRESS':
+        return job_state['status'] == 'COMPLETED'
+
+    execution_arn = get_execution_arn(job_state)
+    if execution_arn:
+        try:
+            status = sfn_client.describe_execution(executionArn=execution_arn)['status']
+            if status not in LIVE_EXECUTION_STATUSES:
+                print(f"Execution {execution_arn} is {status}")
+            return status in LIVE_EXECUTION_STATUSES
+        except sfn_client.exceptions.ExecutionDoesNotExist:
+            # Queued by the bulk ingestion workflow but not started yet
+            pass
+        except Exception as e:
+            print(f"Could not describe execution {execution_arn}: {e}")
+
+    updated_at = datetime.fromisoformat(job_state['updatedAt'])
+    return (datetime.now(timezone.utc) - updated_at).total_seconds() < STALE_EXECUTION_SECONDS
+
+
+def get_execution_arn(job_state):
+    """
+    Returns the ARN of the job's latest execution. The bulk ingestion workflow
+    records only the name it starts the execution under.
+    """
+    workflow_arn = os.environ.get('STT_WORKFLOW_ARN')
+    if job_state.get('executionName') and workflow_arn:
+        return f"{workflow_arn.replace(':stateMachine:', ':execution:')}:{job_state['executionName']}"
+    return job_state.get('executionArn')
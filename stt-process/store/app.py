@@ -1,12 +1,28 @@
+from enhanced_result import read_enhanced_result
+from job_state import get_file_name, get_file_name_from_job, update_job_state
+from metrics import Metrics
+from search_index import update_search_index
+from transcript_columnar import encode_columnar_transcript
 import json
 import boto3
 
+metrics = Metrics('store')
+
+
+@metrics.instrument_handler
 def lambda_handler(event, context):
-    s3 = boto3.client('s3')
+    s3 = metrics.instrument_s3(boto3.client('s3'))
+    file_name = event.get('fileName')
     
     try:
-        # Parse the body from the event, since it is a JSON string
-        body = json.loads(event['body'])  # Parse the 'body' field as JSON
+        # The enhance step already wrote the result and its index; the event only
+        # carries the claim check pointing at them
+        claim = event['result']
+        file_name = file_name or get_file_name_from_job(get_file_name(claim['key'].replace('_enhanced.json', '.json')))
+        content = read_enhanced_result(s3, claim)
+
+        with metrics.span('ParseTime'):
+            body = json.loads(content)
 
         # Extract the transcript and segments from the parsed body
         enhanced_transcript = body.get('transcript')  # Full transcript text
@@ -17,37 +33,47 @@ def lambda_handler(event, context):
             raise KeyError("Missing 'transcript' in body")
         if not segments:
             raise KeyError("Missing 'segments' in body")
-        
-        # Combine the enhanced transcript with speaker information
-        final_result = {
-            'transcript': enhanced_transcript,
-            'speakers': segments
-        }
+        metrics.count('Segments', len(segments))
+        metrics.set_property('fileName', file_name)
 
-        # Save to S3
-        output_bucket = body.get('s3', {}).get('transcriptionOutputBucket')
-        output_key = body.get('s3', {}).get('transcriptionJobName')
-
-        # Validate bucket and key
-        if not output_bucket or not output_key:
-            raise KeyError("Missing 'transcriptionOutputBucket' or 'transcriptionJobName' in event data")
-        
+        # Compact columnar copy: interned speakers, packed times, one text buffer
+        columnar_key = claim['key'].replace('_enhanced.json', '_enhanced.columnar')
+        with metrics.span('ColumnarEncodeTime'):
+            columnar_bytes = encode_columnar_transcript(body)
         s3.put_object(
-            Bucket=output_bucket,
-            Key=output_key.replace('.json', '_enhanced.json'),
-            Body=json.dumps(body),
-            ContentType='application/json'
+            Bucket=claim['bucket'],
+            Key=columnar_key,
+            Body=columnar_bytes,
+            ContentType='application/octet-stream'
         )
+
+        update_job_state(s3, file_name, 'COMPLETED', result={
+            'bucket': claim['bucket'],
+            'key': claim['key'],
+            'columnarKey': columnar_key
+        })
+
+        # Make the transcript searchable; a failure here leaves the stored result in place
+        try:
+            with metrics.span('SearchIndexTime'):
+                index_update = update_search_index(s3, claim['bucket'], file_name, body)
+            metrics.count('SearchIndexShardsWritten', index_update['shardsWritten'])
+            metrics.count('SearchIndexConflicts', index_update['conflicts'])
+        except Exception as e:
+            print(f"Warning: failed to index {file_name} for search: {e}")
+            metrics.count('SearchIndexErrors')
         
         return {
             'status': 'success',
-            'outputLocation': f"s3://{output_bucket}/{output_key.replace('.json', '_enhanced.json')}"
+            'outputLocation': f"s3://{claim['bucket']}/{claim['key']}"
         }
     
     except KeyError as e:
         print(f"KeyError: {e}")
+        update_job_state(s3, file_name, 'FAILED', error=f"Missing field: {e}")
         raise
     
     except Exception as e:
         print(f"Error: {e}")
-        raise
\ No newline at end of file
+        update_job_state(s3, file_name, 'FAILED', error=str(e))
+        raise
@@ -0,0 +1,248 @@
+"""
+Inverted index over the stored transcripts, searched by the stt-handler.
+
+Postings map the terms of every segment, and the values of every `entities`
+category, to the file, segment and timestamp they occur in. The index is split
+into SEARCH_INDEX_PARTITIONS partitions by file name and every partition into
+SEARCH_INDEX_SHARDS shards by term, each a gzipped JSON object at
+s3://<bucket>/<SEARCH_INDEX_PREFIX>p<partition>/s<shard>.json.gz:
+
+    {"version": 1,
+     "files": {fileName: number of keys},
+     "terms": {term: {fileName: [[segment, timestamp, position, ...], ...]}},
+     "entities": {"CATEGORY:value": {fileName: [[segment, timestamp], ...]}}}
+
+Positions number the terms of a segment, so phrases are matched from the index
+alone. Storing a transcript rewrites only the shards of its own partition that
+held its earlier postings or hold its new ones, using conditional writes so
+concurrent store Lambdas do not drop each other's postings. The shards a file
+uses are recorded next to them, in p<partition>/files/<fileName>.json. A query
+reads the shards of its terms from every partition.
+
+microservices/stt-handler keeps a copy of the reading side of this module. The
+partition and shard counts must match there, and changing them needs a rebuild.
+"""
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import json
+import os
+import random
+import re
+import time
+import zlib
+
+SEARCH_INDEX_PREFIX = os.environ.get('SEARCH_INDEX_PREFIX', 'search-index/')
+SEARCH_INDEX_PARTITIONS = int(os.environ.get('SEARCH_INDEX_PARTITIONS', '8'))
+SEARCH_INDEX_SHARDS = int(os.environ.get('SEARCH_INDEX_SHARDS', '32'))
+INDEX_FORMAT_VERSION = 1
+INDEX_UPDATE_ATTEMPTS = 6  # Conditional writes per shard before giving up
+INDEX_UPDATE_CONCURRENCY = 8  # Shards read and written in parallel
+CONFLICT_ERROR_CODES = ('PreconditionFailed', 'ConditionalRequestConflict', '412', '409')
+
+TERM_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TERM_PATTERN.findall(text.casefold())
+
+
+def normalize_entity(value):
+    """
+    Returns the key used to match entity names regardless of case and whitespace.
+    """
+    return " ".join(value.split()).casefold()
+
+
+def get_entity_key(category, value):
+    return f"{category}:{normalize_entity(value)}"
+
+
+def get_partition(file_name):
+    return zlib.crc32(file_name.encode('utf-8')) % SEARCH_INDEX_PARTITIONS
+
+
+def get_shard(key):
+    return zlib.crc32(key.encode('utf-8')) % SEARCH_INDEX_SHARDS
+
+
+def get_shard_key(partition, shard):
+    return f"{SEARCH_INDEX_PREFIX}p{partition:02d}/s{shard:03d}.json.gz"
+
+
+def get_file_record_key(partition, file_name):
+    return f"{SEARCH_INDEX_PREFIX}p{partition:02d}/files/{file_name}.json"
+
+
+def create_empty_shard():
+    return {'version': INDEX_FORMAT_VERSION, 'files': {}, 'terms': {}, 'entities': {}}
+
+
+def load_shard(content):
+    return json.loads(gzip.decompress(content))
+
+
+def dump_shard(shard):
+    return gzip.compress(json.dumps(shard, separators=(',', ':')).encode('utf-8'), compresslevel=6)
+
+
+def match_phrase(term_postings):
+    """
+    Returns [segment, timestamp] for every segment in which the terms occur one
+    after the other, given the postings of each term in one file.
+    """
+    later_positions = [{posting[0]: set(posting[2:]) for posting in postings} for postings in term_postings[1:]]
+    matches = []
+    for posting in term_postings[0]:
+        segment = posting[0]
+        positions = [segment_positions.get(segment) for segment_positions in later_positions]
+        if not all(positions):
+            continue
+        if any(all(start + offset in positions[offset - 1] for offset in range(1, len(positions) + 1))
+               for start in posting[2:]):
+            matches.append([segment, posting[1]])
+    return matches
+
+
+def build_file_postings(body):
+    """
+    Returns the postings of one enhanced transcript: {'terms': {term: postings},
+    'entities': {key: postings}}. Entities are located in the segments that
+    mention them; one no segment mentions gets an empty list.
+    """
+    terms = {}
+    timestamp = 0.0
+    for segment_index, segment in enumerate(body.get('segments') or []):
+        try:
+            timestamp = max(timestamp, float(segment.get('timestamp')))
+        except (TypeError, ValueError):
+            pass  # Keep the previous start time for segments without a usable timestamp
+
+        segment_postings = {}
+        for position, term in enumerate(tokenize(segment.get('text') or '')):
+            posting = segment_postings.get(term)
+            if posting is None:
+                posting = segment_postings[term] = [segment_index, round(timestamp, 3)]
+                terms.setdefault(term, []).append(posting)
+            posting.append(position)
+
+    entities = {}
+    for category, values in (body.get('entities') or {}).items():
+        if not isinstance(values, list):
+            continue
+        for value in values:
+            if not isinstance(value, str) or not normalize_entity(value):
+                continue
+            value_terms = tokenize(value)
+            if value_terms and all(term in terms for term in value_terms):
+                matches = match_phrase([terms[term] for term in value_terms])
+            else:
+                matches = []
+            entities[get_entity_key(category, value)] = matches
+
+    return {'terms': terms, 'entities': entities}
+
+
+def update_search_index(s3, bucket, file_name, body):
+    """
+    Replaces the postings of `file_name` in its partition of the index with those
+    of `body`. Returns {'shardsWritten', 'conflicts'}.
+    """
+    postings = build_file_postings(body)
+    shard_postings = [{'terms': {}, 'entities': {}} for _ in range(SEARCH_INDEX_SHARDS)]
+    for kind, entries in postings.items():
+        for key, file_postings in entries.items():
+            shard_postings[get_shard(key)][kind][key] = file_postings
+
+    partition = get_partition(file_name)
+    record_key = get_file_record_key(partition, file_name)
+    shards = [shard for shard, entries in enumerate(shard_postings) if entries['terms'] or entries['entities']]
+
+    def update(shard):
+        return update_shard(s3, bucket, get_shard_key(partition, shard), file_name, shard_postings[shard])
+
+    # Shards the earlier version of the file used are visited too, so its
+    # postings are dropped even from shards the new version does not use
+    previous_shards = read_file_record(s3, bucket, record_key)
+    with ThreadPoolExecutor(max_workers=INDEX_UPDATE_CONCURRENCY) as executor:
+        results = list(executor.map(update, sorted(set(shards) | set(previous_shards))))
+
+    s3.put_object(Bucket=bucket, Key=record_key, ContentType='application/json',
+                  Body=json.dumps({'version': INDEX_FORMAT_VERSION, 'shards': shards}))
+
+    return {
+        'shardsWritten': sum(written for written, _ in results),
+        'conflicts': sum(conflicts for _, conflicts in results)
+    }
+
+
+def read_file_record(s3, bucket, key):
+    """
+    Returns the shards the file's postings were written to, or an empty list if
+    it has not been indexed yet.
+    """
+    try:
+        response = s3.get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return []
+        raise
+    return json.loads(response['Body'].read())['shards']
+
+
+def read_shard(s3, bucket, key):
+    """
+    Returns (shard, etag), or an empty shard and None if it does not exist yet.
+    """
+    try:
+        response = s3.get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return create_empty_shard(), None
+        raise
+    return load_shard(response['Body'].read()), response['ETag']
+
+
+def update_shard(s3, bucket, key, file_name, file_postings):
+    """
+    Swaps the file's postings in one shard and writes it back only if no other
+    writer changed it in between, retrying with jittered backoff otherwise.
+    Returns (whether the shard was written, conflicts seen).
+    """
+    for attempt in range(1, INDEX_UPDATE_ATTEMPTS + 1):
+        shard, etag = read_shard(s3, bucket, key)
+        changed = remove_file_postings(shard, file_name)
+
+        key_count = 0
+        for kind, entries in file_postings.items():
+            for term, postings in entries.items():
+                shard[kind].setdefault(term, {})[file_name] = postings
+                key_count += 1
+        if key_count:
+            shard['files'][file_name] = key_count
+        elif not changed:
+            return False, attempt - 1
+
+        condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+        try:
+            s3.put_object(Bucket=bucket, Key=key, Body=dump_shard(shard), ContentType='application/gzip', **condition)
+            return True, attempt - 1
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in CONFLICT_ERROR_CODES or attempt == INDEX_UPDATE_ATTEMPTS:
+                raise
+            time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+
+
+def remove_file_postings(shard, file_name):
+    """
+    Drops the file's postings from a shard. Returns whether it had any.
+    """
+    if shard['files'].pop(file_name, None) is None:
+        return False
+    for kind in ('terms', 'entities'):
+        entries = shard[kind]
+        for key in [key for key, files in entries.items() if file_name in files]:
+            del entries[key][file_name]
+            if not entries[key]:
+                del entries[key]
+    return True
@@ -0,0 +1,126 @@
+"""
+Compact columnar encoding of an enhanced transcript.
+
+Layout: the magic bytes b'JVTC' followed by a zlib stream that decompresses to
+
+    uint32 header length | JSON header | padding to 8 bytes | sections
+
+The header holds the format version, the interned speaker table, the
+remaining top-level fields (entities, s3) and the [offset, length] of every
+section relative to the start of the sections. Sections are 8-byte aligned:
+
+    speakerIds   uint16 per segment, index into the speaker table
+    starts       float64 start time per segment, made non-decreasing
+    ends         float64 end time per segment (the next segment's start)
+    textOffsets  uint32 per segment + 1, into `text`
+    text         UTF-8 segment texts, concatenated
+    transcript   UTF-8 full transcript
+    timestampOffsets/timestampText  original timestamp strings, only written
+                 when some timestamp does not round-trip through a float
+
+All numbers are little-endian. The stt-handler loader maps the sections with
+memoryview.cast, without copying them.
+"""
+from array import array
+import json
+import struct
+import sys
+import zlib
+
+MAGIC = b'JVTC'
+FORMAT_VERSION = 1
+COMPRESSION_LEVEL = 6
+
+
+def align(position, alignment=8):
+    return (position + alignment - 1) // alignment * alignment
+
+
+def little_endian(values):
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def encode_columnar_transcript(body):
+    """
+    Encodes an enhanced result ({'transcript', 'segments', 'entities', ...}) in the
+    columnar format and returns the compressed bytes.
+    """
+    segments = body.get('segments') or []
+    speakers = []
+    speaker_ids = {}
+    ids = array('H')
+    starts = array('d')
+    text_offsets = array('I', [0])
+    texts = []
+    text_length = 0
+    timestamp_texts = []
+    timestamps_round_trip = True
+    start = 0.0
+
+    for segment in segments:
+        speaker = str(segment.get('speaker', ''))
+        if speaker not in speaker_ids:
+            speaker_ids[speaker] = len(speakers)
+            speakers.append(speaker)
+        ids.append(speaker_ids[speaker])
+
+        timestamp = str(segment.get('timestamp', ''))
+        try:
+            start = max(start, float(timestamp))
+            timestamps_round_trip = timestamps_round_trip and repr(start) == timestamp
+        except ValueError:
+            timestamps_round_trip = False  # Keep the previous start time
+        starts.append(start)
+        timestamp_texts.append(timestamp.encode('utf-8'))
+
+        text = str(segment.get('text', '')).encode('utf-8')
+        texts.append(text)
+        text_length += len(text)
+        text_offsets.append(text_length)
+
+    ends = array('d', starts[1:])
+    if starts:
+        ends.append(starts[-1])
+
+    sections = [
+        ('speakerIds', little_endian(ids)),
+        ('starts', little_endian(starts)),
+        ('ends', little_endian(ends)),
+        ('textOffsets', little_endian(text_offsets)),
+        ('text', b''.join(texts)),
+        ('transcript', str(body.get('transcript') or '').encode('utf-8'))
+    ]
+    if not timestamps_round_trip:
+        timestamp_offsets = array('I', [0])
+        position = 0
+        for timestamp in timestamp_texts:
+            position += len(timestamp)
+            timestamp_offsets.append(position)
+        sections.append(('timestampOffsets', little_endian(timestamp_offsets)))
+        sections.append(('timestampText', b''.join(timestamp_texts)))
+
+    layout = {}
+    parts = []
+    position = 0
+    for name, data in sections:
+        padding = align(position) - position
+        parts.append(b'\0' * padding)
+        position += padding
+        layout[name] = [position, len(data)]
+        parts.append(data)
+        position += len(data)
+
+    header = json.dumps({
+        'version': FORMAT_VERSION,
+        'segmentCount': len(segments),
+        'speakers': speakers,
+        'fields': {key: value for key, value in body.items() if key not in ('segments', 'transcript')},
+        'sections': layout
+    }).encode('utf-8')
+    preamble = struct.pack('<I', len(header)) + header
+    preamble += b'\0' * (align(len(preamble)) - len(preamble))
+
+    return MAGIC + zlib.compress(preamble + b''.join(parts), COMPRESSION_LEVEL)
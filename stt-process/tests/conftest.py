@@ -0,0 +1,52 @@
+"""
+Shared fixtures for the stt-process tests.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from local_aws import ROOT, FakeStepFunctions, FakeTranscribe, LocalS3, load_lambda
+
+
+@pytest.fixture
+def s3():
+    return LocalS3()
+
+
+@pytest.fixture
+def transcribe(s3):
+    return FakeTranscribe(s3)
+
+
+@pytest.fixture
+def sfn():
+    return FakeStepFunctions()
+
+
+@pytest.fixture
+def transcribe_app(monkeypatch, s3, transcribe, sfn):
+    """
+    The transcribe Lambda with its boto3 clients replaced by the local stand-ins.
+    """
+    app = load_lambda('transcribe_app', ROOT / 'transcribe')
+    clients = {'s3': s3, 'transcribe': transcribe, 'stepfunctions': sfn}
+    monkeypatch.setattr(app, 'boto3', SimpleNamespace(client=lambda name, **kwargs: clients[name]))
+    return app
+
+
+@pytest.fixture
+def start_app(monkeypatch, s3, sfn):
+    """
+    The start Lambda, whose clients are created at import, pointed at the local stand-ins.
+    """
+    app = load_lambda('start_app', ROOT / 'start')
+    monkeypatch.setattr(app, 's3', s3)
+    monkeypatch.setattr(app, 'sfn_client', sfn)
+    return app
+
+
+@pytest.fixture
+def enhance_app(monkeypatch, s3):
+    app = load_lambda('enhance_app', ROOT / 'enhance')
+    monkeypatch.setattr(app, 's3', s3)
+    return app
@@ -0,0 +1,154 @@
+"""
+Local stand-ins for the AWS services the stt-process Lambdas call.
+
+The Lambdas run against the in-memory S3 of benchmarks/local_s3.py and the
+FakeTranscribe client below, so the tests need neither AWS nor moto.
+"""
+from datetime import datetime, timedelta, timezone
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+import json
+import os
+import sys
+
+ROOT = Path(__file__).resolve().parent.parent
+EVENTS_DIR = ROOT / 'events'
+OUTPUT_BUCKET = 'test-transcription-output'
+UPLOAD_BUCKET = 'test-uploads'
+WORKFLOW_ARN = 'arn:aws:states:us-east-1:000000000000:stateMachine:stt-workflow'
+
+sys.path.insert(0, str(ROOT / 'layer'))
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+from local_s3 import LocalS3
+
+# The Lambdas read their configuration at import time
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ['S3_TRANSCRIPTION_OUTPUT'] = OUTPUT_BUCKET
+os.environ['JOB_STATE_BUCKET'] = OUTPUT_BUCKET
+os.environ['TASK_TOKEN_BUCKET'] = OUTPUT_BUCKET
+os.environ['STT_WORKFLOW_ARN'] = WORKFLOW_ARN
+os.environ['LONG_AUDIO_THRESHOLD_SECONDS'] = '0'
+os.environ['METRICS_LEVEL'] = 'off'
+os.environ['OPENAI_API_KEY'] = 'test'
+os.environ['RESPONSE_CACHE'] = 'none'
+os.environ['ENHANCE_RETRY_DELAY'] = '0'
+
+
+def load_lambda(name, directory):
+    """
+    Imports a Lambda's app.py under `name`. Every Lambda has an app.py and some
+    share helper module names, so its siblings are re-imported from its own directory.
+    """
+    for sibling in directory.glob('*.py'):
+        sys.modules.pop(sibling.stem, None)
+    sys.path.insert(0, str(directory))
+    try:
+        spec = spec_from_file_location(name, directory / 'app.py')
+        module = module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(str(directory))
+    return module
+
+
+def load_event(name):
+    return json.loads((EVENTS_DIR / name).read_text())
+
+
+class TranscribeError(Exception):
+    pass
+
+
+class FakeTranscribe:
+    """
+    Stand-in for the Transcribe client. A started job reads its media from `s3`
+    right away; complete() writes its output, stt-<job>.json in the output
+    bucket, with the audio bytes as the transcript text.
+    """
+
+    class exceptions:
+        ConflictException = type('ConflictException', (TranscribeError,), {})
+        BadRequestException = type('BadRequestException', (TranscribeError,), {})
+        NotFoundException = type('NotFoundException', (TranscribeError,), {})
+
+    def __init__(self, s3):
+        self.s3 = s3
+        self.jobs = {}
+        self.started = []
+
+    def start_transcription_job(self, TranscriptionJobName, Media, OutputBucketName, **kwargs):
+        if TranscriptionJobName in self.jobs:
+            raise self.exceptions.ConflictException(TranscriptionJobName)
+        bucket, key = Media['MediaFileUri'][len('s3://'):].split('/', 1)
+        self.jobs[TranscriptionJobName] = {
+            'TranscriptionJobName': TranscriptionJobName,
+            'TranscriptionJobStatus': 'IN_PROGRESS',
+            'CreationTime': datetime.now(timezone.utc),
+            'audio': self.s3.get_object(Bucket=bucket, Key=key)['Body'].read().decode('utf-8'),
+            'outputBucket': OutputBucketName
+        }
+        self.started.append(TranscriptionJobName)
+        return {'TranscriptionJob': self.describe(TranscriptionJobName)}
+
+    def complete(self, job_name, status='COMPLETED', completed_ago=0):
+        job = self.jobs[job_name]
+        job['TranscriptionJobStatus'] = status
+        job['CompletionTime'] = datetime.now(timezone.utc) - timedelta(seconds=completed_ago)
+        if status == 'COMPLETED':
+            self.s3.put_object(Bucket=job['outputBucket'], Key=f"{job_name}.json",
+                               Body=json.dumps(make_transcript(job['audio'])))
+
+    def get_transcription_job(self, TranscriptionJobName):
+        if TranscriptionJobName not in self.jobs:
+            raise self.exceptions.BadRequestException(TranscriptionJobName)
+        return {'TranscriptionJob': self.describe(TranscriptionJobName)}
+
+    def delete_transcription_job(self, TranscriptionJobName):
+        self.jobs.pop(TranscriptionJobName, None)
+
+    def describe(self, job_name):
+        return {key: value for key, value in self.jobs[job_name].items() if key[0].isupper()}
+
+
+class FakeStepFunctions:
+    """
+    Stand-in for the Step Functions client: records task outputs and keeps
+    started executions by ARN, RUNNING until a test sets their status.
+    """
+
+    class exceptions:
+        InvalidToken = type('InvalidToken', (Exception,), {})
+        TaskTimedOut = type('TaskTimedOut', (Exception,), {})
+        TaskDoesNotExist = type('TaskDoesNotExist', (Exception,), {})
+        ExecutionAlreadyExists = type('ExecutionAlreadyExists', (Exception,), {})
+        ExecutionDoesNotExist = type('ExecutionDoesNotExist', (Exception,), {})
+
+    def __init__(self):
+        self.outputs = []
+        self.executions = {}
+
+    def send_task_success(self, taskToken, output):
+        self.outputs.append((taskToken, json.loads(output)))
+
+    def start_execution(self, stateMachineArn, name, input):
+        execution_arn = f"{stateMachineArn.replace(':stateMachine:', ':execution:')}:{name}"
+        if execution_arn in self.executions:
+            raise self.exceptions.ExecutionAlreadyExists(name)
+        self.executions[execution_arn] = {'status': 'RUNNING', 'input': json.loads(input)}
+        return {'executionArn': execution_arn}
+
+    def describe_execution(self, executionArn):
+        if executionArn not in self.executions:
+            raise self.exceptions.ExecutionDoesNotExist(executionArn)
+        return {'executionArn': executionArn, 'status': self.executions[executionArn]['status']}
+
+
+def make_transcript(text):
+    return {'results': {'transcripts': [{'transcript': text}], 'items': [], 'speaker_labels': {'segments': []}}}
+
+
+def read_transcript_text(s3, bucket, key):
+    transcript = json.loads(s3.get_object(Bucket=bucket, Key=key)['Body'].read())
+    return transcript['results']['transcripts'][0]['transcript']
+
@@ -0,0 +1,180 @@
+from types import SimpleNamespace
+import json
+
+from local_aws import OUTPUT_BUCKET
+
+
+def test_ner_retries_a_failed_chunk(enhance_app, monkeypatch):
+    calls = []
+
+    def extract_entities_with_openai(text):
+        calls.append(text)
+        return None if len(calls) == 1 else {'WITNESS': [text]}
+
+    monkeypatch.setattr(enhance_app, 'extract_entities_with_openai', extract_entities_with_openai)
+    monkeypatch.setattr(enhance_app, 'LOCAL_ENTITY_EXTRACTION', False)
+    chunks = [{'transcript': 'Jane Doe', 'segments': []}, {'transcript': 'John Roe', 'segments': [], 'entities': {}}]
+
+    result = enhance_app.perform_ner_on_transcript({'transcript': 'Jane Doe John Roe', 'segments': []}, chunks)
+
+    assert calls == ['Jane Doe', 'Jane Doe']
+    assert result['entities']['WITNESS'] == ['Jane Doe']
+
+
+def test_ner_fails_once_a_chunk_runs_out_of_attempts(enhance_app, monkeypatch):
+    calls = []
+    monkeypatch.setattr(enhance_app, 'extract_entities_with_openai', lambda text: calls.append(text))
+
+    assert enhance_app.perform_ner_on_transcript({'transcript': 'Jane Doe', 'segments': []}) is None
+    assert len(calls) == enhance_app.ENHANCE_MAX_ATTEMPTS
+
+
+def reply_with(enhance_app, monkeypatch, *contents):
+    """
+    Replaces create_completion with one answering each request with the next of `contents`.
+    """
+    replies = iter(contents)
+    monkeypatch.setattr(enhance_app, 'create_completion', lambda prompt: SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=next(replies)))]))
+
+
+def test_ner_reply_that_is_not_an_object_fails_the_chunk(enhance_app, monkeypatch):
+    replies = ['null', '[]', '"Jane Doe"', '{"entities": ["Jane Doe"]}']
+    reply_with(enhance_app, monkeypatch, *replies)
+
+    assert [enhance_app.extract_entities_with_openai('Jane Doe') for _ in replies] == [None] * len(replies)
+
+
+def test_malformed_ner_reply_is_retried(enhance_app, monkeypatch):
+    reply_with(enhance_app, monkeypatch, 'null', '{"entities": {"WITNESS": ["Jane Doe"]}}')
+
+    assert enhance_app.extract_entities_with_retries(0, 'Jane Doe', 2) == {'WITNESS': ['Jane Doe']}
+
+
+CHUNK = [{'timestamp': str(float(position)), 'speaker': 'spk_0', 'text': f"Entry {position}."} for position in range(6)]
+
+
+def cut_off_streams(enhance_app, monkeypatch, segments_per_stream):
+    """
+    Replaces stream_completion with streams that are cut off after
+    `segments_per_stream` segments of the entries they were asked for.
+    """
+    prompts = []
+
+    def stream_completion(prompt):
+        prompts.append(prompt)
+        entries = [entry for entry in CHUNK if f'"text": "{entry["text"]}"' in prompt]
+        return SimpleNamespace(segments=[dict(entry) for entry in entries[:segments_per_stream]], complete=False)
+
+    monkeypatch.setattr(enhance_app, 'stream_completion', stream_completion)
+    monkeypatch.setattr(enhance_app, 'ENHANCE_STREAMING', True)
+    return prompts
+
+
+def test_cut_off_stream_is_resumed_up_to_its_own_limit(enhance_app, monkeypatch):
+    prompts = cut_off_streams(enhance_app, monkeypatch, segments_per_stream=2)
+    monkeypatch.setattr(enhance_app, 'ENHANCE_STREAM_RESUMES', 1)
+
+    assert enhance_app.stream_enhancement(CHUNK) is None
+    assert len(prompts) == 2
+    assert '"Entry 2."' in prompts[1] and '"Entry 1."' not in prompts[1]
+
+
+def test_resumes_complete_a_chunk(enhance_app, monkeypatch):
+    cut_off_streams(enhance_app, monkeypatch, segments_per_stream=2)
+    monkeypatch.setattr(enhance_app, 'ENHANCE_STREAM_RESUMES', 2)
+
+    result = enhance_app.stream_enhancement(CHUNK)
+
+    assert [segment['text'] for segment in result['segments']] == [entry['text'] for entry in CHUNK]
+
+
+def test_requests_per_chunk_are_bounded_by_attempts_and_resumes(enhance_app, monkeypatch):
+    prompts = cut_off_streams(enhance_app, monkeypatch, segments_per_stream=1)
+    monkeypatch.setattr(enhance_app, 'ENHANCE_STREAM_RESUMES', 1)
+
+    assert enhance_app.enhance_chunk_with_retries(0, CHUNK, 3) is None
+    assert len(prompts) == 3 * 2
+
+
+def test_stream_without_segments_fails_the_attempt(enhance_app, monkeypatch):
+    prompts = cut_off_streams(enhance_app, monkeypatch, segments_per_stream=0)
+
+    assert enhance_app.stream_enhancement(CHUNK) is None
+    assert len(prompts) == 1
+
+
+def test_partial_results_are_written_only_with_a_bucket(enhance_app, monkeypatch, s3):
+    assert enhance_app.create_partial_result_callback('hearing', 2) is None
+
+    monkeypatch.setattr(enhance_app, 'PARTIAL_RESULTS_BUCKET', OUTPUT_BUCKET)
+    on_chunk_enhanced = enhance_app.create_partial_result_callback('hearing', 2)
+    on_chunk_enhanced(0, {'segments': [{'timestamp': '0.0', 'speaker': 'Judge', 'text': 'Order.'}]})
+
+    assert s3.head_object(Bucket=OUTPUT_BUCKET, Key='partial/hearing/chunk-00000.json')
+    job_state = json.loads(s3.get_object(Bucket=OUTPUT_BUCKET, Key='jobs/hearing.json')['Body'].read())
+    assert (job_state['stage'], job_state['percent'], job_state['readySegments']) == ('ENHANCING', 67, 1)
+
+
+def test_job_state_is_updated_outside_the_partial_results_lock(enhance_app, monkeypatch, s3):
+    writers = []
+    locked = []
+
+    class RecordingWriter(enhance_app.PartialResultWriter):
+        def __init__(self, *args):
+            super().__init__(*args)
+            writers.append(self)
+
+    monkeypatch.setattr(enhance_app, 'PARTIAL_RESULTS_BUCKET', OUTPUT_BUCKET)
+    monkeypatch.setattr(enhance_app, 'PartialResultWriter', RecordingWriter)
+    monkeypatch.setattr(enhance_app, 'update_job_state', lambda *args, **kwargs: locked.append(writers[0].lock.locked()))
+
+    enhance_app.create_partial_result_callback('hearing', 1)(0, {'segments': []})
+
+    assert locked == [False]
+
+
+DELTA_CHUNK = [{'timestamp': '0.0', 'speaker': 'spk_0', 'text': 'Your honor.'},
+               {'timestamp': '2.5', 'speaker': 'spk_1', 'text': 'Objection, hearsey.'}]
+
+
+def test_delta_corrections_are_applied_to_their_segments(enhance_app):
+    delta = {'speakers': {'spk_1': 'Defense Counsel'}, 'corrections': [{'index': '1', 'text': 'Objection, hearsay.'}]}
+
+    result = enhance_app.apply_enhancement_delta(DELTA_CHUNK, delta)
+
+    assert result == {
+        'transcript': 'Your honor. Objection, hearsay.',
+        'segments': [{'timestamp': '0.0', 'speaker': 'spk_0', 'text': 'Your honor.'},
+                     {'timestamp': '2.5', 'speaker': 'Defense Counsel', 'text': 'Objection, hearsay.'}]
+    }
+
+
+def test_delta_corrections_of_unknown_segments_are_ignored(enhance_app):
+    delta = {'speakers': {}, 'corrections': [
+        {'index': 2, 'text': 'Past the end.'},
+        {'index': -1, 'text': 'Before the start.'},
+        {'index': 'one', 'text': 'Not an index.'},
+        {'text': 'No index.'},
+        {'index': 0, 'text': None}
+    ]}
+
+    result = enhance_app.apply_enhancement_delta(DELTA_CHUNK, delta)
+
+    assert [segment['text'] for segment in result['segments']] == ['Your honor.', 'Objection, hearsey.']
+
+
+def test_last_duplicate_delta_correction_wins(enhance_app):
+    delta = {'corrections': [{'index': 1, 'text': 'Objection.'}, {'index': 1, 'text': 'Objection, hearsay.'}]}
+
+    result = enhance_app.apply_enhancement_delta(DELTA_CHUNK, delta)
+
+    assert result['segments'][1]['text'] == 'Objection, hearsay.'
+
+
+def test_malformed_delta_fails_the_chunk(enhance_app, monkeypatch):
+    monkeypatch.setattr(enhance_app, 'ENHANCE_OUTPUT_MODE', 'delta')
+    replies = ['[]', '{"speakers": ["Judge"]}', '{"corrections": {"0": "Your honor."}}']
+    reply_with(enhance_app, monkeypatch, *replies)
+
+    assert [enhance_app.enhance_with_openai(DELTA_CHUNK) for _ in replies] == [None] * len(replies)
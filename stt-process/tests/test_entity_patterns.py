@@ -0,0 +1,87 @@
+import sys
+
+import pytest
+
+from local_aws import ROOT
+
+sys.path.insert(0, str(ROOT / 'enhance'))
+
+from entity_patterns import extract_structured_entities
+
+
+def extract(text):
+    return {category: values for category, values in extract_structured_entities(text).items() if values}
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("The case is 2:21-cv-01234-ABC in this court.", ['2:21-cv-01234-ABC']),
+    ("This is Case No. CV-2021-0042 before us.", ['CV-2021-0042']),
+    ("Docket Number 19-1234 was filed.", ['19-1234']),
+])
+def test_case_numbers(text, expected):
+    assert extract(text) == {'CASE_NUMBER': expected}
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("He cited 42 U.S.C. § 1983 and 28 U.S.C. 1331(b)(2).", ['42 U.S.C. § 1983', '28 U.S.C. 1331(b)(2)']),
+    ("Under 21 C.F.R. Part 314.50(d) the rule applies.", ['21 C.F.R. Part 314.50(d)']),
+    ("Federal Rule of Civil Procedure 26(b)(1) governs.", ['Federal Rule of Civil Procedure 26(b)(1)']),
+    ("Rule of Evidence 403 excludes it.", ['Rule of Evidence 403']),
+    ("See § 12.3(a) of the agreement.", ['§ 12.3(a)']),
+])
+def test_statutes(text, expected):
+    assert extract(text) == {'STATUTE': expected}
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("Please mark Plaintiff's Exhibit 12 and Exhibit A.", ["Plaintiff's Exhibit 12", 'Exhibit A']),
+    ("Defendant's Exhibit DX-104 was shown.", ["Defendant's Exhibit DX-104"]),
+    ("I show you exhibit number 7.", ['exhibit number 7']),
+])
+def test_exhibits(text, expected):
+    assert extract(text) == {'EXHIBIT': expected}
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("On January 5, 2021 and the 3rd day of March, 2020.", ['January 5, 2021', '3rd day of March, 2020']),
+    ("It was 03/04/2021 or 2021-03-04.", ['03/04/2021', '2021-03-04']),
+    ("Signed Sept. 14 2019.", ['Sept. 14 2019']),
+])
+def test_dates(text, expected):
+    assert extract(text) == {'DATE': expected}
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("The United States District Court for the Southern District of New York.",
+     ['United States District Court for the Southern District of New York']),
+    ("The Court of Appeals for the Ninth Circuit affirmed.", ['Court of Appeals for the Ninth Circuit']),
+    ("The U.S. Supreme Court denied cert. The Supreme Court of California reversed.",
+     ['U.S. Supreme Court', 'Supreme Court of California']),
+    ("Superior Court of California, County of Los Angeles.", ['Superior Court of California, County of Los Angeles']),
+    ("Cook County Circuit Court.", ['Cook County Circuit Court']),
+])
+def test_courts(text, expected):
+    assert extract(text) == {'COURT': expected}
+
+
+@pytest.mark.parametrize('text', [
+    # Case numbers
+    "The time was 2:21 and the cv was attached.",
+    "In case number, we have nothing.",
+    # Statutes
+    "He lives at 42 U.S. Route 1.",
+    "Section twelve of the code.",
+    # Exhibits
+    "The exhibits were boxed. Exhibit A's cover was torn.",
+    "An exhibition of 12 paintings.",
+    # Dates
+    "May I approach? In March we met. 2021 was long. 13/2021.",
+    # Courts
+    "The court of appeals agreed. The district court ruled. The Supreme Court of Narnia.",
+])
+def test_near_misses_are_not_entities(text):
+    assert extract(text) == {}
+
+
+def test_values_are_deduplicated_regardless_of_spacing():
+    assert extract("Exhibit 12 was marked. Then Exhibit  12 again.") == {'EXHIBIT': ['Exhibit 12']}
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, timezone
+import json
+import sys
+
+import pytest
+
+from local_aws import OUTPUT_BUCKET, ROOT, LocalS3
+
+sys.path.insert(0, str(ROOT / 'transcribe'))
+
+import poll_schedule
+
+
+@pytest.fixture
+def s3():
+    poll_schedule._ratio_cache.clear()
+    yield LocalS3()
+    poll_schedule._ratio_cache.clear()
+
+
+def completed_job(processing_seconds):
+    created = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return {'CreationTime': created, 'CompletionTime': created + timedelta(seconds=processing_seconds)}
+
+
+def test_wait_until_the_job_is_expected_to_be_done():
+    # 15s startup + 600s of audio at 0.5
+    assert poll_schedule.get_next_wait_seconds(600, 0, 0, ratio=0.5) == 315
+    assert poll_schedule.get_next_wait_seconds(600, 300, 1, ratio=0.5) == 15
+
+
+def test_overdue_jobs_back_off_exponentially():
+    assert poll_schedule.get_next_wait_seconds(600, 1000, 0, ratio=0.5) == poll_schedule.POLL_MIN_WAIT_SECONDS
+    assert poll_schedule.get_next_wait_seconds(600, 1000, 3, ratio=0.5) == poll_schedule.POLL_MIN_WAIT_SECONDS * 8
+
+
+def test_wait_is_clamped_to_the_maximum():
+    assert poll_schedule.get_next_wait_seconds(36000, 0, 0, ratio=0.5) == poll_schedule.POLL_MAX_WAIT_SECONDS
+    assert poll_schedule.get_next_wait_seconds(600, 1000, 30, ratio=0.5) == poll_schedule.POLL_MAX_WAIT_SECONDS
+
+
+def test_missing_media_duration_uses_the_default_wait():
+    assert poll_schedule.get_next_wait_seconds(None, 0, 0) == poll_schedule.POLL_DEFAULT_WAIT_SECONDS
+    assert poll_schedule.get_next_wait_seconds(0, 100, 5) == poll_schedule.POLL_MIN_WAIT_SECONDS * 2 ** 5
+
+
+def test_missing_stats_use_the_default_ratio(s3):
+    assert poll_schedule.read_processing_ratio(s3, OUTPUT_BUCKET) == poll_schedule.POLL_DEFAULT_RATIO
+
+
+def test_completed_job_moves_the_ratio_towards_it(s3):
+    # 100s of audio processed in 15s startup + 100s: an observed ratio of 1.0
+    poll_schedule.record_completed_job(s3, OUTPUT_BUCKET, 100, completed_job(115))
+
+    expected = (1 - poll_schedule.POLL_SMOOTHING) * poll_schedule.POLL_DEFAULT_RATIO + poll_schedule.POLL_SMOOTHING
+    stats = json.loads(s3.get_object(Bucket=OUTPUT_BUCKET, Key=poll_schedule.POLL_STATS_KEY)['Body'].read())
+    assert stats['ratio'] == pytest.approx(expected)
+    # Another container reads the stored ratio
+    poll_schedule._ratio_cache.clear()
+    assert poll_schedule.read_processing_ratio(s3, OUTPUT_BUCKET) == pytest.approx(expected)
+
+
+def test_jobs_without_duration_or_completion_are_not_recorded(s3):
+    poll_schedule.record_completed_job(s3, OUTPUT_BUCKET, None, completed_job(115))
+    poll_schedule.record_completed_job(s3, OUTPUT_BUCKET, 100, {'CreationTime': datetime.now(timezone.utc)})
+
+    assert not s3.list_objects_v2(Bucket=OUTPUT_BUCKET, Prefix='stats/')['Contents']
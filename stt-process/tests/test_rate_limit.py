@@ -0,0 +1,58 @@
+import sys
+
+from botocore.exceptions import ClientError
+
+from local_aws import OUTPUT_BUCKET, ROOT, LocalS3
+
+sys.path.insert(0, str(ROOT / 'enhance'))
+
+import rate_limit
+
+
+class ContendedS3(LocalS3):
+    """
+    LocalS3 whose conditional writes fail while `conflicts` is above zero, as if
+    other invocations changed the state first every time.
+    """
+
+    def __init__(self, conflicts):
+        super().__init__()
+        self.conflicts = conflicts
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        if self.conflicts > 0:
+            self.conflicts -= 1
+            raise ClientError({'Error': {'Code': 'PreconditionFailed', 'Message': 'Precondition Failed'}}, 'PutObject')
+        return super().put_object(Bucket, Key, Body, **kwargs)
+
+
+def create_governor(monkeypatch, s3):
+    sleeps = []
+    monkeypatch.setattr(rate_limit.time, 'sleep', sleeps.append)
+    store = rate_limit.S3Store(s3, OUTPUT_BUCKET)
+    return rate_limit.RateLimitGovernor(store, requests_per_minute=60, tokens_per_minute=6000), sleeps
+
+
+def test_acquire_waits_while_every_write_conflicts(monkeypatch):
+    s3 = ContendedS3(conflicts=rate_limit.STORE_UPDATE_ATTEMPTS + 2)
+    governor, sleeps = create_governor(monkeypatch, s3)
+
+    waited = governor.acquire(100)
+
+    assert waited >= rate_limit.CONFLICT_RETRY_WAIT
+    assert s3.conflicts == 0
+    state = governor.store.update(lambda state: (None, state))
+    assert (state['requests'], state['tokens']) == (59, 5900)
+
+
+def test_unreachable_store_lets_requests_through(monkeypatch):
+    s3 = LocalS3()
+    governor, sleeps = create_governor(monkeypatch, s3)
+
+    def get_object(**kwargs):
+        raise ClientError({'Error': {'Code': 'AccessDenied', 'Message': 'Access Denied'}}, 'GetObject')
+
+    s3.get_object = get_object
+
+    assert governor.acquire(100) == 0
+    assert sleeps == []
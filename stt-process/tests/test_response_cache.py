@@ -0,0 +1,67 @@
+import os
+import sys
+
+from local_aws import ROOT
+
+sys.path.insert(0, str(ROOT / 'enhance'))
+
+from response_cache import DirectoryBackend, MemoryBackend, ResponseCache, make_cache_key
+
+PAYLOAD = {'transcript': 'Jane Doe', 'categories': ['WITNESS', 'JUDGE']}
+
+
+def test_cache_key_is_stable():
+    reordered = {'categories': ['WITNESS', 'JUDGE'], 'transcript': 'Jane Doe'}
+
+    assert make_cache_key('gpt-4o', '1', PAYLOAD) == make_cache_key('gpt-4o', '1', reordered)
+    assert make_cache_key('gpt-4o', '1', PAYLOAD) != make_cache_key('gpt-4o-mini', '1', PAYLOAD)
+    assert make_cache_key('gpt-4o', '1', PAYLOAD) != make_cache_key('gpt-4o', '1', dict(PAYLOAD, transcript='John Roe'))
+
+
+def test_prompt_version_change_produces_a_new_key():
+    cache = ResponseCache(MemoryBackend())
+    cache.put(make_cache_key('gpt-4o', '1', PAYLOAD), {'WITNESS': ['Jane Doe']})
+
+    assert cache.get(make_cache_key('gpt-4o', '2', PAYLOAD)) is None
+    assert cache.get(make_cache_key('gpt-4o', '1', PAYLOAD)) == {'WITNESS': ['Jane Doe']}
+    assert cache.stats() == {'hits': 1, 'misses': 1}
+
+
+def test_memory_backend_evicts_the_least_recently_used_entry():
+    backend = MemoryBackend(max_entries=2)
+    backend.put('a', b'1')
+    backend.put('b', b'2')
+    backend.get('a')
+    backend.put('c', b'3')
+
+    assert (backend.get('a'), backend.get('b'), backend.get('c')) == (b'1', None, b'3')
+
+
+def test_memory_backend_expires_entries():
+    backend = MemoryBackend(ttl=60)
+    backend.put('a', b'1')
+    stored_at, data = backend.entries['a']
+    backend.entries['a'] = (stored_at - 61, data)
+
+    assert backend.get('a') is None
+
+
+def test_directory_backend_round_trip(tmp_path):
+    cache = ResponseCache(DirectoryBackend(tmp_path))
+    key = make_cache_key('gpt-4o', '1', PAYLOAD)
+    cache.put(key, {'segments': [{'speaker': 'Judge', 'text': 'Order.'}]})
+
+    # A new cache over the same directory, as in the next process
+    assert ResponseCache(DirectoryBackend(tmp_path)).get(key) == {'segments': [{'speaker': 'Judge', 'text': 'Order.'}]}
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_directory_backend_evicts_the_least_recently_used_file(tmp_path):
+    backend = DirectoryBackend(tmp_path, max_entries=2)
+    backend.put('a', b'1')
+    backend.put('b', b'2')
+    os.utime(tmp_path / 'a.json', (1000, 1000))
+    os.utime(tmp_path / 'b.json', (2000, 2000))
+    backend.put('c', b'3')
+
+    assert sorted(path.name for path in tmp_path.glob('*.json')) == ['b.json', 'c.json']
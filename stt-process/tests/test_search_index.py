@@ -0,0 +1,87 @@
+import sys
+
+import pytest
+
+from local_aws import OUTPUT_BUCKET, ROOT, LocalS3, load_lambda
+
+
+@pytest.fixture
+def search_index():
+    store_app = load_lambda('store_app', ROOT / 'store')
+    return sys.modules[store_app.update_search_index.__module__]
+
+
+class RecordingS3(LocalS3):
+    """
+    Remembers the index shards read and written.
+    """
+    def __init__(self):
+        super().__init__()
+        self.shards_read = set()
+        self.shards_written = set()
+
+    def get_object(self, Bucket, Key, **kwargs):
+        if Key.endswith('.json.gz'):
+            self.shards_read.add(Key)
+        return super().get_object(Bucket=Bucket, Key=Key, **kwargs)
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        if Key.endswith('.json.gz'):
+            self.shards_written.add(Key)
+        return super().put_object(Bucket=Bucket, Key=Key, Body=Body, **kwargs)
+
+    def reset(self):
+        self.shards_read.clear()
+        self.shards_written.clear()
+
+
+def transcript(*texts):
+    return {'segments': [{'timestamp': str(position), 'text': text} for position, text in enumerate(texts)],
+            'entities': {}}
+
+
+def get_shard_keys(search_index, file_name, terms):
+    partition = search_index.get_partition(file_name)
+    return {search_index.get_shard_key(partition, search_index.get_shard(term)) for term in terms}
+
+
+def find_files(search_index, s3, file_name, term):
+    partition = search_index.get_partition(file_name)
+    key = search_index.get_shard_key(partition, search_index.get_shard(term))
+    shard, _ = search_index.read_shard(s3, OUTPUT_BUCKET, key)
+    return sorted(shard['terms'].get(term, {}))
+
+
+def test_update_touches_only_the_shards_of_the_file(search_index):
+    s3 = RecordingS3()
+
+    update = search_index.update_search_index(s3, OUTPUT_BUCKET, 'hearing', transcript('objection sustained'))
+
+    expected = get_shard_keys(search_index, 'hearing', ['objection', 'sustained'])
+    assert s3.shards_read == s3.shards_written == expected
+    assert update == {'shardsWritten': len(expected), 'conflicts': 0}
+
+
+def test_reindexed_file_drops_postings_from_shards_it_no_longer_uses(search_index):
+    s3 = RecordingS3()
+    search_index.update_search_index(s3, OUTPUT_BUCKET, 'hearing', transcript('objection sustained'))
+    s3.reset()
+
+    search_index.update_search_index(s3, OUTPUT_BUCKET, 'hearing', transcript('witness excused'))
+
+    expected = get_shard_keys(search_index, 'hearing', ['objection', 'sustained', 'witness', 'excused'])
+    assert s3.shards_read == expected
+    assert find_files(search_index, s3, 'hearing', 'objection') == []
+    assert find_files(search_index, s3, 'hearing', 'witness') == ['hearing']
+
+
+def test_files_sharing_a_partition_keep_their_postings(search_index):
+    s3 = RecordingS3()
+    search_index.update_search_index(s3, OUTPUT_BUCKET, 'hearing', transcript('objection sustained'))
+    other = next(name for name in (f"hearing-{number}" for number in range(100))
+                 if search_index.get_partition(name) == search_index.get_partition('hearing'))
+    search_index.update_search_index(s3, OUTPUT_BUCKET, other, transcript('objection overruled'))
+
+    search_index.update_search_index(s3, OUTPUT_BUCKET, 'hearing', transcript('witness excused'))
+
+    assert find_files(search_index, s3, 'hearing', 'objection') == [other]
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+import json
+
+from local_aws import OUTPUT_BUCKET, UPLOAD_BUCKET
+
+AUDIO = {'bucket': UPLOAD_BUCKET, 'key': 'deposition.mp3', 'etag': 'abc123'}
+
+
+def s3_event(audio_object):
+    return {'Records': [{
+        'eventSource': 'aws:s3',
+        's3': {'bucket': {'name': audio_object['bucket']},
+               'object': {'key': audio_object['key'], 'eTag': audio_object['etag']}}
+    }]}
+
+
+def read_job_state(s3):
+    return json.loads(s3.get_object(Bucket=OUTPUT_BUCKET, Key='jobs/deposition.json')['Body'].read())
+
+
+def age_job_state(s3, seconds):
+    record = read_job_state(s3)
+    record['updatedAt'] = (datetime.now(timezone.utc) - timedelta(seconds=seconds)).isoformat()
+    s3.put_object(Bucket=OUTPUT_BUCKET, Key='jobs/deposition.json', Body=json.dumps(record))
+
+
+def test_running_execution_is_not_started_again(start_app, sfn):
+    assert start_app.lambda_handler(s3_event(AUDIO), None) == {'started': 1, 'skipped': 0}
+    assert start_app.lambda_handler(s3_event(AUDIO), None) == {'started': 0, 'skipped': 1}
+    assert len(sfn.executions) == 1
+
+
+def test_dead_execution_is_retried_under_a_new_name(start_app, sfn, s3):
+    start_app.lambda_handler(s3_event(AUDIO), None)
+    first_arn = read_job_state(s3)['executionArn']
+    sfn.executions[first_arn]['status'] = 'TIMED_OUT'
+
+    assert start_app.lambda_handler(s3_event(AUDIO), None) == {'started': 1, 'skipped': 0}
+    record = read_job_state(s3)
+    assert record['executionArn'] != first_arn
+    assert record['executionAttempt'] == 1
+    # The retry is running, so a redelivery is skipped again
+    assert start_app.lambda_handler(s3_event(AUDIO), None) == {'started': 0, 'skipped': 1}
+
+
+def test_unknown_execution_is_retried_once_stale(start_app, sfn, s3):
+    start_app.prepare_execution(AUDIO, record_queued=True)  # Queued by the bulk workflow, never started
+
+    assert start_app.prepare_execution(AUDIO)['skip'] is True
+    age_job_state(s3, start_app.STALE_EXECUTION_SECONDS + 60)
+    execution = start_app.prepare_execution(AUDIO)
+    assert execution['skip'] is False
+    assert execution['attempt'] == 1
+
+
+def test_completed_job_is_skipped(start_app, s3):
+    start_app.prepare_execution(AUDIO, record_queued=True)
+    record = dict(read_job_state(s3), stage='COMPLETED', status='COMPLETED')
+    s3.put_object(Bucket=OUTPUT_BUCKET, Key='jobs/deposition.json', Body=json.dumps(record))
+    age_job_state(s3, start_app.STALE_EXECUTION_SECONDS + 60)
+
+    assert start_app.prepare_execution(AUDIO)['skip'] is True
+
+
+def test_new_upload_does_not_report_the_previous_run(start_app, s3):
+    start_app.lambda_handler(s3_event(AUDIO), None)
+    start_app.update_job_state(s3, 'deposition', 'FAILED', error='Transcription failed')
+
+    start_app.lambda_handler(s3_event(dict(AUDIO, etag='def456')), None)
+
+    record = read_job_state(s3)
+    assert (record['stage'], record['audioEtag']) == ('QUEUED', 'def456')
+    assert record['executionArn']  # Recorded by the same run once its execution started
+    assert 'error' not in record
+    assert list(record['stages']) == ['QUEUED']
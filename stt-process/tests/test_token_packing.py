@@ -0,0 +1,78 @@
+from array import array
+from types import SimpleNamespace
+import sys
+
+import pytest
+
+from local_aws import ROOT
+
+sys.path.insert(0, str(ROOT / 'enhance'))
+
+import token_packing
+from transcript_index import build_sorted_index
+
+
+@pytest.fixture
+def offline_tiktoken(monkeypatch):
+    def get_encoding(name):
+        raise ConnectionError(f"Could not download {name}")
+
+    monkeypatch.setattr(token_packing, 'tiktoken', SimpleNamespace(get_encoding=get_encoding))
+    token_packing.get_encoding.cache_clear()
+    token_packing.count_tokens.cache_clear()
+    token_packing.count_segment_tokens.cache_clear()
+    yield
+    token_packing.get_encoding.cache_clear()
+    token_packing.count_tokens.cache_clear()
+    token_packing.count_segment_tokens.cache_clear()
+
+
+def test_unloadable_encoding_falls_back_to_the_estimate(offline_tiktoken):
+    assert token_packing.get_encoding() is None
+    assert token_packing.count_tokens('x' * 30) == 11
+
+
+def build_segments(count, words_per_segment):
+    """
+    Returns `count` speaker segments of one-second words and their transcript index.
+    """
+    contents = [f"word{position}." for position in range(count * words_per_segment)]
+    segments = [{
+        'start_time': str(float(index * words_per_segment)),
+        'end_time': str(float((index + 1) * words_per_segment)),
+        'speaker_label': f"spk_{index % 2}"
+    } for index in range(count)]
+    start_times = array('d', (float(position) for position in range(len(contents))))
+    return segments, build_sorted_index(start_times, contents)
+
+
+def get_input_tokens(chunk, delta_output):
+    return sum(
+        token_packing.count_segment_tokens(entry['timestamp'], entry['speaker'], entry['text'], delta_output)[0]
+        for entry in chunk
+    )
+
+
+def test_delta_chunks_pack_up_to_the_input_limit(offline_tiktoken):
+    segments, transcript_index = build_segments(200, 100)
+
+    full_chunks = token_packing.pack_segments(segments, transcript_index, 20000, 4000)
+    delta_chunks = token_packing.pack_segments(segments, transcript_index, 20000, 4000, delta_output=True)
+
+    assert len(delta_chunks) < len(full_chunks)
+    assert all(get_input_tokens(chunk, True) <= 20000 for chunk in delta_chunks)
+    assert all(get_input_tokens(chunk, True) > 19000 for chunk in delta_chunks[:-1])
+
+
+def test_split_pieces_start_at_their_first_word(offline_tiktoken):
+    segments, transcript_index = build_segments(1, 1000)
+    transcript_index['start_times'] = array('d', (position / 3 for position in range(1000)))
+    segments[0]['end_time'] = '1000.0'
+
+    entries = token_packing.split_segment(segments[0], transcript_index, 1000, 10000)
+
+    assert len(entries) > 1
+    assert entries[0]['timestamp'] == '0.0'
+    for entry in entries[1:]:
+        first_word = int(entry['text'].split()[0][len('word'):-1])
+        assert entry['timestamp'] == f"{first_word / 3:.3f}"
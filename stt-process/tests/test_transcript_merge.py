@@ -0,0 +1,81 @@
+import sys
+
+from local_aws import ROOT
+
+sys.path.insert(0, str(ROOT / 'transcribe'))
+
+from transcript_merge import merge_transcripts
+
+
+def make_part(offset, words, speakers):
+    """
+    Returns a part as a Transcribe job over the window starting at `offset` would
+    report it: one-second words given as (start on the recording, content, local
+    speaker), with times relative to the window.
+    """
+    items = []
+    segments = []
+    for start, content, speaker in words:
+        times = {'start_time': f"{start - offset:.3f}", 'end_time': f"{start - offset + 1:.3f}"}
+        items.append(dict(times, type='pronunciation', speaker_label=speaker, alternatives=[{'content': content}]))
+        if not segments or segments[-1]['speaker_label'] != speaker:
+            segments.append(dict(times, speaker_label=speaker, items=[]))
+        segments[-1]['end_time'] = times['end_time']
+        segments[-1]['items'].append(dict(times, speaker_label=speaker))
+    return {'offset': offset, 'transcript': {
+        'results': {'items': items, 'speaker_labels': {'speakers': speakers, 'segments': segments}}
+    }}
+
+
+def get_words(merged):
+    return [(item['start_time'], item['alternatives'][0]['content']) for item in merged['results']['items']]
+
+
+def get_speakers(merged):
+    return {item['alternatives'][0]['content']: item['speaker_label'] for item in merged['results']['items']}
+
+
+def test_overlapping_parts_are_rebased_and_cut_once():
+    first = make_part(0, [(second, f"w{second}", 'spk_0') for second in range(10)], 1)
+    second = make_part(8, [(second, f"w{second}", 'spk_0') for second in range(8, 16)], 1)
+
+    merged = merge_transcripts([first, second], 'stt-hearing')
+
+    assert get_words(merged) == [(f"{second:.3f}", f"w{second}") for second in range(16)]
+    assert merged['results']['transcripts'][0]['transcript'] == ' '.join(f"w{second}" for second in range(16))
+    assert len(merged['results']['speaker_labels']['segments']) == 1
+
+
+def test_speakers_are_matched_by_the_overlap():
+    first = make_part(0, [(second, f"w{second}", f"spk_{second % 2}") for second in range(10)], 2)
+    # The second job labels the same two people the other way round
+    second = make_part(8, [(second, f"w{second}", f"spk_{1 - second % 2}") for second in range(8, 16)], 2)
+
+    speakers = get_speakers(merge_transcripts([first, second]))
+
+    assert speakers == {f"w{second}": f"spk_{second % 2}" for second in range(16)}
+
+
+def test_speaker_missing_from_the_overlap_becomes_a_new_speaker():
+    first = make_part(0, [(second, f"w{second}", 'spk_0') for second in range(10)], 1)
+    second = make_part(8, [(second, f"w{second}", 'spk_1' if second < 12 else 'spk_0') for second in range(8, 16)], 2)
+
+    merged = merge_transcripts([first, second])
+    speakers = get_speakers(merged)
+
+    assert {speakers[f"w{second}"] for second in range(12)} == {'spk_0'}
+    assert {speakers[f"w{second}"] for second in range(12, 16)} == {'spk_1'}
+    assert merged['results']['speaker_labels']['speakers'] == 2
+
+
+def test_speaker_missing_from_the_overlap_takes_a_known_speaker():
+    # Both speakers were already heard, so a third label can't be a new person
+    first = make_part(0, [(second, f"w{second}", 'spk_0' if second < 4 else 'spk_1') for second in range(10)], 2)
+    second = make_part(8, [(second, f"w{second}", 'spk_1' if second < 12 else 'spk_0') for second in range(8, 16)], 2)
+
+    merged = merge_transcripts([first, second])
+    speakers = get_speakers(merged)
+
+    assert {speakers[f"w{second}"] for second in range(4, 12)} == {'spk_1'}
+    assert {speakers[f"w{second}"] for second in range(12, 16)} == {'spk_0'}
+    assert merged['results']['speaker_labels']['speakers'] == 2
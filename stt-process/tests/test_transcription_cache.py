@@ -0,0 +1,56 @@
+from local_aws import OUTPUT_BUCKET, UPLOAD_BUCKET, read_transcript_text
+
+
+def upload(s3, name, audio):
+    s3.put_object(Bucket=UPLOAD_BUCKET, Key=f"{name}.mp3", Body=audio)
+    return {'bucket': UPLOAD_BUCKET, 'key': f"{name}.mp3"}
+
+
+def transcribe_file(app, transcribe, s3, name, audio):
+    """
+    Runs one upload through the transcription step, polling until it completes,
+    and returns the final output and the transcript text it points at.
+    """
+    output = app.lambda_handler(upload(s3, name, audio), None)
+    if output['transcriptionJobStatus'] != 'COMPLETED':
+        transcribe.complete(output['transcriptionJobName'])
+        output = app.lambda_handler(output, None)
+    assert output['transcriptionJobStatus'] == 'COMPLETED'
+    return output, read_transcript_text(s3, output['bucket'], output['key'])
+
+
+def test_identical_audio_reuses_the_transcript(transcribe_app, transcribe, s3):
+    _, first = transcribe_file(transcribe_app, transcribe, s3, 'a', 'audio1')
+    output, second = transcribe_file(transcribe_app, transcribe, s3, 'b', 'audio1')
+
+    assert output['cached'] is True
+    assert output['key'] == 'stt-b.json'
+    assert second == first == 'audio1'
+    assert transcribe.started == ['stt-a']
+
+
+def test_reprocessed_file_does_not_change_cached_transcripts(transcribe_app, transcribe, s3):
+    transcribe_file(transcribe_app, transcribe, s3, 'a', 'audio1')
+    transcribe_file(transcribe_app, transcribe, s3, 'b', 'audio2')
+    # A cache hit overwrites stt-a.json with the transcript of audio2
+    _, reprocessed = transcribe_file(transcribe_app, transcribe, s3, 'a', 'audio2')
+    output, transcript = transcribe_file(transcribe_app, transcribe, s3, 'c', 'audio1')
+
+    assert reprocessed == 'audio2'
+    assert output['cached'] is True
+    assert transcript == 'audio1'
+    assert transcribe.started == ['stt-a', 'stt-b']
+
+
+def test_output_rewritten_after_completion_is_not_cached(transcribe_app, transcribe, s3):
+    output = transcribe_app.lambda_handler(upload(s3, 'a', 'audio1'), None)
+    transcribe.complete(output['transcriptionJobName'], completed_ago=60)
+    transcribe_app.lambda_handler(output, None)
+
+    assert not s3.list_objects_v2(Bucket=OUTPUT_BUCKET, Prefix='cache/')['Contents']
+    transcribe_file(transcribe_app, transcribe, s3, 'b', 'audio1')
+    assert transcribe.started == ['stt-a', 'stt-b']
+
+
+def test_cache_disabled_without_audio_hash(transcribe_app, s3):
+    assert transcribe_app.lookup_transcription(s3, OUTPUT_BUCKET, None, {}) is None
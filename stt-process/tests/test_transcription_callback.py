@@ -0,0 +1,109 @@
+from local_aws import OUTPUT_BUCKET, UPLOAD_BUCKET, load_event
+
+JOB_NAME = 'stt-sample-deposition'
+POLL_STATS_KEY = 'stats/transcribe-throughput.json'
+
+
+def start_job(app, s3):
+    s3.put_object(Bucket=UPLOAD_BUCKET, Key='sample-deposition.mp3', Body='x' * 160000)
+    return app.lambda_handler({'bucket': UPLOAD_BUCKET, 'key': 'sample-deposition.mp3'}, None)
+
+
+def callback_payload(output, task_token):
+    """
+    The payload WaitForTranscriptionCallback builds from the start output.
+    """
+    fields = ('transcriptionJobName', 'fileName', 'audioHash', 'settings', 'mediaDuration')
+    return dict({field: output[field] for field in fields}, taskToken=task_token)
+
+
+def test_completion_handler_records_the_processing_ratio(transcribe_app, transcribe, s3, sfn):
+    output = start_job(transcribe_app, s3)
+    assert output['mediaDuration'] == 10
+    transcribe_app.lambda_handler(callback_payload(output, 'token-1'), None)
+
+    transcribe.complete(JOB_NAME)
+    transcribe_app.completion_handler(load_event('transcribe-job-state-change.json'), None)
+
+    assert sfn.outputs[0][0] == 'token-1'
+    assert sfn.outputs[0][1]['transcriptionJobStatus'] == 'COMPLETED'
+    assert s3.head_object(Bucket=OUTPUT_BUCKET, Key=POLL_STATS_KEY)
+
+
+def test_registration_after_completion_records_the_processing_ratio(transcribe_app, transcribe, s3, sfn):
+    output = start_job(transcribe_app, s3)
+    transcribe.complete(JOB_NAME)
+
+    resumed = transcribe_app.lambda_handler(callback_payload(output, 'token-1'), None)
+
+    assert resumed['transcriptionJobStatus'] == 'COMPLETED'
+    assert sfn.outputs == [('token-1', resumed)]
+    assert s3.head_object(Bucket=OUTPUT_BUCKET, Key=POLL_STATS_KEY)
+
+
+def test_output_object_resumes_the_execution(transcribe_app, transcribe, s3, sfn):
+    output = start_job(transcribe_app, s3)
+    transcribe_app.lambda_handler(callback_payload(output, 'token-1'), None)
+
+    transcribe.complete(JOB_NAME)
+    transcribe_app.completion_handler(load_event('transcript-object-created.json'), None)
+
+    assert [token for token, _ in sfn.outputs] == ['token-1']
+    assert sfn.outputs[0][1]['key'] == f"{JOB_NAME}.json"
+
+
+def test_completion_before_registration_resumes_on_registration(transcribe_app, transcribe, s3, sfn):
+    output = start_job(transcribe_app, s3)
+    transcribe.complete(JOB_NAME)
+    transcribe_app.completion_handler(load_event('transcribe-job-state-change.json'), None)
+    assert sfn.outputs == []
+
+    transcribe_app.lambda_handler(callback_payload(output, 'token-1'), None)
+
+    assert [token for token, _ in sfn.outputs] == ['token-1']
+
+
+def test_completion_during_registration_resumes_once(transcribe_app, transcribe, s3, sfn):
+    output = start_job(transcribe_app, s3)
+    get_transcription_job = transcribe.get_transcription_job
+    raced = []
+
+    def complete_while_registering(**kwargs):
+        # The job finishes and its event is handled between the token being
+        # registered and the registration checking the job
+        if not raced:
+            raced.append(True)
+            transcribe.complete(JOB_NAME)
+            transcribe_app.completion_handler(load_event('transcribe-job-state-change.json'), None)
+        return get_transcription_job(**kwargs)
+
+    transcribe.get_transcription_job = complete_while_registering
+    transcribe_app.lambda_handler(callback_payload(output, 'token-1'), None)
+
+    assert [token for token, _ in sfn.outputs] == ['token-1']
+    assert not s3.list_objects_v2(Bucket=OUTPUT_BUCKET, Prefix='task-tokens/')['Contents']
+
+
+def test_completed_job_names_from_events(transcribe_app):
+    assert transcribe_app.get_completed_job_names(load_event('transcribe-job-state-change.json')) == [JOB_NAME]
+    assert transcribe_app.get_completed_job_names(load_event('transcript-object-created.json')) == [JOB_NAME]
+
+    in_progress = load_event('transcribe-job-state-change.json')
+    in_progress['detail']['TranscriptionJobStatus'] = 'IN_PROGRESS'
+    assert transcribe_app.get_completed_job_names(in_progress) == []
+
+
+def test_only_transcribe_output_keys_complete_a_job(transcribe_app):
+    event = load_event('transcript-object-created.json')
+    keys = [
+        'stt-sample-deposition_enhanced.json',
+        'stt-sample-deposition_enhanced.index.json',
+        'jobs/sample-deposition.json',
+        'task-tokens/stt-sample-deposition.json',
+        'cache/transcribe/etag-abc-123.transcript.json',
+        'parts/sample-deposition/stt-sample-deposition-part-0.json',
+        'sample-deposition.json'
+    ]
+    event['Records'] = [dict(event['Records'][0], s3={'object': {'key': key}}) for key in keys]
+
+    assert transcribe_app.get_completed_job_names(event) == []
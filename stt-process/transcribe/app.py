@@ -1,3 +1,12 @@
+from job_state import get_file_name, get_file_name_from_job, update_job_state
+from metrics import Metrics
+from task_tokens import pop_task_token, register_task_token
+from transcription_cache import get_audio_hash, lookup_transcription, seal_transcription
+from long_audio import (LONG_AUDIO_THRESHOLD_SECONDS, get_media_duration, get_media_url, is_long_audio_available,
+                        plan_windows, split_audio)
+from transcript_merge import merge_transcripts
+from poll_schedule import estimate_media_duration, get_next_wait_seconds, read_processing_ratio, record_completed_job
+from botocore.exceptions import ClientError
 import boto3
 import json
 import uuid
@@ -5,10 +14,13 @@ from urllib.parse import urlparse, parse_qs
 from datetime import datetime
 import os
 
+metrics = Metrics('transcribe')
 
+
+@metrics.instrument_handler
 def lambda_handler(event, context):
     transcribe = boto3.client('transcribe')
-    s3 = boto3.client('s3')
+    s3 = metrics.instrument_s3(boto3.client('s3'))
     
     try:
         if 'transcriptionJobName' not in event:
@@ -16,23 +28,34 @@ def lambda_handler(event, context):
             if 'bucket' not in event or 'key' not in event:
                 raise Exception('Missing config')
             
+            file_name = get_file_name(event['key'])
+            output_bucket = get_output_bucket()
+            settings = get_transcription_settings(event['key'])
+
+            # Reuse the transcript of identical audio instead of transcribing it again
+            audio_hash = get_audio_hash(s3, event['bucket'], event['key'], event.get('etag'))
+            cached = lookup_transcription(s3, output_bucket, audio_hash, settings)
+            if cached:
+                metrics.count('TranscriptionCacheHits')
+                return reuse_transcription(s3, cached, file_name)
+
+            # Long recordings are transcribed as parallel jobs over overlapping windows
+            duration = None
+            if is_long_audio_available():
+                media_url = get_media_url(s3, event['bucket'], event['key'])
+                duration = get_media_duration(media_url)
+                if duration and duration > LONG_AUDIO_THRESHOLD_SECONDS:
+                    return start_split_transcription(
+                        transcribe, s3, media_url, event['key'], file_name, duration, settings, audio_hash)
+            duration = duration or estimate_media_duration(s3, event['bucket'], event['key'])
+
             # Generate the base job name
             base_job_name = f"stt-{event['key'].rsplit('.', 1)[0]}"
             job_name = base_job_name
 
             try:
                 # Try to start a new transcription job with the base name
-                response = transcribe.start_transcription_job(
-                    TranscriptionJobName=job_name,
-                    Media={'MediaFileUri': f"s3://{event['bucket']}/{event['key']}"},  # Use full key with extension
-                    MediaFormat=event['key'].rsplit('.', 1)[-1],  # Use the actual file extension as the format (m4a or mp3)
-                    LanguageCode='en-US',
-                    OutputBucketName=os.environ['S3_TRANSCRIPTION_OUTPUT'][0] if isinstance(os.environ['S3_TRANSCRIPTION_OUTPUT'], list) else os.environ['S3_TRANSCRIPTION_OUTPUT'],                        
-                    Settings={
-                        'ShowSpeakerLabels': True,
-                        'MaxSpeakerLabels': 10
-                    }
-                )
+                start_transcription_job(transcribe, job_name, event['bucket'], event['key'], settings)
 
             except transcribe.exceptions.ConflictException:
                 # If the job name already exists, check its status
@@ -45,59 +68,330 @@ def lambda_handler(event, context):
                     job_name = f"{base_job_name}-{unique_id}"
 
                     # Start a new transcription job with the unique name
-                    response = transcribe.start_transcription_job(
-                        TranscriptionJobName=job_name,
-                        Media={'MediaFileUri': f"s3://{event['bucket']}/{event['key']}"},  # Use full key with extension
-                        MediaFormat=event['key'].rsplit('.', 1)[-1],  # Use the actual file extension as the format (m4a or mp3)
-                        LanguageCode='en-US',
-                        OutputBucketName=os.environ['S3_TRANSCRIPTION_OUTPUT'][0] if isinstance(os.environ['S3_TRANSCRIPTION_OUTPUT'], list) else os.environ['S3_TRANSCRIPTION_OUTPUT'],                        
-                        Settings={
-                            'ShowSpeakerLabels': True,
-                            'MaxSpeakerLabels': 10
-                        }
-                    )
+                    start_transcription_job(transcribe, job_name, event['bucket'], event['key'], settings)
                 else:
-                    # If the existing job is completed or failed, delete it and start a new one with the base name
+                    # A finished job holds this name: delete it and start a new one
+                    # with the base name
                     transcribe.delete_transcription_job(TranscriptionJobName=job_name)
-                    response = transcribe.start_transcription_job(
-                        TranscriptionJobName=job_name,
-                        Media={'MediaFileUri': f"s3://{event['bucket']}/{event['key']}"},  # Use full key with extension
-                        MediaFormat=event['key'].rsplit('.', 1)[-1],  # Use the actual file extension as the format (m4a or mp3)
-                        LanguageCode='en-US',
-                        OutputBucketName=os.environ['S3_TRANSCRIPTION_OUTPUT'][0] if isinstance(os.environ['S3_TRANSCRIPTION_OUTPUT'], list) else os.environ['S3_TRANSCRIPTION_OUTPUT'],                        
-                        Settings={
-                            'ShowSpeakerLabels': True,
-                            'MaxSpeakerLabels': 10
-                        }
-                    )
-            
-            return {'transcriptionJobName': job_name, 'transcriptionJobStatus': 'IN_PROGRESS'}
+                    start_transcription_job(transcribe, job_name, event['bucket'], event['key'], settings)
+
+            metrics.count('TranscriptionJobsStarted')
+            update_job_state(s3, file_name, 'TRANSCRIBING', jobName=job_name)
+
+            return {
+                'transcriptionJobName': job_name,
+                'transcriptionJobStatus': 'IN_PROGRESS',
+                'fileName': file_name,
+                # Carried to whichever step sees the job complete, which caches the transcript
+                'audioHash': audio_hash,
+                'settings': settings,
+                'mediaDuration': duration,
+                'pollAttempt': 0,
+                'nextWaitSeconds': get_next_wait_seconds(duration, 0, 0, read_processing_ratio(s3, output_bucket))
+            }
         
+        elif 'taskToken' in event:
+            # Callback mode: park the execution until the job finishes
+            return register_transcription_callback(transcribe, s3, event)
+
+        elif 'parts' in event:
+            # Check the status of a split transcription
+            return get_split_transcription_status(transcribe, s3, event)
+
         else:
             # Check the status of an existing job
             job_name = event['transcriptionJobName']
-            response = transcribe.get_transcription_job(TranscriptionJobName=job_name)
-            status = response['TranscriptionJob']['TranscriptionJobStatus']
-            
-            if status == 'COMPLETED':
-                # Generate the S3 key for the transcript
-                output_bucket = os.environ['S3_TRANSCRIPTION_OUTPUT']
-                if isinstance(output_bucket, list):
-                    output_bucket = output_bucket[0]  # Take the first element if it's a list
-                output_key = f"{job_name}.json"
-                
-                return {
-                    'transcriptionJobName': job_name,
-                    'transcriptionJobStatus': status,
-                    'bucket': output_bucket,  # This is now a string, not a list
-                    'key': output_key
-                }
-            else:
-                return {
-                    'transcriptionJobName': job_name,
-                    'transcriptionJobStatus': status
-                }
+            file_name = event.get('fileName') or get_file_name_from_job(job_name)
+            return get_transcription_status(transcribe, s3, job_name, file_name,
+                                            event.get('mediaDuration'), event.get('pollAttempt', 0),
+                                            event.get('audioHash'), event.get('settings'))
 
     except Exception as e:
         print(f"Exception: {e}")
-        raise e
\ No newline at end of file
+        raise e
+
+
+def get_output_bucket():
+    output_bucket = os.environ['S3_TRANSCRIPTION_OUTPUT']
+    return output_bucket[0] if isinstance(output_bucket, list) else output_bucket
+
+
+def get_transcription_settings(key):
+    """
+    Returns the Transcribe settings for an audio key; they are also part of the
+    transcription cache key.
+    """
+    return {
+        'MediaFormat': key.rsplit('.', 1)[-1],  # Use the actual file extension as the format (m4a or mp3)
+        'LanguageCode': 'en-US',
+        'Settings': {
+            'ShowSpeakerLabels': True,
+            'MaxSpeakerLabels': 10
+        }
+    }
+
+
+def start_transcription_job(transcribe, job_name, bucket, key, settings):
+    return transcribe.start_transcription_job(
+        TranscriptionJobName=job_name,
+        Media={'MediaFileUri': f"s3://{bucket}/{key}"},  # Use full key with extension
+        OutputBucketName=get_output_bucket(),
+        **settings
+    )
+
+
+def reuse_transcription(s3, cached, file_name):
+    """
+    Completes the transcription step from a cached transcript. The transcript is
+    copied to this file's own job key so later stages write their results under
+    this file rather than the one first transcribed.
+    """
+    job_name = f"stt-{file_name}"
+    output_key = f"{job_name}.json"
+    s3.copy_object(
+        Bucket=cached['bucket'],
+        Key=output_key,
+        CopySource={'Bucket': cached['bucket'], 'Key': cached['key']},
+        CopySourceIfMatch=cached['etag']
+    )
+    print(f"Reusing transcript of {cached['jobName']} for {file_name}")
+
+    update_job_state(s3, file_name, 'TRANSCRIBED', jobName=job_name, cachedFrom=cached['jobName'],
+                     transcriptLocation={'bucket': cached['bucket'], 'key': output_key})
+
+    return {
+        'transcriptionJobName': job_name,
+        'transcriptionJobStatus': 'COMPLETED',
+        'bucket': cached['bucket'],
+        'key': output_key,
+        'fileName': file_name,
+        'cached': True
+    }
+
+
+def get_poll_fields(s3, media_duration, attempt, created_at):
+    """
+    Returns the fields the workflow's polling loop reads: `nextWaitSeconds` is the
+    Wait state's SecondsPath, the others are carried to the next poll.
+    """
+    elapsed = (datetime.now(created_at.tzinfo) - created_at).total_seconds()
+    return {
+        'mediaDuration': media_duration,
+        'pollAttempt': attempt + 1,
+        'nextWaitSeconds': get_next_wait_seconds(
+            media_duration, elapsed, attempt + 1, read_processing_ratio(s3, get_output_bucket()))
+    }
+
+
+def get_transcription_status(transcribe, s3, job_name, file_name, media_duration=None, attempt=0,
+                             audio_hash=None, settings=None):
+    """
+    Returns the state machine output for the current status of a transcription job.
+    A completed job's transcript is added to the transcription cache under `audio_hash`.
+    """
+    response = transcribe.get_transcription_job(TranscriptionJobName=job_name)
+    status = response['TranscriptionJob']['TranscriptionJobStatus']
+    metrics.count('StatusPolls')
+    metrics.debug("Transcription job", response['TranscriptionJob'])
+    
+    if status == 'COMPLETED':
+        # Generate the S3 key for the transcript
+        output_bucket = get_output_bucket()
+        output_key = f"{job_name}.json"
+        record_completed_job(s3, output_bucket, media_duration, response['TranscriptionJob'])
+        cache_transcription(s3, output_bucket, audio_hash, settings, job_name, output_key,
+                            completed_at=response['TranscriptionJob'].get('CompletionTime'))
+
+        update_job_state(s3, file_name, 'TRANSCRIBED', jobName=job_name,
+                         transcriptLocation={'bucket': output_bucket, 'key': output_key})
+        
+        return {
+            'transcriptionJobName': job_name,
+            'transcriptionJobStatus': status,
+            'bucket': output_bucket,  # This is now a string, not a list
+            'key': output_key,
+            'fileName': file_name
+        }
+    else:
+        if status == 'FAILED':
+            update_job_state(s3, file_name, 'FAILED', jobName=job_name,
+                             error=response['TranscriptionJob'].get('FailureReason', 'Transcription failed'))
+
+        output = {
+            'transcriptionJobName': job_name,
+            'transcriptionJobStatus': status,
+            'fileName': file_name,
+            'audioHash': audio_hash,
+            'settings': settings
+        }
+        return dict(output, **get_poll_fields(s3, media_duration, attempt, response['TranscriptionJob']['CreationTime']))
+
+
+def cache_transcription(s3, bucket, audio_hash, settings, job_name, output_key, completed_at=None, etag=None):
+    """
+    Adds a finished transcript to the transcription cache. A failure only costs
+    the cache hit, so it does not fail the transcription.
+    """
+    try:
+        seal_transcription(s3, bucket, audio_hash, settings, job_name, output_key, completed_at, etag)
+    except ClientError as e:
+        print(f"Warning: could not cache the transcript of {job_name}: {e}")
+
+
+def start_split_transcription(transcribe, s3, media_url, key, file_name, duration, settings, audio_hash):
+    """
+    Splits the recording into overlapping windows and starts a Transcribe job per
+    window. Each job diarizes up to MaxSpeakerLabels speakers of its own window.
+    """
+    windows = plan_windows(duration)
+    parts = split_audio(s3, media_url, get_output_bucket(), file_name, key.rsplit('.', 1)[-1], windows)
+
+    for part in parts:
+        try:
+            start_transcription_job(transcribe, part['jobName'], part['bucket'], part['key'], settings)
+        except transcribe.exceptions.ConflictException:
+            # Left over from an earlier split of the same file
+            transcribe.delete_transcription_job(TranscriptionJobName=part['jobName'])
+            start_transcription_job(transcribe, part['jobName'], part['bucket'], part['key'], settings)
+
+    job_name = f"stt-{file_name}"
+    metrics.count('TranscriptionJobsStarted', len(parts))
+    print(f"Started {len(parts)} part jobs for {duration:.0f}s of audio")
+    update_job_state(s3, file_name, 'TRANSCRIBING', jobName=job_name, partCount=len(parts))
+
+    return {
+        'transcriptionJobName': job_name,
+        'transcriptionJobStatus': 'IN_PROGRESS',
+        'fileName': file_name,
+        'parts': [{'jobName': part['jobName'], 'offset': part['offset']} for part in parts],
+        'audioHash': audio_hash,
+        'settings': settings,
+        # The parts run in parallel, so polling follows the longest window
+        'mediaDuration': max(length for _, length in windows),
+        'pollAttempt': 0,
+        'nextWaitSeconds': get_next_wait_seconds(
+            max(length for _, length in windows), 0, 0, read_processing_ratio(s3, get_output_bucket()))
+    }
+
+
+def get_split_transcription_status(transcribe, s3, event):
+    """
+    Returns the state machine output for a split transcription. Once every part
+    has completed, their results are merged into the transcript a single job
+    would have written.
+    """
+    job_name = event['transcriptionJobName']
+    file_name = event.get('fileName') or get_file_name_from_job(job_name)
+    parts = event['parts']
+    output = {key: event[key] for key in ('transcriptionJobName', 'fileName', 'parts', 'audioHash', 'settings')
+              if key in event}
+
+    completed = 0
+    created_at = None
+    metrics.count('StatusPolls', len(parts))
+    for part in parts:
+        response = transcribe.get_transcription_job(TranscriptionJobName=part['jobName'])
+        status = response['TranscriptionJob']['TranscriptionJobStatus']
+        created_at = created_at or response['TranscriptionJob']['CreationTime']
+        if status == 'FAILED':
+            update_job_state(s3, file_name, 'FAILED', jobName=job_name,
+                             error=response['TranscriptionJob'].get('FailureReason', 'Transcription failed'))
+            return dict(output, transcriptionJobStatus='FAILED')
+        completed += status == 'COMPLETED'
+
+    if completed < len(parts):
+        update_job_state(s3, file_name, 'TRANSCRIBING', jobName=job_name,
+                         percent=10 + 30 * completed // len(parts))
+        return dict(output, transcriptionJobStatus='IN_PROGRESS', **get_poll_fields(
+            s3, event.get('mediaDuration'), event.get('pollAttempt', 0), created_at))
+
+    output_bucket = get_output_bucket()
+    output_key = f"{job_name}.json"
+    part_transcripts = []
+    for part in parts:
+        content = s3.get_object(Bucket=output_bucket, Key=f"{part['jobName']}.json")['Body'].read()
+        with metrics.span('ParseTime'):
+            part_transcripts.append({'offset': part['offset'], 'transcript': json.loads(content)})
+    with metrics.span('MergeTime'):
+        merged = merge_transcripts(part_transcripts, job_name=job_name)
+    merged_object = s3.put_object(Bucket=output_bucket, Key=output_key, Body=json.dumps(merged),
+                                  ContentType='application/json')
+    cache_transcription(s3, output_bucket, event.get('audioHash'), event.get('settings'), job_name, output_key,
+                        etag=merged_object['ETag'])
+    update_job_state(s3, file_name, 'TRANSCRIBED', jobName=job_name,
+                     transcriptLocation={'bucket': output_bucket, 'key': output_key})
+
+    return dict(output, transcriptionJobStatus='COMPLETED', bucket=output_bucket, key=output_key)
+
+
+def register_transcription_callback(transcribe, s3, event):
+    """
+    Registers the execution's task token against the job name. If the job already
+    finished before the token was registered, the execution is resumed right away.
+    """
+    job_name = event['transcriptionJobName']
+    file_name = event.get('fileName') or get_file_name_from_job(job_name)
+    register_task_token(s3, job_name, event['taskToken'], fileName=file_name, mediaDuration=event.get('mediaDuration'),
+                        audioHash=event.get('audioHash'), settings=event.get('settings'))
+
+    output = get_transcription_status(transcribe, s3, job_name, file_name, event.get('mediaDuration'),
+                                      audio_hash=event.get('audioHash'), settings=event.get('settings'))
+    if output['transcriptionJobStatus'] in ('COMPLETED', 'FAILED'):
+        token_record = pop_task_token(s3, job_name)
+        if token_record:
+            send_task_output(token_record['taskToken'], output)
+
+    return output
+
+
+@metrics.instrument_handler
+def completion_handler(event, context):
+    """
+    Resumes the execution waiting for a transcription job. Triggered by the
+    "Transcribe Job State Change" EventBridge event or by the transcript object
+    landing in the output bucket.
+    """
+    transcribe = boto3.client('transcribe')
+    s3 = metrics.instrument_s3(boto3.client('s3'))
+
+    for job_name in get_completed_job_names(event):
+        token_record = pop_task_token(s3, job_name)
+        if not token_record:
+            print(f"No execution waiting for job {job_name}")
+            continue
+
+        output = get_transcription_status(
+            transcribe, s3, job_name, token_record.get('fileName') or get_file_name_from_job(job_name),
+            token_record.get('mediaDuration'), audio_hash=token_record.get('audioHash'), settings=token_record.get('settings'))
+        send_task_output(token_record['taskToken'], output)
+        print(f"Resumed execution for job {job_name} with status {output['transcriptionJobStatus']}")
+
+
+def get_completed_job_names(event):
+    """
+    Returns the job names a completion event refers to.
+    """
+    if event.get('source') == 'aws.transcribe':
+        detail = event.get('detail', {})
+        if detail.get('TranscriptionJobStatus') in ('COMPLETED', 'FAILED'):
+            return [detail['TranscriptionJobName']]
+        return []
+
+    job_names = []
+    for record in event.get('Records', []):
+        key = record['s3']['object']['key']
+        # Only Transcribe output objects (stt-<name>.json at the bucket root) complete a job,
+        # not the enhanced result and its sidecar index written next to them
+        if (key.startswith('stt-') and key.endswith('.json') and '/' not in key
+                and not key.endswith(('_enhanced.json', '_enhanced.index.json'))):
+            job_names.append(key[:-len('.json')])
+    return job_names
+
+
+def send_task_output(task_token, output):
+    sfn = boto3.client('stepfunctions')
+    try:
+        sfn.send_task_success(taskToken=task_token, output=json.dumps(output))
+    except (sfn.exceptions.InvalidToken, sfn.exceptions.TaskTimedOut, sfn.exceptions.TaskDoesNotExist) as e:
+        # The execution already moved on, e.g. to the polling fallback
+        print(f"Task token no longer valid: {e}")
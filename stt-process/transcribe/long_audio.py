@@ -0,0 +1,93 @@
+"""
+Long-audio mode: transcribes long recordings as parallel Transcribe jobs.
+
+The recording is cut into overlapping windows with ffmpeg (stream copy, no
+re-encoding), each window is transcribed as its own job, and the per-part
+results are merged by transcript_merge once every job has finished. ffmpeg and
+ffprobe are expected on the Lambda's PATH or at FFMPEG_PATH/FFPROBE_PATH,
+typically from a layer; without them every file is transcribed as one job.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shutil
+import subprocess
+import tempfile
+
+# Recordings longer than this are split; 0 disables long-audio mode
+LONG_AUDIO_THRESHOLD_SECONDS = float(os.environ.get('LONG_AUDIO_THRESHOLD_SECONDS', '5400'))
+LONG_AUDIO_WINDOW_SECONDS = float(os.environ.get('LONG_AUDIO_WINDOW_SECONDS', '1800'))
+LONG_AUDIO_OVERLAP_SECONDS = float(os.environ.get('LONG_AUDIO_OVERLAP_SECONDS', '120'))
+LONG_AUDIO_PARTS_PREFIX = os.environ.get('LONG_AUDIO_PARTS_PREFIX', 'parts/')
+LONG_AUDIO_SPLIT_CONCURRENCY = int(os.environ.get('LONG_AUDIO_SPLIT_CONCURRENCY', '4'))
+FFMPEG_PATH = os.environ.get('FFMPEG_PATH', 'ffmpeg')
+FFPROBE_PATH = os.environ.get('FFPROBE_PATH', 'ffprobe')
+
+
+def plan_windows(duration, window_seconds=None, overlap_seconds=None):
+    """
+    Returns the (start, length) windows covering `duration` seconds, each
+    overlapping the next by `overlap_seconds`.
+    """
+    window_seconds = window_seconds or LONG_AUDIO_WINDOW_SECONDS
+    overlap_seconds = LONG_AUDIO_OVERLAP_SECONDS if overlap_seconds is None else overlap_seconds
+    if overlap_seconds >= window_seconds:
+        raise ValueError('The overlap must be shorter than the window')
+
+    windows = []
+    start = 0.0
+    while True:
+        length = min(window_seconds, duration - start)
+        windows.append((start, length))
+        if start + length >= duration:
+            return windows
+        start += window_seconds - overlap_seconds
+
+
+def is_long_audio_available():
+    return LONG_AUDIO_THRESHOLD_SECONDS > 0 and bool(shutil.which(FFMPEG_PATH)) and bool(shutil.which(FFPROBE_PATH))
+
+
+def get_media_url(s3, bucket, key):
+    return s3.generate_presigned_url('get_object', Params={'Bucket': bucket, 'Key': key}, ExpiresIn=3600)
+
+
+def get_media_duration(media_url):
+    """
+    Returns the duration of the media in seconds, or None if ffprobe can't tell.
+    """
+    try:
+        output = subprocess.run(
+            [FFPROBE_PATH, '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', media_url],
+            capture_output=True, text=True, timeout=60, check=True
+        ).stdout
+        return float(output.strip())
+    except (subprocess.SubprocessError, ValueError, OSError) as e:
+        print(f"Could not read media duration: {e}")
+        return None
+
+
+def get_part_job_name(file_name, index):
+    return f"stt-{file_name}-part-{index:03d}"
+
+
+def split_audio(s3, media_url, output_bucket, file_name, extension, windows):
+    """
+    Cuts the windows out of the media and uploads them to
+    s3://<output_bucket>/<LONG_AUDIO_PARTS_PREFIX><fileName>/part-NNN.<ext>.
+    Returns the parts as {'jobName', 'offset', 'bucket', 'key'}.
+    """
+    def cut(index):
+        start, length = windows[index]
+        key = f"{LONG_AUDIO_PARTS_PREFIX}{file_name}/part-{index:03d}.{extension}"
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f"part.{extension}")
+            subprocess.run(
+                [FFMPEG_PATH, '-v', 'error', '-ss', str(start), '-t', str(length),
+                 '-i', media_url, '-c', 'copy', '-y', path],
+                check=True, timeout=600
+            )
+            s3.upload_file(path, output_bucket, key)
+        return {'jobName': get_part_job_name(file_name, index), 'offset': start, 'bucket': output_bucket, 'key': key}
+
+    with ThreadPoolExecutor(max_workers=LONG_AUDIO_SPLIT_CONCURRENCY) as executor:
+        return list(executor.map(cut, range(len(windows))))
@@ -0,0 +1,96 @@
+"""
+Adaptive wait between Transcribe status polls.
+
+The expected processing time of a job is a fixed startup time plus the media
+duration times a running estimate of Transcribe's processing ratio (seconds of
+processing per second of audio), learned from completed jobs. The workflow
+waits until the job is expected to be done; polls past that point back off
+exponentially, and the backoff is also the floor of every wait.
+"""
+from datetime import datetime, timezone
+import json
+import os
+
+POLL_STATS_KEY = os.environ.get('POLL_STATS_KEY', 'stats/transcribe-throughput.json')
+POLL_STARTUP_SECONDS = float(os.environ.get('POLL_STARTUP_SECONDS', '15'))
+POLL_DEFAULT_RATIO = float(os.environ.get('POLL_DEFAULT_RATIO', '0.35'))
+POLL_MIN_WAIT_SECONDS = int(os.environ.get('POLL_MIN_WAIT_SECONDS', '2'))
+POLL_MAX_WAIT_SECONDS = int(os.environ.get('POLL_MAX_WAIT_SECONDS', '900'))
+POLL_DEFAULT_WAIT_SECONDS = 30  # When nothing is known about the media
+POLL_SMOOTHING = 0.2  # Weight of the newest job in the running ratio
+
+# Typical bitrates, used to estimate the duration from the object size
+AUDIO_BITRATES = {
+    'mp3': 128000,
+    'm4a': 128000,
+    'mp4': 128000,
+    'aac': 128000,
+    'ogg': 96000,
+    'webm': 96000,
+    'amr': 12200,
+    'flac': 700000,
+    'wav': 1411200
+}
+
+_ratio_cache = {}
+
+
+def estimate_media_duration(s3, bucket, key):
+    """
+    Estimates the duration of an audio object in seconds from its size and format.
+    """
+    try:
+        size = s3.head_object(Bucket=bucket, Key=key)['ContentLength']
+    except Exception as e:
+        print(f"Could not estimate media duration: {e}")
+        return None
+    return size * 8 / AUDIO_BITRATES.get(key.rsplit('.', 1)[-1].lower(), 128000)
+
+
+def read_processing_ratio(s3, bucket):
+    """
+    Returns the running processing ratio, read once per container.
+    """
+    if bucket not in _ratio_cache:
+        try:
+            stats = json.loads(s3.get_object(Bucket=bucket, Key=POLL_STATS_KEY)['Body'].read())
+            _ratio_cache[bucket] = stats['ratio']
+        except Exception:
+            _ratio_cache[bucket] = POLL_DEFAULT_RATIO
+    return _ratio_cache[bucket]
+
+
+def record_completed_job(s3, bucket, media_duration, job):
+    """
+    Folds a completed job's processing time into the running processing ratio.
+    """
+    if not bucket or not media_duration or 'CompletionTime' not in job:
+        return
+    processing_seconds = (job['CompletionTime'] - (job.get('StartTime') or job['CreationTime'])).total_seconds()
+    observed = max(processing_seconds - POLL_STARTUP_SECONDS, 0) / media_duration
+
+    try:
+        ratio = read_processing_ratio(s3, bucket)
+        ratio = (1 - POLL_SMOOTHING) * ratio + POLL_SMOOTHING * observed
+        _ratio_cache[bucket] = ratio
+        s3.put_object(
+            Bucket=bucket,
+            Key=POLL_STATS_KEY,
+            Body=json.dumps({'ratio': ratio, 'updatedAt': datetime.now(timezone.utc).isoformat()}),
+            ContentType='application/json'
+        )
+    except Exception as e:
+        print(f"Failed to record Transcribe throughput: {e}")
+
+
+def get_next_wait_seconds(media_duration, elapsed_seconds, attempt, ratio=None):
+    """
+    Returns how long to wait before the next status poll.
+    """
+    backoff = min(POLL_MIN_WAIT_SECONDS * 2 ** attempt, POLL_MAX_WAIT_SECONDS)
+    if not media_duration:
+        return max(POLL_DEFAULT_WAIT_SECONDS, backoff)
+
+    expected = POLL_STARTUP_SECONDS + media_duration * (POLL_DEFAULT_RATIO if ratio is None else ratio)
+    remaining = expected - elapsed_seconds
+    return int(min(max(remaining, backoff, POLL_MIN_WAIT_SECONDS), POLL_MAX_WAIT_SECONDS))
@@ -0,0 +1,194 @@
+"""
+Merges the Transcribe results of overlapping parts of one recording.
+
+Long recordings are transcribed as parallel jobs over overlapping time windows.
+Each part is diarized on its own, so `spk_0` of one part need not be `spk_0` of
+the next. The merge re-bases every part onto the recording's timeline, matches
+speakers across each overlap by the words both parts heard, and cuts each
+overlap in the middle so every word appears once.
+"""
+from collections import defaultdict
+
+# Words of neighbouring parts starting within this many seconds are the same word
+MATCH_TOLERANCE_SECONDS = 0.3
+
+
+def format_time(seconds):
+    return f"{seconds:.3f}"
+
+
+def get_part_words(transcript, offset):
+    """
+    Returns the timed words of a part on the recording's timeline, each with its
+    local speaker, source segment and the punctuation items that follow it.
+    """
+    results = transcript['results']
+    speakers = {}
+    segment_of = {}
+    for segment_index, segment in enumerate(results.get('speaker_labels', {}).get('segments', [])):
+        for segment_item in segment.get('items', []):
+            speakers[segment_item['start_time']] = segment_item['speaker_label']
+            segment_of[segment_item['start_time']] = segment_index
+
+    words = []
+    for item in results['items']:
+        if 'start_time' not in item:
+            if words:
+                words[-1]['punctuation'].append(dict(item))
+            continue
+
+        start_time = float(item['start_time']) + offset
+        end_time = float(item['end_time']) + offset
+        words.append({
+            'start': start_time,
+            'end': end_time,
+            'speaker': item.get('speaker_label') or speakers.get(item['start_time']),
+            'segment': segment_of.get(item['start_time']),
+            'item': dict(item, start_time=format_time(start_time), end_time=format_time(end_time)),
+            'punctuation': []
+        })
+    return words
+
+
+def reconcile_speakers(previous_words, words, speaker_time, start, end, max_speakers):
+    """
+    Maps the local speakers of `words` onto the global speakers of `previous_words`
+    (already mapped) by how long they spoke the same words in [start, end].
+
+    Speakers who did not talk during the overlap can't be matched directly. Once
+    the merge has as many global speakers as any single part diarized, they are
+    taken to be the remaining global speakers, paired by speaking time; otherwise
+    they become new global speakers.
+    """
+    overlap_previous = [word for word in previous_words if start <= word['start'] <= end]
+    overlap = [word for word in words if start <= word['start'] <= end]
+
+    agreement = defaultdict(float)
+    position = 0
+    for word in overlap:
+        # Both lists are sorted by start time, so a single forward pass pairs them up
+        while position < len(overlap_previous) and \
+                overlap_previous[position]['start'] < word['start'] - MATCH_TOLERANCE_SECONDS:
+            position += 1
+        if position < len(overlap_previous) and \
+                abs(overlap_previous[position]['start'] - word['start']) <= MATCH_TOLERANCE_SECONDS:
+            agreement[(word['speaker'], overlap_previous[position]['global_speaker'])] += \
+                max(word['end'] - word['start'], 0.01)
+
+    local_map = {}
+    for (local, global_speaker), _ in sorted(agreement.items(), key=lambda pair: -pair[1]):
+        if local not in local_map and global_speaker not in local_map.values():
+            local_map[local] = global_speaker
+
+    local_time = defaultdict(float)
+    for word in words:
+        local_time[word['speaker']] += word['end'] - word['start']
+    unmatched = sorted((local for local in local_time if local not in local_map), key=lambda local: -local_time[local])
+    remaining = sorted((speaker for speaker in speaker_time if speaker not in local_map.values()),
+                       key=lambda speaker: -speaker_time[speaker])
+
+    for local in unmatched:
+        if len(speaker_time) >= max_speakers and remaining:
+            local_map[local] = remaining.pop(0)
+        else:
+            local_map[local] = add_speaker(speaker_time)
+    return local_map
+
+
+def add_speaker(speaker_time):
+    speaker = f"spk_{len(speaker_time)}"
+    speaker_time[speaker] = 0.0
+    return speaker
+
+
+def merge_transcripts(parts, job_name=None):
+    """
+    Merges parts given as [{'offset': seconds, 'transcript': <Transcribe JSON>}],
+    ordered by offset, into a single Transcribe-shaped document.
+    """
+    speaker_time = {}
+    kept = []
+    previous_words = None
+    lower_cut = float('-inf')
+    max_speakers = max(
+        (part['transcript']['results'].get('speaker_labels', {}).get('speakers', 0) for part in parts), default=0)
+
+    for index, part in enumerate(parts):
+        words = get_part_words(part['transcript'], part['offset'])
+        part_end = max((word['end'] for word in words), default=part['offset'])
+
+        if previous_words is None:
+            local_map = {}
+            for word in words:
+                if word['speaker'] not in local_map:
+                    local_map[word['speaker']] = add_speaker(speaker_time)
+        else:
+            local_map = reconcile_speakers(
+                previous_words, words, speaker_time, part['offset'], previous_end, max_speakers)
+
+        for word in words:
+            word['global_speaker'] = local_map[word['speaker']]
+            word['part'] = index
+            speaker_time[word['global_speaker']] += word['end'] - word['start']
+
+        if index + 1 < len(parts):
+            next_offset = parts[index + 1]['offset']
+            # Cut in the middle of the overlap, where both parts have full context
+            upper_cut = (next_offset + part_end) / 2 if part_end > next_offset else next_offset
+        else:
+            upper_cut = float('inf')
+
+        kept.extend(word for word in words if lower_cut <= word['start'] < upper_cut)
+        previous_words = words
+        previous_end = part_end
+        lower_cut = upper_cut
+
+    return build_merged_transcript(kept, len(speaker_time), job_name)
+
+
+def build_merged_transcript(words, speaker_count, job_name=None):
+    items = []
+    segments = []
+    transcript = []
+
+    for position, word in enumerate(words):
+        item = word['item']
+        if 'speaker_label' in item:
+            item['speaker_label'] = word['global_speaker']
+        items.append(item)
+        items.extend(word['punctuation'])
+
+        transcript.append(item['alternatives'][0]['content'])
+        for punctuation in word['punctuation']:
+            transcript[-1] += punctuation['alternatives'][0]['content']
+
+        previous = words[position - 1] if position else None
+        # Segments continue across a part boundary when the speaker does
+        same_segment = previous is not None and previous['global_speaker'] == word['global_speaker'] and (
+            previous['part'] != word['part'] or previous['segment'] == word['segment'])
+        if not same_segment:
+            segments.append({
+                'start_time': item['start_time'],
+                'speaker_label': word['global_speaker'],
+                'items': []
+            })
+        segments[-1]['end_time'] = item['end_time']
+        segments[-1]['items'].append({
+            'start_time': item['start_time'],
+            'end_time': item['end_time'],
+            'speaker_label': word['global_speaker']
+        })
+
+    for index, item in enumerate(items):
+        if 'id' in item:
+            item['id'] = index
+
+    return {
+        'jobName': job_name,
+        'results': {
+            'transcripts': [{'transcript': ' '.join(transcript)}],
+            'speaker_labels': {'speakers': speaker_count, 'segments': segments},
+            'items': items
+        },
+        'status': 'COMPLETED'
+    }
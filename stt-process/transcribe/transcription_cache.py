@@ -0,0 +1,105 @@
+"""
+Content-addressed cache of Transcribe results.
+
+When a job finishes, its transcript is copied to
+s3://<output bucket>/<TRANSCRIPTION_CACHE_PREFIX><hash>.transcript.json, keyed by
+the audio's ETag or SHA-256 and the Transcribe settings. When the same audio
+comes in again, that copy is reused instead of transcribing the audio a second
+time. Job output keys (stt-<file>.json) are overwritten whenever a file is
+reprocessed, so the cache never points at them.
+"""
+from botocore.exceptions import ClientError
+from datetime import timedelta
+import hashlib
+import json
+import os
+
+TRANSCRIPTION_CACHE_PREFIX = os.environ.get('TRANSCRIPTION_CACHE_PREFIX', 'cache/transcribe/')
+# 'etag' trusts the S3 ETag, 'sha256' hashes the audio itself, 'none' disables the cache
+TRANSCRIPTION_CACHE_KEY = os.environ.get('TRANSCRIPTION_CACHE_KEY', 'etag')
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+# Slack between a job's CompletionTime and the LastModified of the output it wrote
+COMPLETION_TOLERANCE_SECONDS = 5
+
+
+def get_audio_hash(s3, bucket, key, etag=None, method=None):
+    """
+    Returns the content key of an audio object, or None when caching is disabled.
+    ETags of multipart uploads depend on the part size, so 'sha256' is the safer
+    choice when the same audio may be uploaded by different clients.
+    """
+    method = method or TRANSCRIPTION_CACHE_KEY
+    if method == 'etag':
+        etag = etag or s3.head_object(Bucket=bucket, Key=key)['ETag']
+        return f"etag-{etag.strip(chr(34))}"
+
+    if method == 'sha256':
+        digest = hashlib.sha256()
+        body = s3.get_object(Bucket=bucket, Key=key)['Body']
+        for chunk in iter(lambda: body.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+        return f"sha256-{digest.hexdigest()}"
+
+    return None
+
+
+def get_cache_key(audio_hash, settings):
+    # Settings that change the transcript are part of the key
+    fingerprint = hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    return f"{TRANSCRIPTION_CACHE_PREFIX}{audio_hash}-{fingerprint}.transcript.json"
+
+
+def lookup_transcription(s3, bucket, audio_hash, settings):
+    """
+    Returns the cache entry ({'jobName', 'bucket', 'key'}) of a finished
+    transcription of the same audio, or None.
+    """
+    if not audio_hash:
+        return None
+
+    key = get_cache_key(audio_hash, settings)
+    try:
+        response = s3.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404', 'NotFound'):
+            return None
+        raise
+    return {
+        'jobName': (response.get('Metadata') or {}).get('job-name'),
+        'bucket': bucket,
+        'key': key,
+        'etag': response['ETag']
+    }
+
+
+def seal_transcription(s3, bucket, audio_hash, settings, job_name, source_key, completed_at=None, etag=None):
+    """
+    Copies the finished transcript of `job_name` to the cache key of its audio.
+    Returns whether it was cached.
+
+    Pass the `etag` of a transcript this Lambda wrote itself. Otherwise the source
+    must be the job's own output. A reprocessed file may have overwritten that
+    output with another recording's cached transcript, so an object modified after
+    the job completed at `completed_at` is not trusted.
+    """
+    if not audio_hash:
+        return False
+
+    if etag is None:
+        response = s3.head_object(Bucket=bucket, Key=source_key)
+        if completed_at and response['LastModified'] > completed_at + timedelta(seconds=COMPLETION_TOLERANCE_SECONDS):
+            print(f"Not caching {source_key}: it was rewritten after {job_name} completed")
+            return False
+        etag = response['ETag']
+
+    # The copy only succeeds if the source is still the object checked above
+    s3.copy_object(
+        Bucket=bucket,
+        Key=get_cache_key(audio_hash, settings),
+        CopySource={'Bucket': bucket, 'Key': source_key},
+        CopySourceIfMatch=etag,
+        Metadata={'job-name': job_name},
+        MetadataDirective='REPLACE',
+        ContentType='application/json'
+    )
+    return True